@@ -0,0 +1,166 @@
+import asyncio
+import contextlib
+import os
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+import aiosqlite
+
+# Applied to every pooled connection. WAL lets readers run while a write is in progress.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+)
+
+# Schema changes in order, `PRAGMA user_version` is the number applied. Append new steps, never edit old ones.
+MIGRATIONS = (
+    """
+    CREATE TABLE IF NOT EXISTS comments
+    (
+        id           INTEGER PRIMARY KEY AUTOINCREMENT,
+        image_name   TEXT NOT NULL,
+        comment_text TEXT NOT NULL
+    )
+    """,
+    # Comments of an image in id order straight from the index, without scanning the table or sorting
+    "CREATE INDEX IF NOT EXISTS idx_comments_image_name_id ON comments (image_name, id)",
+)
+
+# Comments of one image after an id, the query of every comment page
+COMMENTS_QUERY = "SELECT id, image_name, comment_text FROM comments WHERE image_name = ? AND id > ? ORDER BY id"
+
+# Statements run once on every reader at startup, so they sit in the connection's prepared statement cache
+WARM_UP_QUERIES = (
+    (COMMENTS_QUERY, ("", 0)),
+    (COMMENTS_QUERY + " LIMIT ?", ("", 0, 1)),
+)
+
+# Prepared statements kept per connection
+CACHED_STATEMENTS = 256
+
+
+class Database:
+    """SQLite connections for the app: one writer behind a lock and a queue of readers, opened at startup.
+
+    Every aiosqlite connection owns a worker thread, so opening one per request is what made requests slow.
+    With `pooled=False` every `reader()` and `writer()` opens and closes its own connection, the old behaviour,
+    kept for comparisons.
+    """
+
+    def __init__(self, path: str, readers: int = 8, pooled: bool = True):
+        self.path = path
+        self.readers = readers
+        self.pooled = pooled
+        self._writer: aiosqlite.Connection | None = None
+        self._write_lock = asyncio.Lock()
+        self._idle_readers: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        self._all_readers: list[aiosqlite.Connection] = []
+
+    @property
+    def is_open(self) -> bool:
+        """Whether `open` ran and `close` did not yet."""
+        return self._writer is not None
+
+    async def _connect(self) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.path, cached_statements=CACHED_STATEMENTS)
+        conn.row_factory = aiosqlite.Row
+        return conn
+
+    async def open(self) -> None:
+        """Opens the writer and the readers, applies the pragmas and prepares the common queries."""
+        if not self.pooled or self.is_open:
+            return
+        self._writer = await self._connect()
+        for pragma in PRAGMAS:
+            await self._writer.execute(pragma)
+        for _ in range(self.readers):
+            conn = await self._connect()
+            for pragma in PRAGMAS:
+                await conn.execute(pragma)
+            for query, params in WARM_UP_QUERIES:
+                # The table may not exist (yet)
+                with contextlib.suppress(aiosqlite.Error):
+                    await (await conn.execute(query, params)).close()
+            self._all_readers.append(conn)
+            self._idle_readers.put_nowait(conn)
+        print(f"Database pool opened: 1 writer, {self.readers} readers on {self.path}")
+
+    async def close(self) -> None:
+        """Waits for running queries, checkpoints the WAL into the database file and closes every connection."""
+        if not self.is_open:
+            return
+        async with self._write_lock:
+            for _ in self._all_readers:
+                await self._idle_readers.get()
+            writer, self._writer = self._writer, None
+            try:
+                await writer.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except aiosqlite.Error as e:
+                print(f"WAL checkpoint failed: {e}")
+            for conn in [*self._all_readers, writer]:
+                await conn.close()
+            self._all_readers.clear()
+        print("Database pool closed.")
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """A connection for queries, borrowed from the pool until the block ends."""
+        if not self.pooled or not self.is_open:
+            async with self._unpooled() as conn:
+                yield conn
+            return
+        conn = await self._idle_readers.get()
+        try:
+            yield conn
+        finally:
+            self._idle_readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        """The single write connection, held exclusively until the block ends. SQLite allows one writer anyway."""
+        if not self.pooled or not self.is_open:
+            async with self._unpooled() as conn:
+                yield conn
+            return
+        async with self._write_lock:
+            try:
+                yield self._writer
+            finally:
+                if self._writer.in_transaction:
+                    await self._writer.rollback()
+
+    @asynccontextmanager
+    async def _unpooled(self) -> AsyncIterator[aiosqlite.Connection]:
+        conn = await aiosqlite.connect(self.path)
+        conn.row_factory = aiosqlite.Row
+        try:
+            yield conn
+        finally:
+            await conn.close()
+
+
+async def migrate(path: str) -> int:
+    """Applies the migrations the database has not seen yet and returns its schema version."""
+    async with aiosqlite.connect(path) as conn:
+        async with conn.execute("PRAGMA user_version") as cursor:
+            (version,) = await cursor.fetchone()
+        for number, statement in enumerate(MIGRATIONS[version:], start=version + 1):
+            await conn.execute("BEGIN")
+            await conn.execute(statement)
+            # PRAGMA takes no parameters, `number` is an int from enumerate
+            await conn.execute(f"PRAGMA user_version = {number}")
+            await conn.commit()
+            print(f"Applied database migration {number}.")
+        return max(version, len(MIGRATIONS))
+
+
+def database_from_env(path: str) -> Database:
+    """DB_POOL=0 disables pooling, DB_READERS sets the number of reader connections."""
+    return Database(
+        path,
+        readers=int(os.getenv("DB_READERS", "8")),
+        pooled=os.getenv("DB_POOL", "1") != "0",
+    )
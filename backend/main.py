@@ -1,19 +1,28 @@
 import base64
+import json
 import os
 import sqlite3
 import shutil
 import uuid
+from collections.abc import AsyncIterator
+from typing import Annotated
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, Request, Path, Form
-from fastapi.responses import JSONResponse, Response, FileResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, Path, Form, Query
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles  # Only for potentially serving safe files if needed, not used for the vulnerable endpoint
 from pydantic import BaseModel
-import aiosqlite  # Using async sqlite for FastAPI
 from starlette.middleware.cors import CORSMiddleware
 
+from database import COMMENTS_QUERY, database_from_env, migrate
+from file_serving import file_response, media_type_for
+
 # --- Configuration ---
 UPLOAD_FOLDER = 'uploads_fastapi'
 DATABASE = 'vulnerable_app_fastapi.db'
+database = database_from_env(DATABASE)  # Pooled connections, opened by init_db
+MAX_COMMENT_PAGE = 1000  # Largest `limit` of the comment endpoints
+MAX_BATCH_IMAGES = 100  # Images per batch comment request, SQLite caps the number of query parameters
+STREAM_BATCH_ROWS = 500  # Rows per page while streaming all comments of an image
 # ALLOWED_EXTENSIONS is not strictly enforced in the vulnerable upload endpoint
 
 # --- FastAPI App Initialization ---
@@ -36,29 +45,14 @@ class CommentCreate(BaseModel):
 
 # --- Database Setup ---
 async def init_db():
-    """Initializes the SQLite database asynchronously."""
+    """Creates or migrates the SQLite database (see MIGRATIONS in database.py) and opens the connection pool."""
     if not os.path.exists(DATABASE):
         print(f"Creating database: {DATABASE}")
-        async with aiosqlite.connect(DATABASE) as db:
-            await db.execute('''
-                             CREATE TABLE comments
-                             (
-                                 id           INTEGER PRIMARY KEY AUTOINCREMENT,
-                                 image_name   TEXT NOT NULL,
-                                 comment_text TEXT NOT NULL
-                             )
-                             ''')
-            await db.commit()
-            print("Database initialized and 'comments' table created.")
     else:
         print(f"Database {DATABASE} already exists.")
-
-
-async def get_db():
-    """Provides an asynchronous database connection."""
-    # For simple cases, opening a new connection per request is okay.
-    # For production, consider connection pooling.
-    return await aiosqlite.connect(DATABASE)
+    version = await migrate(DATABASE)
+    print(f"Database schema at version {version}.")
+    await database.open()
 
 
 # --- Ensure Upload Folder Exists ---
@@ -74,6 +68,12 @@ async def startup_event():
     await init_db()
 
 
+@app.on_event("shutdown")
+async def shutdown_event() -> None:
+    """Let running queries finish and close the database connections."""
+    await database.close()
+
+
 # --- Routes ---
 
 @app.get('/')
@@ -146,11 +146,12 @@ async def list_images():
 
 
 @app.get("/images/{image_name:path}")
-async def get_image(image_name: str = Path(...)):
+async def get_image(request: Request, image_name: str = Path(...)):
     """
     Serves a specific file based on the provided path.
     VULNERABILITY: Local File Inclusion (LFI) / Path Traversal.
     Allows accessing files potentially outside the intended directory by manipulating 'image_name'.
+    The file is streamed in chunks with ETag/Last-Modified, conditional GET (304) and Range (206) support.
     """
     # VULNERABLE PART: Directly using the user-provided 'image_name' path parameter.
     # An attacker can provide paths like '../../../../etc/passwd' (Linux)
@@ -165,32 +166,18 @@ async def get_image(image_name: str = Path(...)):
     # DEBUG: Print the path being accessed
     print(f"Attempting to access LFI path: {vulnerable_path}")
 
-    # Check if the path exists and is a file
-    if not os.path.exists(vulnerable_path) or not os.path.isfile(vulnerable_path):
-        # To make the LFI less obvious, return 404 instead of revealing the attempt
-        # In a real LFI test, you might check common file paths.
-        raise HTTPException(status_code=404, detail=f"File not found at calculated path: {vulnerable_path}")
-    # Alternatively, be more explicit for demonstration:
-    # raise HTTPException(status_code=404, detail=f"LFI Attempt: File not found or is not a file at path: {vulnerable_path}")
-
     try:
-        # Read the file content directly - THIS IS THE DANGEROUS PART
-        with open(vulnerable_path, "rb") as f:
-            content = f.read()
-        # Return the raw content. Guessing the media type might fail for non-standard files.
-        # For demonstration, we return as plain text or octet-stream.
+        # Check if the path exists and is a file, then stream the file content directly - THIS IS THE DANGEROUS PART
+        # Guessing the media type might fail for non-standard files, anything unknown is sent as plain text.
         # A real attacker might exfiltrate data differently.
-        media_type = "text/plain"  # Default, adjust if needed based on expected file types
-        if '.' in image_name:
-            ext = image_name.rsplit('.', 1)[-1].lower()
-            if ext in ['png', 'jpg', 'jpeg', 'gif', 'svg']:
-                media_type = f'image/{ext}'
-            elif ext == 'pdf':
-                media_type = 'application/pdf'
-            # Add more specific types if needed
-
-        return Response(content=content, media_type=media_type)
+        return await file_response(request, vulnerable_path, media_type_for(image_name))
 
+    except FileNotFoundError:
+        # To make the LFI less obvious, return 404 instead of revealing the attempt
+        # In a real LFI test, you might check common file paths.
+        raise HTTPException(status_code=404, detail=f"File not found at calculated path: {vulnerable_path}") from None
+        # Alternatively, be more explicit for demonstration:
+        # raise HTTPException(status_code=404, detail=f"LFI Attempt: File not found or is not a file at path: {vulnerable_path}")
     except PermissionError:
         raise HTTPException(status_code=403, detail=f"Permission denied for path: {vulnerable_path}")
     except Exception as e:
@@ -206,29 +193,28 @@ async def add_comment(comment_data: CommentCreate, image_name: str = Path(...)):
     VULNERABILITY: SQL Injection.
     Constructs the SQL query using unsafe string formatting.
     """
-    db = None  # Initialize db to None
     try:
-        db = await get_db()
-        cursor = await db.cursor()
+        async with database.writer() as conn:
+            cursor = await conn.cursor()
 
-        comment_text = comment_data.comment_text
+            comment_text = comment_data.comment_text
 
-        # VULNERABLE PART: Directly embedding user input into the SQL query.
-        # An attacker can inject SQL commands via the 'comment_text'.
-        # Example payload for comment_text: "Nice pic!'); INSERT INTO comments (image_name, comment_text) VALUES ('evil.jpg', 'PWNED'); --"
-        # Note: The exact payload might need adjustment based on SQL dialect and context.
-        # query = f"INSERT INTO comments (image_name, comment_text) VALUES ('{image_name}', '{comment_text}')"
+            # VULNERABLE PART: Directly embedding user input into the SQL query.
+            # An attacker can inject SQL commands via the 'comment_text'.
+            # Example payload for comment_text: "Nice pic!'); INSERT INTO comments (image_name, comment_text) VALUES ('evil.jpg', 'PWNED'); --"
+            # Note: The exact payload might need adjustment based on SQL dialect and context.
+            # query = f"INSERT INTO comments (image_name, comment_text) VALUES ('{image_name}', '{comment_text}')"
 
-        query = f"INSERT INTO comments (image_name, comment_text) VALUES ('{image_name}', '{comment_text}')"
-        print(f"Executing VULNERABLE SQL: {query}")  # Log the query for demonstration
+            query = f"INSERT INTO comments (image_name, comment_text) VALUES ('{image_name}', '{comment_text}')"
+            print(f"Executing VULNERABLE SQL: {query}")  # Log the query for demonstration
 
-        await cursor.executescript(query)  # Execute the potentially malicious query
-        await db.commit()
+            await cursor.executescript(query)  # Execute the potentially malicious query
+            await conn.commit()
 
-        # Fetch the ID of the inserted comment (optional)
-        # last_id = cursor.lastrowid
+            # Fetch the ID of the inserted comment (optional)
+            # last_id = cursor.lastrowid
 
-        await cursor.close()
+            await cursor.close()
         return {"message": "Comment added successfully (potentially via SQL Injection!)", "image_name": image_name,
                 "comment": comment_text}  # "id": last_id
 
@@ -237,37 +223,101 @@ async def add_comment(comment_data: CommentCreate, image_name: str = Path(...)):
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
-    finally:
-        if db:
-            await db.close()
 
 
-@app.get("/comments/{image_name}")
-async def get_comments(image_name: str = Path(...)):
-    """Retrieves all comments for a specific image name."""
-    db = None
+async def stream_comments(image_name: str, after_id: int) -> AsyncIterator[str]:
+    """
+    Yields the JSON of every comment of an image, one keyset page of STREAM_BATCH_ROWS at a time, so large
+    results are never held in memory. A reader connection is only borrowed while a page is fetched and is back
+    in the pool before the page goes to the client, so slow clients neither exhaust the pool nor keep a read
+    snapshot open that stops WAL checkpoints.
+    """
+    yield '{"image_name": ' + json.dumps(image_name) + ', "comments": ['
+    separator = ""
     try:
-        db = await get_db()
-        # Use row factory to get results as dictionaries
-        db.row_factory = aiosqlite.Row
-        cursor = await db.cursor()
+        while True:
+            async with database.reader() as conn:
+                params = (image_name, after_id, STREAM_BATCH_ROWS)
+                async with conn.execute(COMMENTS_QUERY + " LIMIT ?", params) as cursor:
+                    rows = await cursor.fetchall()
+            if not rows:
+                break
+            yield separator + ", ".join(json.dumps(dict(row)) for row in rows)
+            separator = ", "
+            if len(rows) < STREAM_BATCH_ROWS:
+                break
+            after_id = rows[-1]["id"]
+    except Exception as e:
+        # The response has started, so the JSON is closed with what was sent so far
+        print(f"Streaming comments for {image_name} failed: {e}")
+    yield "]}"
+
+
+@app.get("/comments")
+async def get_comments_batch(
+        image: Annotated[list[str], Query(description="Image names, repeat the parameter for every image.")],
+        limit: int = Query(100, ge=1, le=MAX_COMMENT_PAGE, description="Comments per image."),
+) -> dict:
+    """Retrieves the first `limit` comments of several images with one query."""
+    names = list(dict.fromkeys(image))
+    if len(names) > MAX_BATCH_IMAGES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IMAGES} images per request.")
+
+    # Only placeholders are added to the query, the names are bound as parameters
+    placeholders = ", ".join("?" * len(names))
+    query = (
+        "SELECT id, image_name, comment_text FROM ("  # noqa: S608
+        "    SELECT id, image_name, comment_text,"
+        "           ROW_NUMBER() OVER (PARTITION BY image_name ORDER BY id) AS position"
+        "    FROM comments WHERE image_name IN (" + placeholders + ")"
+        ") WHERE position <= ? ORDER BY image_name, id"
+    )
+    comments = {name: [] for name in names}
+    try:
+        async with database.reader() as conn, conn.execute(query, (*names, limit)) as cursor:
+            for row in await cursor.fetchall():
+                comments[row["image_name"]].append(dict(row))
+    except Exception as e:
+        print(f"Batch comment query failed: {e}")
+
+    return {"images": [
+        {
+            "image_name": name,
+            "comments": rows,
+            "next_after_id": rows[-1]["id"] if len(rows) == limit else None,
+        }
+        for name, rows in comments.items()
+    ]}
 
-        # Use parameterized query here for safety (contrast with the vulnerable POST endpoint)
-        query = "SELECT id, image_name, comment_text FROM comments WHERE image_name = ?"
-        await cursor.execute(query, (image_name,))
-        comments = await cursor.fetchall()
 
-        await cursor.close()
+@app.get("/comments/{image_name}")
+async def get_comments(
+        image_name: str = Path(...),
+        limit: int | None = Query(None, ge=1, le=MAX_COMMENT_PAGE, description="Page size, all comments if unset."),
+        after_id: int = Query(0, ge=0, description="Only comments with a larger id, `next_after_id` of the last page."),
+):
+    """
+    Retrieves the comments for a specific image name, oldest first.
+    With `limit` a page is returned together with `next_after_id`, the `after_id` of the next page (null on the
+    last page). Without it all comments are streamed.
+    """
+    if limit is None:
+        return StreamingResponse(stream_comments(image_name, after_id), media_type="application/json")
+
+    try:
+        # Pooled connections return rows as aiosqlite.Row, which convert to dictionaries
+        # Use parameterized query here for safety (contrast with the vulnerable POST endpoint)
+        params = (image_name, after_id, limit)
+        async with database.reader() as conn, conn.execute(COMMENTS_QUERY + " LIMIT ?", params) as cursor:
+            comments = await cursor.fetchall()
 
         # Convert Row objects to dictionaries for JSON serialization
         comments_list = [dict(comment) for comment in comments]
-        return {"image_name": image_name, "comments": comments_list}
+        next_after_id = comments_list[-1]["id"] if len(comments_list) == limit else None
+        return {"image_name": image_name, "comments": comments_list, "next_after_id": next_after_id}
 
     except Exception as e:
-        return {"image_name": image_name, "comments": []}
-    finally:
-        if db:
-            await db.close()
+        return {"image_name": image_name, "comments": [], "next_after_id": None}
 
 
 # --- Main execution ---
@@ -0,0 +1,110 @@
+"""Load test of the backend's comment endpoints, with a connection per request versus the connection pool.
+
+The app is served in-process through httpx's ASGI transport, in a temporary working directory with a fresh
+database, so only the app and its database layer are measured. Every client sends a mix of comment reads and
+benign comment posts as fast as it can. Needs the backend dependencies, run from the repository root:
+
+    uv run --extra verify python -m benchmarks.bench_db_pool --clients 32 --requests 2000
+"""
+
+import argparse
+import asyncio
+import contextlib
+import importlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from http import HTTPStatus
+from pathlib import Path
+from types import ModuleType
+
+import httpx
+
+BACKEND_DIR = Path(__file__).parent.parent / "backend"
+
+IMAGES = [f"bench-{i}.png" for i in range(8)]
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+async def bench_mode(
+    app_module: ModuleType, pooled: bool, readers: int, clients: int, requests: int, write_ratio: float
+) -> dict:
+    """Runs the load against the app with the given database setup and returns throughput and latency."""
+    database_module = importlib.import_module("database")
+    app_module.database = database_module.Database(app_module.DATABASE, readers=readers, pooled=pooled)
+    await app_module.init_db()
+
+    latencies: list[float] = []
+    errors = 0
+    remaining = iter(range(requests))
+    transport = httpx.ASGITransport(app=app_module.app)
+
+    async def client(client_id: int) -> None:
+        nonlocal errors
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as http:
+            for i in remaining:
+                image = IMAGES[(client_id + i) % len(IMAGES)]
+                started = time.perf_counter()
+                if (i * 7919 % 1000) / 1000 < write_ratio:
+                    response = await http.post(f"/comments/{image}", json={"comment_text": f"bench {uuid.uuid4().hex}"})
+                else:
+                    response = await http.get(f"/comments/{image}")
+                latencies.append(time.perf_counter() - started)
+                errors += response.status_code >= HTTPStatus.BAD_REQUEST
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(clients)))
+    seconds = time.perf_counter() - started
+    await app_module.database.close()
+    return {
+        "requests_per_second": len(latencies) / seconds,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+        "errors": errors,
+    }
+
+
+async def main() -> None:
+    """Runs the benchmark with the command line arguments and prints the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent clients.")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per mode, shared by all clients.")
+    parser.add_argument("--readers", type=int, default=8, help="Reader connections of the pool.")
+    parser.add_argument("--write-ratio", type=float, default=0.2, help="Share of requests that post a comment.")
+    args = parser.parse_args()
+
+    results = {}
+    for name, pooled in (("per-request", False), ("pooled", True)):
+        with tempfile.TemporaryDirectory(prefix="ohacker-bench-db-") as workdir:
+            previous_cwd = os.getcwd()
+            os.chdir(workdir)
+            sys.path.insert(0, str(BACKEND_DIR))
+            try:
+                # The app prints every query it runs
+                with contextlib.redirect_stdout(io.StringIO()):
+                    app_module = importlib.import_module("main")
+                    results[name] = await bench_mode(
+                        app_module, pooled, args.readers, args.clients, args.requests, args.write_ratio
+                    )
+            finally:
+                os.chdir(previous_cwd)
+                sys.path.remove(str(BACKEND_DIR))
+                # A fresh app, database and upload folder for the next mode
+                sys.modules.pop("main", None)
+                sys.modules.pop("database", None)
+
+    print(f"{'metric':<22}" + "".join(f"{name:>14}" for name in results))
+    for metric in next(iter(results.values())):
+        print(f"{metric:<22}" + "".join(f"{r[metric]:>14.1f}" for r in results.values()))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,161 @@
+"""Load test of the backend's image downloads, whole-file buffered responses versus streaming.
+
+Every mode runs the app in its own uvicorn process in a temporary working directory. "buffered" is an extra
+route doing what `GET /images/{image_name}` did before, reading the whole file into one response on the event
+loop, "streaming" is the endpoint itself. Two workloads are measured: a few concurrent downloads of a large file
+and many concurrent downloads of small files. The peak RSS of the server process shows whether memory grows with
+the file size. Needs the backend dependencies and a Unix system, run from the repository root:
+
+    uv run --extra verify --with uvicorn python -m benchmarks.bench_file_serving --large-mb 128
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).parent.parent / "backend"
+
+# The app plus the old, buffered implementation of get_image
+SERVER = """
+import os
+import sys
+
+import uvicorn
+from fastapi import Response
+
+sys.path.insert(0, {backend!r})
+import main
+
+
+@main.app.get("/buffered/{{image_name:path}}")
+async def buffered(image_name: str):
+    with open(os.path.join(main.UPLOAD_FOLDER, image_name), "rb") as f:
+        content = f.read()
+    return Response(content=content, media_type=main.media_type_for(image_name))
+
+
+uvicorn.run(main.app, host="127.0.0.1", port={port}, log_level="warning")
+"""
+
+MODES = {"buffered": "/buffered", "streaming": "/images"}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def _write_files(upload_folder: Path, large_mb: int, small_kb: int, small_files: int) -> list[str]:
+    upload_folder.mkdir()
+    with (upload_folder / "large.png").open("wb") as f:
+        for _ in range(large_mb):
+            f.write(os.urandom(1024 * 1024))
+    small = [f"small-{i}.png" for i in range(small_files)]
+    for name in small:
+        (upload_folder / name).write_bytes(os.urandom(small_kb * 1024))
+    return small
+
+
+async def _download(base_url: str, names: list[str], clients: int) -> dict:
+    latencies: list[float] = []
+    received = 0
+    remaining = iter(names)
+
+    async def client(http: httpx.AsyncClient) -> None:
+        nonlocal received
+        for name in remaining:
+            started = time.perf_counter()
+            async with http.stream("GET", f"{base_url}/{name}") as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_raw():
+                    received += len(chunk)
+            latencies.append(time.perf_counter() - started)
+
+    limits = httpx.Limits(max_connections=clients)
+    async with httpx.AsyncClient(limits=limits, timeout=300) as http:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(http) for _ in range(clients)))
+        seconds = time.perf_counter() - started
+    return {
+        "MiB_per_second": received / seconds / 1024 / 1024,
+        "requests_per_second": len(latencies) / seconds,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+    }
+
+
+async def bench_mode(mode: str, workdir: Path, names: list[str], clients: int) -> dict:
+    """Starts a server, downloads the files and returns the results with the server's peak RSS."""
+    port = _free_port()
+    server = subprocess.Popen(  # noqa: S603 - this interpreter running our own server script
+        [sys.executable, "-c", SERVER.format(backend=str(BACKEND_DIR), port=port)],
+        cwd=workdir,
+        stdout=subprocess.DEVNULL,  # The app prints every path it serves
+    )
+    try:
+        async with httpx.AsyncClient() as http:
+            for _ in range(100):
+                try:
+                    await http.get(f"http://127.0.0.1:{port}/")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError(f"The {mode} server did not start.")
+        result = await _download(f"http://127.0.0.1:{port}{MODES[mode]}", names, clients)
+    finally:
+        server.terminate()
+        # wait4 reaps the server and returns its resource usage, ru_maxrss is in KiB on Linux
+        _, status, usage = os.wait4(server.pid, 0)
+        server.returncode = os.waitstatus_to_exitcode(status)
+    return {**result, "server_peak_rss_MiB": usage.ru_maxrss / 1024}
+
+
+async def main() -> None:
+    """Runs the benchmark with the command line arguments and prints the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--large-mb", type=int, default=64, help="Size of the large file.")
+    parser.add_argument("--large-downloads", type=int, default=16, help="Downloads of the large file.")
+    parser.add_argument("--large-clients", type=int, default=8, help="Concurrent downloads of the large file.")
+    parser.add_argument("--small-kb", type=int, default=256, help="Size of every small file.")
+    parser.add_argument("--small-downloads", type=int, default=2000, help="Downloads of small files.")
+    parser.add_argument("--small-clients", type=int, default=32, help="Concurrent downloads of small files.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="ohacker-bench-files-") as workdir:
+        small = _write_files(Path(workdir) / "uploads_fastapi", args.large_mb, args.small_kb, 100)
+        workloads = {
+            f"{args.large_downloads} x {args.large_mb} MiB, {args.large_clients} at a time": (
+                ["large.png"] * args.large_downloads,
+                args.large_clients,
+            ),
+            f"{args.small_downloads} x {args.small_kb} KiB, {args.small_clients} at a time": (
+                [small[i % len(small)] for i in range(args.small_downloads)],
+                args.small_clients,
+            ),
+        }
+        for workload, (names, clients) in workloads.items():
+            results = {mode: await bench_mode(mode, Path(workdir), names, clients) for mode in MODES}
+            print(f"\n{workload}")
+            print(f"{'metric':<22}" + "".join(f"{mode:>14}" for mode in results))
+            for metric in next(iter(results.values())):
+                print(f"{metric:<22}" + "".join(f"{r[metric]:>14.1f}" for r in results.values()))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
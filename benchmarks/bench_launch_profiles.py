@@ -0,0 +1,75 @@
+"""Compares browser launch profiles of LocalPlaywrightComputer.
+
+Measures time to first screenshot (Playwright start, browser launch, navigation and the first capture) and the
+latency of the actions the agents use most. Start the frontend and backend first, then run from the repository root:
+
+    uv run python -m benchmarks.bench_launch_profiles --url http://localhost:8080/ --actions 20
+
+The headful profile needs a display server and is skipped when there is none, pass it explicitly with
+`--profiles headful` to force it.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from collections import defaultdict
+
+from src.ohacker.computer_use import LocalPlaywrightComputer
+from src.ohacker.launch_profiles import PROFILES, LaunchProfile
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+async def bench_profile(profile: LaunchProfile, url: str, actions: int) -> dict[str, float]:
+    """Runs one profile and returns its timings in milliseconds."""
+    started = time.perf_counter()
+    computer = LocalPlaywrightComputer(target_url=url, profile=profile)
+    async with computer:
+        await computer.screenshot()
+        first_screenshot = time.perf_counter() - started
+
+        width, height = computer.dimensions
+        latencies: dict[str, list[float]] = defaultdict(list)
+        for i in range(actions):
+            x, y = (i * 37) % width, (i * 53) % height
+            for name, action in (
+                ("move", lambda x=x, y=y: computer.move(x, y)),
+                ("scroll", lambda x=x, y=y, i=i: computer.scroll(x, y, 0, 200 if i % 2 == 0 else -200)),
+                ("keypress", lambda: computer.keypress(["shift"])),
+                ("screenshot", computer.screenshot),
+            ):
+                t0 = time.perf_counter()
+                await action()
+                latencies[name].append(time.perf_counter() - t0)
+
+    result = {"first_screenshot_ms": first_screenshot * 1000}
+    for name, values in latencies.items():
+        result[f"{name}_p50_ms"] = statistics.median(values) * 1000
+        result[f"{name}_p95_ms"] = _percentile(values, 0.95) * 1000
+    return result
+
+
+async def main() -> None:
+    """Runs the benchmark with the command line arguments and prints the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8080/")
+    parser.add_argument("--actions", type=int, default=20, help="Repetitions of every measured action.")
+    parser.add_argument("--profiles", nargs="*", choices=sorted(PROFILES), help="Profiles to compare.")
+    args = parser.parse_args()
+
+    names = args.profiles or [name for name, p in PROFILES.items() if p.headless or os.getenv("DISPLAY")]
+    results = {name: await bench_profile(PROFILES[name], args.url, args.actions) for name in names}
+
+    metrics = list(next(iter(results.values())))
+    print(f"{'metric':<22}" + "".join(f"{name:>12}" for name in results))
+    for metric in metrics:
+        print(f"{metric:<22}" + "".join(f"{r[metric]:>12.1f}" for r in results.values()))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,147 @@
+"""Times the agent pipeline end to end without any model call, so only our own overhead is measured.
+
+Every agent is answered by the scripted offline models of mock_models.py: the research manager (planning,
+search fan-out, the streamed report), the patch agent in every patch mode, and the LFI pentest agent, which
+really drives a headless browser through a fixed sequence of computer and browser tool calls. Each scripted model
+request can wait `--latency` seconds to simulate the model. No API key and no running frontend are needed, run from
+the repository root:
+
+    uv run python -m benchmarks.bench_offline_pipeline --runs 5 --latency 0.05
+
+Pass `--skip-browser` when Chromium is not installed.
+"""
+
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from urllib.parse import quote
+
+from agents import set_tracing_disabled
+
+from src.ohacker.cyber_research_agents.cache import ResponseCache
+from src.ohacker.cyber_research_agents.manager import ResearchManager
+from src.ohacker.launch_profiles import PROFILES
+from src.ohacker.mock_models import ScriptedProvider
+from src.ohacker.run_config import set_model_provider
+from src.ohacker.scheduler import AgentOutput
+
+QUERY = (
+    "The summary of the penetration testing agents results:\n"
+    "0. LFI Agent:\nThe image endpoint returned images/secrets.txt.\nVERDICT: VULNERABLE\n\n"
+    "1. SQL Injection Agent:\nThe comments table was dropped through POST /comments/.\nVERDICT: VULNERABLE\n\n"
+)
+
+# A page with an image and a comment form, served as a data: URL so no web server is needed
+TARGET_PAGE = "data:text/html," + quote(
+    "<html><body><h1>Gallery</h1>"
+    '<a href="#image"><img alt="sample" width="320" height="240" src="data:image/gif;base64,'
+    'R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7"></a>'
+    '<form><input name="comment"><button type="button">Post</button></form>'
+    "</body></html>"
+)
+
+LFI_AGENT = "Simple website tester 1."
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+async def _timed_runs(runs: int, run: Callable[[], Awaitable[object]]) -> list[float]:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        await run()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+async def bench_research(runs: int, directory: Path) -> list[float]:
+    """Times full research runs with the cache disabled, in seconds."""
+    cache = ResponseCache(directory / "cache.sqlite3", enabled=False)
+
+    async def run() -> None:
+        await ResearchManager(cache, report_path=directory / "report.md").run(QUERY)
+
+    return await _timed_runs(runs, run)
+
+
+async def bench_patch(runs: int, mode: str) -> list[float]:
+    """Times patch agent runs in the given mode, in seconds."""
+    from src.ohacker.security_patches_agent import run_patch_agent
+
+    return await _timed_runs(runs, lambda: run_patch_agent(QUERY, write_files=False, mode=mode))
+
+
+async def bench_agents(runs: int, concurrency: int) -> list[float]:
+    """Runs the LFI agent `runs` times in batches of `concurrency`, sharing one browser pool, and times every run."""
+    from src.ohacker.browser_pool import BrowserPool
+    from src.ohacker.main import run_agent
+
+    profile = PROFILES["fast"]
+    timings: list[float] = []
+    pool = BrowserPool(size=1, max_contexts_per_browser=concurrency, launch_options=profile.launch_options())
+    async with pool:
+
+        async def run() -> None:
+            started = time.perf_counter()
+            await run_agent(LFI_AGENT, TARGET_PAGE, AgentOutput("LFI Agent"), pool=pool, profile=profile)
+            timings.append(time.perf_counter() - started)
+
+        for batch in range(0, runs, concurrency):
+            await asyncio.gather(*(run() for _ in range(min(concurrency, runs - batch))))
+    return timings
+
+
+def _row(name: str, timings: list[float], requests: int) -> str:
+    per_request = sum(timings) / requests * 1000 if requests else 0.0
+    return (
+        f"{name:<22}{statistics.median(timings) * 1000:>10.1f}{_percentile(timings, 0.95) * 1000:>10.1f}"
+        f"{requests / len(timings):>12.1f}{per_request:>14.2f}"
+    )
+
+
+async def main() -> None:
+    """Runs the benchmark with the command line arguments and prints the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Repetitions of every measured stage.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds every scripted model request waits.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent pentest agents of the throughput run.")
+    parser.add_argument("--skip-browser", action="store_true", help="Skip the pentest agent, it needs Chromium.")
+    args = parser.parse_args()
+
+    set_tracing_disabled(True)
+    results: list[tuple[str, list[float], int]] = []
+
+    async def measure(name: str, bench: Callable[[], Awaitable[list[float]]]) -> None:
+        provider = ScriptedProvider(latency=args.latency)
+        set_model_provider(provider)
+        try:
+            results.append((name, await bench(), provider.requests))
+        finally:
+            set_model_provider(None)
+
+    with tempfile.TemporaryDirectory(prefix="ohacker-bench-") as directory:
+        await measure("research", lambda: bench_research(args.runs, Path(directory)))
+        for mode in ("full", "diff"):
+            await measure(f"patch ({mode})", lambda mode=mode: bench_patch(args.runs, mode))
+        if not args.skip_browser:
+            await measure("pentest agent (LFI)", lambda: bench_agents(args.runs, 1))
+            started = time.perf_counter()
+            await measure(f"{args.concurrency} concurrent agents", lambda: bench_agents(args.runs, args.concurrency))
+            throughput = args.runs / (time.perf_counter() - started)
+
+    print(f"{'stage':<22}{'p50 ms':>10}{'p95 ms':>10}{'requests':>12}{'ms/request':>14}")
+    for name, timings, requests in results:
+        print(_row(name, timings, requests))
+    if not args.skip_browser:
+        print(f"\n{args.concurrency} concurrent pentest agents: {throughput * 3600:.0f} runs/hour")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
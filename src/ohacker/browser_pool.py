@@ -0,0 +1,216 @@
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from types import TracebackType
+from typing import Any
+
+from loguru import logger
+from playwright.async_api import Browser, BrowserContext, Playwright, async_playwright
+
+
+@dataclass(eq=False)
+class _PooledBrowser:
+    browser: Browser
+    in_use: int = 0
+    """Number of contexts currently borrowed from this browser."""
+
+    uses: int = 0
+    """Number of contexts handed out by this browser over its lifetime."""
+
+    retired: bool = False
+    """Retired browsers hand out no new contexts and are closed once the last context is returned."""
+
+
+class BrowserPool:
+    """One Playwright driver and a few long-lived Chromium browsers handing out isolated contexts.
+
+    Starting Playwright and launching Chromium takes seconds, while a new `BrowserContext` in a running browser is
+    almost free and just as isolated (own cookies, storage and cache). The pool launches browsers lazily up to
+    `size`, spreads contexts over them, replaces browsers that got disconnected and recycles every browser after
+    `max_uses` contexts, so a long scan does not run on a browser that has been accumulating state for hours.
+
+    Example:
+        ```python
+        async with BrowserPool(size=2) as pool:
+            async with pool.context() as context:
+                page = await context.new_page()
+        ```
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_contexts_per_browser: int = 4,
+        max_uses: int = 50,
+        launch_options: dict[str, Any] | None = None,
+    ):
+        if size < 1 or max_contexts_per_browser < 1 or max_uses < 1:
+            raise ValueError("size, max_contexts_per_browser and max_uses must be at least 1.")
+        self.size = size
+        self.max_contexts_per_browser = max_contexts_per_browser
+        self.max_uses = max_uses
+        self.launch_options = launch_options or {}
+
+        self._playwright: Playwright | None = None
+        self._browsers: list[_PooledBrowser] = []
+        self._launching = 0
+        self._condition = asyncio.Condition()
+        self._start_lock = asyncio.Lock()
+        self._launched = 0
+        self._recycled = 0
+
+    async def __aenter__(self) -> "BrowserPool":
+        await self.start()
+        return self
+
+    async def __aexit__(
+        self, exc_type: type[BaseException] | None, exc_val: BaseException | None, exc_tb: TracebackType | None
+    ) -> None:
+        await self.close()
+
+    @property
+    def playwright(self) -> Playwright:
+        """The shared Playwright driver, raises RuntimeError before `start`."""
+        if self._playwright is None:
+            raise RuntimeError("Browser pool not started. Use 'async with pool:' or 'await pool.start()'.")
+        return self._playwright
+
+    async def start(self) -> None:
+        """Starts the shared Playwright driver. Browsers are launched on demand or by `warm_up`."""
+        async with self._start_lock:
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+
+    async def warm_up(self, browsers: int | None = None) -> None:
+        """Launches browsers ahead of time, so the first agents do not pay the startup cost."""
+        await self.start()
+        async with self._condition:
+            missing = min(browsers or self.size, self.size) - len(self._browsers) - self._launching
+            self._launching += max(missing, 0)
+        if missing <= 0:
+            return
+        results = await asyncio.gather(*(self._launch() for _ in range(missing)), return_exceptions=True)
+        async with self._condition:
+            self._launching -= missing
+            self._browsers.extend(_PooledBrowser(r) for r in results if not isinstance(r, BaseException))
+            self._condition.notify_all()
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            raise errors[0]
+
+    async def close(self) -> None:
+        """Closes all browsers and stops Playwright. Borrowed contexts become unusable."""
+        async with self._condition:
+            browsers, self._browsers = self._browsers, []
+        for slot in browsers:
+            await self._close_browser(slot.browser)
+        if self._playwright is not None:
+            playwright, self._playwright = self._playwright, None
+            try:
+                await playwright.stop()
+            except Exception as e:
+                logger.warning("Error stopping playwright: {}", e)
+
+    @asynccontextmanager
+    async def context(self, **context_options: Any) -> AsyncIterator[BrowserContext]:  # noqa: ANN401 - Browser.new_context options
+        """Borrows a fresh, isolated browser context. It is closed when the block exits."""
+        slot = await self._acquire()
+        try:
+            context = await slot.browser.new_context(**context_options)
+        except Exception:
+            await self._release(slot)
+            raise
+        try:
+            yield context
+        finally:
+            try:
+                await context.close()
+            except Exception as e:
+                logger.warning("Error closing browser context: {}", e)
+            await self._release(slot)
+
+    def stats(self) -> dict[str, int]:
+        """Current pool occupancy, useful for logging and tuning the pool size."""
+        return {
+            "browsers": len(self._browsers),
+            "contexts_in_use": sum(slot.in_use for slot in self._browsers),
+            "browsers_launched": self._launched,
+            "browsers_recycled": self._recycled,
+        }
+
+    async def _launch(self) -> Browser:
+        browser = await self.playwright.chromium.launch(**self.launch_options)
+        self._launched += 1
+        return browser
+
+    async def _acquire(self) -> _PooledBrowser:
+        await self.start()
+        async with self._condition:
+            while True:
+                self._drop_disconnected()
+                slot = self._pick()
+                if slot is not None:
+                    self._check_out(slot)
+                    return slot
+                if len(self._browsers) + self._launching < self.size:
+                    self._launching += 1
+                    break
+                await self._condition.wait()
+
+        # Launch outside of the lock, so returning contexts is not blocked by a slow browser startup.
+        try:
+            browser = await self._launch()
+        except Exception:
+            async with self._condition:
+                self._launching -= 1
+                self._condition.notify_all()
+            raise
+        async with self._condition:
+            self._launching -= 1
+            slot = _PooledBrowser(browser)
+            self._browsers.append(slot)
+            self._check_out(slot)
+            return slot
+
+    async def _release(self, slot: _PooledBrowser) -> None:
+        to_close = None
+        async with self._condition:
+            slot.in_use -= 1
+            if slot.in_use == 0 and (slot.retired or not slot.browser.is_connected()):
+                if slot in self._browsers:
+                    self._browsers.remove(slot)
+                to_close = slot.browser
+            self._condition.notify_all()
+        if to_close is not None:
+            self._recycled += 1
+            await self._close_browser(to_close)
+
+    def _pick(self) -> _PooledBrowser | None:
+        available = [
+            slot
+            for slot in self._browsers
+            if not slot.retired and slot.in_use < self.max_contexts_per_browser and slot.browser.is_connected()
+        ]
+        # The least loaded browser first, to spread the agents over all running browsers.
+        return min(available, key=lambda slot: slot.in_use, default=None)
+
+    def _check_out(self, slot: _PooledBrowser) -> None:
+        slot.in_use += 1
+        slot.uses += 1
+        if slot.uses >= self.max_uses:
+            slot.retired = True
+
+    def _drop_disconnected(self) -> None:
+        """Health check: crashed or disconnected browsers are forgotten, so a new one gets launched in their place."""
+        for slot in list(self._browsers):
+            if not slot.browser.is_connected():
+                logger.warning("Pooled browser disconnected, replacing it.")
+                self._browsers.remove(slot)
+
+    @staticmethod
+    async def _close_browser(browser: Browser) -> None:
+        try:
+            await browser.close()
+        except Exception as e:
+            logger.warning("Error closing browser: {}", e)
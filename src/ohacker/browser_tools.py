@@ -0,0 +1,215 @@
+import json
+from typing import Literal
+
+from agents import FunctionTool, function_tool
+from loguru import logger
+from pydantic import BaseModel
+
+from src.ohacker.computer_use import LocalPlaywrightComputer
+
+# Longest page text returned to the model, longer texts are cut
+MAX_TEXT_CHARS = 4000
+MAX_ELEMENTS = 100
+
+TOOLS_HINT = """
+Besides the 'computer' tool you have DOM-level tools, prefer them whenever they fit, each call saves several turns:
+- list_images / list_links return every image and link with its real URL, no need to click to discover URLs.
+- read_page_text returns the visible text of the page, no need to take screenshots to read content.
+- fill_and_submit_form fills inputs by CSS selector and submits them in one call.
+- perform_action_sequence runs several clicks, key presses, typing and navigations in one call.
+"""
+
+_LIST_IMAGES_SCRIPT = """
+(limit) => Array.from(document.images).slice(0, limit).map((img) => {
+    const link = img.closest("a");
+    return { alt: img.alt, src: img.currentSrc || img.src, link: link ? link.href : null };
+})
+"""
+
+_LIST_LINKS_SCRIPT = """
+(limit) => Array.from(document.querySelectorAll("a[href]")).slice(0, limit).map(
+    (a) => ({ text: a.innerText.trim().slice(0, 100), href: a.href })
+)
+"""
+
+
+class BrowserAction(BaseModel):
+    """One step of `perform_action_sequence`. Fields that do not apply to the action type must be null."""
+
+    type: Literal["click", "double_click", "click_selector", "type", "keypress", "scroll", "navigate", "wait"]
+    x: int | None
+    """Screen coordinate for click, double_click and scroll."""
+
+    y: int | None
+    """Screen coordinate for click, double_click and scroll."""
+
+    selector: str | None
+    """CSS selector for click_selector."""
+
+    text: str | None
+    """Text for type."""
+
+    keys: list[str] | None
+    """Key combination for keypress, e.g. ["ctrl", "a"]."""
+
+    scroll_y: int | None
+    """Pixels to scroll down (negative scrolls up) for scroll."""
+
+    url: str | None
+    """Target URL for navigate."""
+
+
+class FormField(BaseModel):
+    """One input of `fill_and_submit_form`."""
+
+    selector: str
+    """CSS selector of the input or textarea."""
+
+    value: str
+
+
+async def _goto(computer: LocalPlaywrightComputer, url: str) -> str:
+    await computer.page.goto(url, wait_until="domcontentloaded", timeout=60000)
+    computer.mark_page_changed()
+    return computer.page.url
+
+
+async def _perform(computer: LocalPlaywrightComputer, action: BrowserAction) -> None:
+    match action.type:
+        case "click" | "double_click" | "scroll" if action.x is None or action.y is None:
+            raise ValueError(f"{action.type} needs x and y.")
+        case "click":
+            await computer.click(action.x, action.y)  # type: ignore[arg-type]
+        case "double_click":
+            await computer.double_click(action.x, action.y)  # type: ignore[arg-type]
+        case "scroll":
+            await computer.scroll(action.x, action.y, 0, action.scroll_y or 0)  # type: ignore[arg-type]
+        case "click_selector":
+            await computer.page.click(action.selector or "", timeout=10000)
+            computer.mark_page_changed()
+        case "type":
+            await computer.type(action.text or "")
+        case "keypress":
+            await computer.keypress(action.keys or [])
+        case "navigate":
+            await _goto(computer, action.url or "")
+        case "wait":
+            await computer.wait_until_quiet()
+
+
+def build_browser_tools(computer: LocalPlaywrightComputer, dom_tools: bool = True) -> list[FunctionTool]:
+    """Function tools working on the page of `computer`, next to the `computer` tool itself.
+
+    Without `dom_tools` only `get_current_url` and `navigate_to_url` are returned, which is the original tool set
+    and is useful as a baseline when measuring turns per finding.
+    """
+
+    @function_tool
+    async def get_current_url() -> str:
+        """Gets the current URL of the browser page."""
+        try:
+            current_url = computer.page.url
+            logger.info("Tool: Got current URL: {}", current_url)
+            return current_url
+        except Exception as e:
+            logger.error("Tool Error (get_current_url): {}", e)
+            return f"Error getting URL: {str(e)}"
+
+    @function_tool
+    async def navigate_to_url(url: str) -> str:
+        """Navigates the browser page to the specified URL."""
+        logger.info("Tool: Attempting to navigate to {}...", url)
+        try:
+            final_url = await _goto(computer, url)
+            logger.info("Tool: Successfully navigated. Current URL: {}", final_url)
+            return f"Successfully navigated to {url}. Current URL is now {final_url}."
+        except Exception as e:
+            logger.error("Tool Error (navigate_to_url): {}", e)
+            return f"Error navigating to {url}: {str(e)}"
+
+    tools = [get_current_url, navigate_to_url]
+    if dom_tools:
+        tools += _dom_tools(computer)
+    return tools
+
+
+def _dom_tools(computer: LocalPlaywrightComputer) -> list[FunctionTool]:
+    """The tools working on the DOM and batching actions, see `TOOLS_HINT`."""
+
+    @function_tool
+    async def perform_action_sequence(actions: list[BrowserAction]) -> str:
+        """Performs several browser actions in order within a single call and reports the outcome of each.
+
+        Stops at the first failing action. Take a screenshot or read the page text afterwards to see the result.
+
+        Args:
+            actions: The actions to perform, in order.
+        """
+        report = []
+        # The computer actions only log their errors by default, a failed step must not be reported as ok
+        with computer.raising_action_errors():
+            for i, action in enumerate(actions, start=1):
+                try:
+                    await _perform(computer, action)
+                    report.append(f"{i}. {action.type}: ok")
+                except Exception as e:
+                    report.append(f"{i}. {action.type}: failed ({e}), remaining actions skipped")
+                    break
+        await computer.wait_until_quiet()
+        report.append(f"Current URL: {computer.page.url}")
+        logger.info("Tool: Performed {} actions", len(actions))
+        return "\n".join(report)
+
+    @function_tool
+    async def list_images() -> str:
+        """Lists the images on the page with their source URL and the URL of the link around them, as JSON."""
+        try:
+            return json.dumps(await computer.page.evaluate(_LIST_IMAGES_SCRIPT, MAX_ELEMENTS))
+        except Exception as e:
+            return f"Error listing images: {e}"
+
+    @function_tool
+    async def list_links() -> str:
+        """Lists the links on the page with their text and target URL, as JSON."""
+        try:
+            return json.dumps(await computer.page.evaluate(_LIST_LINKS_SCRIPT, MAX_ELEMENTS))
+        except Exception as e:
+            return f"Error listing links: {e}"
+
+    @function_tool
+    async def read_page_text(selector: str | None) -> str:
+        """Returns the visible text of the page or of the first element matching a CSS selector.
+
+        Args:
+            selector: CSS selector of the element to read, or null for the whole page.
+        """
+        try:
+            text = await computer.page.inner_text(selector or "body", timeout=10000)
+        except Exception as e:
+            return f"Error reading page text: {e}"
+        suffix = f"\n... ({len(text) - MAX_TEXT_CHARS} more characters)" if len(text) > MAX_TEXT_CHARS else ""
+        return f"URL: {computer.page.url}\n{text[:MAX_TEXT_CHARS]}{suffix}"
+
+    @function_tool
+    async def fill_and_submit_form(fields: list[FormField], submit_selector: str | None) -> str:
+        """Fills form inputs by CSS selector and submits the form.
+
+        Args:
+            fields: Inputs to fill.
+            submit_selector: CSS selector of the submit button, or null to press Enter in the last field.
+        """
+        try:
+            for form_field in fields:
+                await computer.page.fill(form_field.selector, form_field.value, timeout=10000)
+            if submit_selector:
+                await computer.page.click(submit_selector, timeout=10000)
+            elif fields:
+                await computer.page.press(fields[-1].selector, "Enter", timeout=10000)
+            computer.mark_page_changed()
+            await computer.wait_until_quiet()
+        except Exception as e:
+            return f"Error filling the form: {e}"
+        logger.info("Tool: Submitted a form with {} fields", len(fields))
+        return f"Form submitted. Current URL: {computer.page.url}"
+
+    return [perform_action_sequence, list_images, list_links, read_page_text, fill_and_submit_form]
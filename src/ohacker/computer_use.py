@@ -1,5 +1,7 @@
-import asyncio
-import base64
+import time
+from collections import OrderedDict
+from collections.abc import Iterator
+from contextlib import AbstractAsyncContextManager, contextmanager
 from typing import Literal, Optional  # Added Optional
 
 from agents import (
@@ -7,7 +9,16 @@ from agents import (
     Button,
     Environment,
 )
-from playwright.async_api import Browser, Page, Playwright, async_playwright
+from loguru import logger
+from playwright.async_api import Browser, BrowserContext, Page, Playwright, async_playwright
+
+from src.ohacker.browser_pool import BrowserPool
+from src.ohacker.frame_hash import FrameChangeDetector, frame_digest
+from src.ohacker.launch_profiles import HEADFUL_PROFILE, LaunchProfile
+from src.ohacker.metrics import METRICS
+from src.ohacker.page_waits import NetworkActivity, wait_for_page_quiet
+from src.ohacker.screenshot_dump import ScreenshotDumper
+from src.ohacker.screenshot_encoding import LOSSLESS_ENCODING, ScreenshotEncoder, ScreenshotEncoding, ScreenshotStats
 
 # CUA_KEY_TO_PLAYWRIGHT_KEY remains the same...
 CUA_KEY_TO_PLAYWRIGHT_KEY = {
@@ -41,97 +52,184 @@ CUA_KEY_TO_PLAYWRIGHT_KEY = {
     **{chr(c): chr(c) for c in range(ord("a"), ord("z") + 1)},
 }
 
+# Frames whose page URL and title are remembered for `describe_frame`
+FRAME_NOTES = 64
+
 
 class LocalPlaywrightComputer(AsyncComputer):
-    """A computer, implemented using a local Playwright browser."""
+    """A computer, implemented using a local Playwright browser.
+
+    By default the computer starts its own Playwright and browser. When a `BrowserPool` is given, it borrows an
+    isolated browser context from the pool instead and returns it on exit, leaving the browser running.
+    The `profile` decides headless or headful launch, Chromium flags, request blocking and the viewport; with a
+    pool only its context part applies, the browsers are launched by the pool.
+    Screenshots are kept on disk only when a `ScreenshotDumper` is given. The `encoding` picks the format,
+    quality and resolution of the frames sent to the model; coordinates of downscaled frames are mapped back to
+    the page before every action. With `reuse_unchanged_frames`, an exact digest of a thumbnail of every frame is
+    kept and a screenshot of an unchanged page (e.g. right after `wait` or `move`) returns the cached frame.
+    `wait` returns as soon as the page is quiet instead of sleeping, `max_wait` caps it.
+    The page URL and title of the last frames are kept, `describe_frame` tells where a frame was taken.
+    Failed actions are logged and ignored, so a bad step never ends the agent run; inside `raising_action_errors`
+    they raise instead.
+    """
 
     # --- MODIFICATION: Accept target_url in __init__ ---
-    def __init__(self, target_url: str):
+    def __init__(
+        self,
+        target_url: str,
+        pool: BrowserPool | None = None,
+        profile: LaunchProfile = HEADFUL_PROFILE,
+        screenshot_dumper: ScreenshotDumper | None = None,
+        encoding: ScreenshotEncoding = LOSSLESS_ENCODING,
+        reuse_unchanged_frames: bool = True,
+        max_wait: float = 3.0,
+    ):
         self._playwright: Playwright | None = None
         self._browser: Browser | None = None
         self._page: Page | None = None
         self._target_url: str = target_url
+        self._pool: BrowserPool | None = pool
+        self._profile: LaunchProfile = profile
+        self._screenshot_dumper: ScreenshotDumper | None = screenshot_dumper
+        self._encoder: ScreenshotEncoder = ScreenshotEncoder(encoding, profile.viewport)
+        self._frame_changes: FrameChangeDetector | None = FrameChangeDetector() if reuse_unchanged_frames else None
+        self._network: NetworkActivity | None = None
+        self._max_wait: float = max_wait
+        self._context_manager: AbstractAsyncContextManager[BrowserContext] | None = None
+        # Page URL by frame, and page title by URL, read once per page load instead of on every screenshot
+        self._frame_notes: OrderedDict[int, str] = OrderedDict()
+        self._page_titles: OrderedDict[str, str] = OrderedDict()
+        self._raise_action_errors: bool = False
 
     # _get_browser_and_page remains largely the same, uses self._target_url
     async def _get_browser_and_page(self) -> tuple[Browser, Page]:
         if not self._target_url:
             raise ValueError("Target URL was not set during initialization.")
-        width, height = self.dimensions
-        launch_args = [f"--window-size={width},{height}"]
         try:
             # Ensure playwright instance exists before launching browser
             if self._playwright is None:
                 raise RuntimeError("Playwright instance not available in _get_browser_and_page.")
-            browser = await self._playwright.chromium.launch(headless=False, args=launch_args)
+            browser = await self._playwright.chromium.launch(**self._profile.launch_options())
         except Exception as e:
-            print(f"Error launching Playwright browser: {e}")
-            print("Ensure Playwright browsers are installed ('playwright install')")
+            logger.error("Error launching Playwright browser: {}", e)
+            logger.error("Ensure Playwright browsers are installed ('playwright install')")
             raise
         try:
-            page = await browser.new_page()
-            await page.set_viewport_size({"width": width, "height": height})
-            print(f"Navigating to target URL: {self._target_url}")
+            context = await browser.new_context(**self._profile.context_options())
+            await self._profile.apply(context)
+            page = await context.new_page()
+            await self._open_target(page)
+        except Exception:
+            await browser.close()  # Clean up browser if navigation fails
+            raise
+        return browser, page
+
+    async def _get_pooled_page(self, pool: BrowserPool) -> tuple[Browser, Page]:
+        """Borrows a context from the pool and opens the target in a new page of it."""
+        if not self._target_url:
+            raise ValueError("Target URL was not set during initialization.")
+        context_manager = pool.context(**self._profile.context_options())
+        context = await context_manager.__aenter__()
+        self._context_manager = context_manager
+        await self._profile.apply(context)
+        page = await context.new_page()
+        await self._open_target(page)
+        browser = context.browser
+        if browser is None:
+            raise RuntimeError("Pooled browser context is not attached to a browser.")
+        return browser, page
+
+    async def _open_target(self, page: Page) -> None:
+        self._network = NetworkActivity(page)
+        # Navigations by links, forms, scripts or `navigate` never reuse the frame of the previous page
+        page.on("framenavigated", lambda frame: self.mark_page_changed() if frame == page.main_frame else None)
+        page.on("domcontentloaded", self._remember_title)
+        try:
+            logger.debug("Navigating to target URL: {}", self._target_url)
             # Increased timeout slightly for potentially slower local setups
             await page.goto(self._target_url, wait_until="domcontentloaded", timeout=60000)
 
-            print(f"Successfully navigated to {self._target_url}")
+            logger.info("Navigated to {}", self._target_url)
         except Exception as e:
-            print(f"Error navigating to {self._target_url}: {e}")
-            await browser.close()  # Clean up browser if navigation fails
+            logger.error("Error navigating to {}: {}", self._target_url, e)
             raise
-        return browser, page
 
     # --- MODIFICATION: Move startup logic into __aenter__ ---
     async def __aenter__(self):
-        """Starts Playwright, launches browser, and navigates upon entering context."""
+        """Starts Playwright (or borrows a pooled context), launches browser, and navigates upon entering context."""
         if self._playwright or self._browser:
-            print("Computer context already entered.")
+            logger.warning("Computer context already entered.")
             return self  # Already initialized
 
-        print("Starting Playwright...")
+        started = time.perf_counter()
         try:
-            # Important: Check if Playwright is already running (less likely here, but good practice)
-            if self._playwright is None:
-                self._playwright = await async_playwright().start()
+            if self._pool is not None:
+                logger.debug("Borrowing browser context from the pool and navigating...")
+                self._browser, self._page = await self._get_pooled_page(self._pool)
             else:
-                print("Playwright instance already exists.")
+                logger.debug("Starting Playwright...")
+                # Important: Check if Playwright is already running (less likely here, but good practice)
+                if self._playwright is None:
+                    self._playwright = await async_playwright().start()
+                else:
+                    logger.debug("Playwright instance already exists.")
 
-            print("Launching browser and navigating...")
-            self._browser, self._page = await self._get_browser_and_page()
-            print("Computer ready.")
+                logger.debug("Launching browser and navigating...")
+                self._browser, self._page = await self._get_browser_and_page()
+            METRICS.observe("browser_startup_seconds", time.perf_counter() - started, pooled=self._pool is not None)
+            logger.debug("Computer ready.")
         except Exception as e:
-            print(f"Error during computer startup (__aenter__): {e}")
+            logger.error("Error during computer startup (__aenter__): {}", e)
             # Attempt cleanup if startup failed
             await self.__aexit__(type(e), e, e.__traceback__)
             raise  # Re-raise the exception
         return self  # Required for 'async with'
 
-    # __aexit__ remains the same
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        print("Closing browser and stopping Playwright...")
         # Use Optional type hint now
         browser: Optional[Browser] = self._browser
         playwright: Optional[Playwright] = self._playwright
+        context_manager = self._context_manager
 
         self._page = None  # Clear page reference first
         self._browser = None
         self._playwright = None
+        self._context_manager = None
+
+        if self._screenshot_dumper is not None:
+            try:
+                await self._screenshot_dumper.close()
+            except Exception as e:
+                logger.warning("Error closing the screenshot dump: {}", e)  # The browser is cleaned up regardless
 
+        if context_manager is not None:
+            # The browser belongs to the pool, only the borrowed context is closed.
+            logger.debug("Returning browser context to the pool...")
+            try:
+                await context_manager.__aexit__(exc_type, exc_val, exc_tb)
+            except Exception as e:
+                logger.warning("Error returning browser context: {}", e)
+            logger.debug("Computer stopped.")
+            return
+
+        logger.debug("Closing browser and stopping Playwright...")
         if browser:
             try:
                 await browser.close()
             except Exception as e:
-                print(f"Error closing browser: {e}")  # Log error but continue cleanup
+                logger.warning("Error closing browser: {}", e)  # Log error but continue cleanup
         if playwright:
             try:
                 await playwright.stop()
             except Exception as e:
-                print(f"Error stopping playwright: {e}")
-        print("Computer stopped.")
+                logger.warning("Error stopping playwright: {}", e)
+        logger.debug("Computer stopped.")
 
     # Properties remain the same...
     @property
     def playwright(self) -> Playwright:
+        if self._pool is not None:
+            return self._pool.playwright
         if self._playwright is None:
             raise RuntimeError("Playwright not started. Use 'async with computer:' context.")
         return self._playwright
@@ -154,106 +252,204 @@ class LocalPlaywrightComputer(AsyncComputer):
 
     @property
     def dimensions(self) -> tuple[int, int]:
-        # Standard viewport size
-        return (1080, 1080)
+        # Size of the encoded screenshots, the viewport of the launch profile unless frames are downscaled
+        return self._encoder.dimensions
+
+    @property
+    def screenshot_stats(self) -> ScreenshotStats:
+        """Size and encode time of the screenshots taken so far."""
+        return self._encoder.stats
+
+    @property
+    def frame_changes(self) -> FrameChangeDetector | None:
+        """Hit/miss counters of reused frames, None when frame reuse is disabled."""
+        return self._frame_changes
+
+    def mark_page_changed(self) -> None:
+        """Forces a full capture on the next screenshot, e.g. after navigating outside of the computer actions."""
+        if self._frame_changes is not None:
+            self._frame_changes.invalidate()
+
+    @contextmanager
+    def raising_action_errors(self) -> Iterator[None]:
+        """Makes the actions raise their errors instead of only logging them, for callers reporting every step."""
+        previous, self._raise_action_errors = self._raise_action_errors, True
+        try:
+            yield
+        finally:
+            self._raise_action_errors = previous
+
+    def describe_frame(self, b64_string: str) -> str | None:
+        """URL and title of the page a frame returned by `screenshot` shows, None for unknown frames."""
+        url = self._frame_notes.get(hash(b64_string))
+        if url is None:
+            return None
+        title = self._page_titles.get(url)
+        return f'{url} ("{title}")' if title else url
+
+    def _note_frame(self, b64_string: str) -> None:
+        key = hash(b64_string)
+        self._frame_notes[key] = self.page.url
+        self._frame_notes.move_to_end(key)
+        if len(self._frame_notes) > FRAME_NOTES:
+            self._frame_notes.popitem(last=False)
+
+    async def _remember_title(self, page: Page) -> None:
+        try:
+            title = await page.title()
+        except Exception:
+            return
+        self._page_titles[page.url] = title
+        self._page_titles.move_to_end(page.url)
+        if len(self._page_titles) > FRAME_NOTES:
+            self._page_titles.popitem(last=False)
 
     # screenshot, click, double_click, scroll, type, wait, move, keypress, drag methods remain the same...
+    @METRICS.timed("computer_action_seconds", action="screenshot")
     async def screenshot(self) -> str:
-        # print("Taking screenshot...")
+        # logger.debug("Taking screenshot...")
         try:
-            png_bytes = await self.page.screenshot(full_page=False)
-            with open("screen.png", "wb") as f:
-                f.write(png_bytes)
+            digest = None
+            if self._frame_changes is not None:
+                # A thumbnail is enough to tell whether the page changed since the last frame
+                thumbnail = await self._encoder.capture_thumbnail(self.page, self._frame_changes.thumbnail_width)
+                digest = frame_digest(thumbnail)
+                cached_frame = self._frame_changes.lookup(digest)
+                if cached_frame is not None:
+                    self._note_frame(cached_frame)
+                    return cached_frame
 
-            b64_string = base64.b64encode(png_bytes).decode("utf-8")
-            # print("Screenshot taken.")
+            b64_string = await self._encoder.encode(self.page)
+            if self._screenshot_dumper is not None:
+                # Opt-in debug dump, decoded and written in the background
+                self._screenshot_dumper.submit(b64_string, extension=self._encoder.encoding.format)
+            if digest is not None and self._frame_changes is not None:
+                self._frame_changes.store(digest, b64_string)
+            self._note_frame(b64_string)
+            # logger.debug("Screenshot taken.")
             return b64_string
         except Exception as e:
-            print(f"Error taking screenshot: {e}")
+            logger.error("Error taking screenshot: {}", e)
             return ""
 
+    @METRICS.timed("computer_action_seconds", action="click")
     async def click(self, x: int, y: int, button: Button = "left") -> None:
-        print(f"Clicking at ({x}, {y}) with {button} button...")
+        logger.debug("Clicking at ({}, {}) with {} button...", x, y, button)
         playwright_button: Literal["left", "middle", "right"] = "left"
         if button in ("left", "right", "middle"):
             playwright_button = button
         try:
-            await self.page.mouse.click(x, y, button=playwright_button)
-            print("Click successful.")
+            await self.page.mouse.click(*self._encoder.to_page(x, y), button=playwright_button)
+            self.mark_page_changed()
+            logger.debug("Click successful.")
         except Exception as e:
-            print(f"Error clicking at ({x}, {y}): {e}")
+            logger.warning("Error clicking at ({}, {}): {}", x, y, e)
+            if self._raise_action_errors:
+                raise
 
+    @METRICS.timed("computer_action_seconds", action="double_click")
     async def double_click(self, x: int, y: int) -> None:
-        print(f"Double clicking at ({x}, {y})...")
+        logger.debug("Double clicking at ({}, {})...", x, y)
         try:
-            await self.page.mouse.dblclick(x, y)
-            print("Double click successful.")
+            await self.page.mouse.dblclick(*self._encoder.to_page(x, y))
+            self.mark_page_changed()
+            logger.debug("Double click successful.")
         except Exception as e:
-            print(f"Error double clicking at ({x}, {y}): {e}")
+            logger.warning("Error double clicking at ({}, {}): {}", x, y, e)
+            if self._raise_action_errors:
+                raise
 
+    @METRICS.timed("computer_action_seconds", action="scroll")
     async def scroll(self, x: int, y: int, scroll_x: int, scroll_y: int) -> None:
-        print(f"Scrolling by ({scroll_x}, {scroll_y}) from ({x}, {y})...")
+        logger.debug("Scrolling by ({}, {}) from ({}, {})...", scroll_x, scroll_y, x, y)
         try:
-            await self.page.mouse.move(x, y)
-            await self.page.evaluate(f"window.scrollBy({scroll_x}, {scroll_y})")
-            print("Scroll successful.")
+            await self.page.mouse.move(*self._encoder.to_page(x, y))
+            page_scroll_x, page_scroll_y = self._encoder.to_page(scroll_x, scroll_y)
+            await self.page.evaluate(f"window.scrollBy({page_scroll_x}, {page_scroll_y})")
+            self.mark_page_changed()
+            logger.debug("Scroll successful.")
         except Exception as e:
-            print(f"Error scrolling: {e}")
+            logger.warning("Error scrolling: {}", e)
+            if self._raise_action_errors:
+                raise
 
+    @METRICS.timed("computer_action_seconds", action="type")
     async def type(self, text: str) -> None:
-        print(f"Typing text: '{text[:50]}{'...' if len(text) > 50 else ''}'...")
+        logger.debug("Typing text: '{}{}'...", text[:50], "..." if len(text) > 50 else "")
         try:
             await self.page.keyboard.type(text)
-            print("Typing successful.")
+            self.mark_page_changed()
+            logger.debug("Typing successful.")
         except Exception as e:
-            print(f"Error typing text: {e}")
+            logger.warning("Error typing text: {}", e)
+            if self._raise_action_errors:
+                raise
 
+    @METRICS.timed("computer_action_seconds", action="wait")
     async def wait(self) -> None:
-        print("Waiting for 1 second...")
-        await asyncio.sleep(1)
-        print("Wait finished.")
+        logger.debug("Waiting for the page to settle (at most {}s)...", self._max_wait)
+        waited = await self.wait_until_quiet()
+        logger.debug("Wait finished after {:.2f}s.", waited)
+
+    async def wait_until_quiet(self, timeout: float | None = None) -> float:
+        """Waits until requests, DOM mutations and animations of the page settle. Returns the seconds waited."""
+        return await wait_for_page_quiet(self.page, self._network, timeout=timeout or self._max_wait)
 
+    @METRICS.timed("computer_action_seconds", action="move")
     async def move(self, x: int, y: int) -> None:
-        print(f"Moving mouse to ({x}, {y})...")
+        logger.debug("Moving mouse to ({}, {})...", x, y)
         try:
-            await self.page.mouse.move(x, y)
-            print("Mouse move successful.")
+            await self.page.mouse.move(*self._encoder.to_page(x, y))
+            logger.debug("Mouse move successful.")
         except Exception as e:
-            print(f"Error moving mouse to ({x}, {y}): {e}")
+            logger.warning("Error moving mouse to ({}, {}): {}", x, y, e)
+            if self._raise_action_errors:
+                raise
 
+    @METRICS.timed("computer_action_seconds", action="keypress")
     async def keypress(self, keys: list[str]) -> None:
         if not keys:
             return
         mapped_keys = [CUA_KEY_TO_PLAYWRIGHT_KEY.get(key.lower(), key) for key in keys]
         combined_keys = "+".join(mapped_keys)
-        print(f"Pressing key combination: {combined_keys}...")
+        logger.debug("Pressing key combination: {}...", combined_keys)
         try:
             for key in mapped_keys:
                 await self.page.keyboard.down(key)
             for key in reversed(mapped_keys):
                 await self.page.keyboard.up(key)
-            print("Keypress successful.")
+            self.mark_page_changed()
+            logger.debug("Keypress successful.")
         except Exception as e:
-            print(f"Error pressing keys '{combined_keys}': {e}")
+            logger.warning("Error pressing keys '{}': {}", combined_keys, e)
+            if self._raise_action_errors:
+                raise
 
+    @METRICS.timed("computer_action_seconds", action="drag")
     async def drag(self, path: list[tuple[int, int]]) -> None:
         if not path or len(path) < 2:
-            print("Drag path requires at least two points.")
+            logger.warning("Drag path requires at least two points.")
+            if self._raise_action_errors:
+                raise ValueError("Drag path requires at least two points.")
             return
         start_x, start_y = path[0]
-        print(f"Starting drag from ({start_x}, {start_y})...")
+        logger.debug("Starting drag from ({}, {})...", start_x, start_y)
         try:
-            await self.page.mouse.move(start_x, start_y)
+            await self.page.mouse.move(*self._encoder.to_page(start_x, start_y))
             await self.page.mouse.down()
-            print("Mouse down.")
+            logger.debug("Mouse down.")
             for i, (px, py) in enumerate(path[1:]):
-                print(f"Dragging to point {i + 1}: ({px}, {py})")
-                await self.page.mouse.move(px, py)
+                logger.debug("Dragging to point {}: ({}, {})", i + 1, px, py)
+                await self.page.mouse.move(*self._encoder.to_page(px, py))
             await self.page.mouse.up()
-            print("Mouse up. Drag complete.")
+            self.mark_page_changed()
+            logger.debug("Mouse up. Drag complete.")
         except Exception as e:
-            print(f"Error during drag operation: {e}")
+            logger.warning("Error during drag operation: {}", e)
+            self.mark_page_changed()
             try:
                 await self.page.mouse.up()
             except Exception:
                 pass
+            if self._raise_action_errors:
+                raise
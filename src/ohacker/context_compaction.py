@@ -0,0 +1,271 @@
+"""History compaction for the computer-use loop.
+
+The Agents SDK sends the whole run history with every request, including every earlier screenshot as a base64
+data URL, so requests grow by a frame per turn. `CompactingProvider` wraps the model provider and rewrites the
+input of every request before it leaves: only the last `keep_screenshots` frames stay, older ones are swapped for
+a 1x1 placeholder followed by a short text note of what the frame showed (the action before it and the page URL
+and title, from `LocalPlaywrightComputer.describe_frame`). When a request is still larger than
+`max_request_bytes`, fewer frames are kept and long text tool outputs of earlier turns are shortened. Bytes and
+latency of every request are kept in `TurnStats`.
+"""
+
+import json
+import statistics
+import time
+from collections.abc import AsyncIterator, Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+from agents import AgentOutputSchema, Handoff, Model, ModelProvider, ModelResponse, ModelSettings, ModelTracing, Tool
+from agents.items import TResponseInputItem, TResponseStreamEvent
+
+from src.ohacker.metrics import METRICS
+
+# A 1x1 PNG, stands in for compacted frames: computer call outputs must carry an image
+PLACEHOLDER_IMAGE = (
+    "data:image/png;base64,"
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=="
+)
+
+# Text tool outputs of earlier turns are cut to this many characters when a request is over its size cap
+TRIMMED_OUTPUT_CHARS = 2000
+
+# Base64 prefixes of the image formats the screenshot encoder produces
+_BASE64_MAGIC = {"iVBORw0KGgo": "png", "/9j/": "jpeg", "UklGR": "webp"}
+
+_PNG_DATA_URL = "data:image/png;base64,"
+
+
+def _item_type(item: object) -> str | None:
+    return item.get("type") if isinstance(item, dict) else None
+
+
+def _screenshot_url(item: object) -> str | None:
+    if not isinstance(item, dict) or item.get("type") != "computer_call_output":
+        return None
+    output = item.get("output")
+    return output.get("image_url") if isinstance(output, dict) else None
+
+
+def _with_image(item: dict[str, Any], image_url: str) -> dict[str, Any]:
+    return {**item, "output": {**item["output"], "image_url": image_url}}
+
+
+def fix_mime_type(image_url: str) -> str:
+    """Labels a data URL with the real image format: the SDK calls every frame image/png, also jpeg and webp."""
+    if not image_url.startswith(_PNG_DATA_URL):
+        return image_url
+    payload = image_url[len(_PNG_DATA_URL) :]
+    for magic, image_format in _BASE64_MAGIC.items():
+        if payload.startswith(magic):
+            return image_url if image_format == "png" else f"data:image/{image_format};base64,{payload}"
+    return image_url
+
+
+def _item_bytes(item: object) -> int:
+    if (url := _screenshot_url(item)) is not None:
+        return len(url) + 100
+    return len(json.dumps(item, default=str))
+
+
+def _describe_action(call: object) -> str:
+    action = call.get("action", {}) if isinstance(call, dict) else {}
+    kind = action.get("type", "action")
+    if "x" in action and "y" in action:
+        return f"{kind} at ({action['x']}, {action['y']})"
+    if kind == "type":
+        return f"typing {action.get('text', '')[:40]!r}"
+    if kind == "keypress":
+        return f"pressing {'+'.join(action.get('keys', []))}"
+    return kind
+
+
+@dataclass
+class CompactionPolicy:
+    """How much of the run history `CompactingProvider` sends with every request."""
+
+    keep_screenshots: int = 3
+    """Most recent frames sent in full, 0 keeps every frame."""
+
+    max_request_bytes: int | None = 3 * 1024 * 1024
+    """Size cap of the request input, None for no cap. The last frame is always kept."""
+
+    describe_frame: Callable[[str], str | None] | None = None
+    """Text description of a frame by its base64 data, for the note that replaces it."""
+
+
+def compact_input(items: list[TResponseInputItem], policy: CompactionPolicy) -> tuple[list[TResponseInputItem], int]:
+    """Returns the compacted input and how many frames were replaced. The given items are never modified."""
+    screenshots = [index for index, item in enumerate(items) if _screenshot_url(item) is not None]
+    keep = len(screenshots) if policy.keep_screenshots <= 0 else min(policy.keep_screenshots, len(screenshots))
+    kept = set(screenshots[len(screenshots) - keep :])
+    # A replaced frame still costs its placeholder image and its note
+    replaced_bytes = len(PLACEHOLDER_IMAGE) + 400
+    frame_bytes = {index: _item_bytes(items[index]) for index in screenshots}
+    fixed_bytes = sum(_item_bytes(item) for index, item in enumerate(items) if index not in frame_bytes)
+
+    def total() -> int:
+        return fixed_bytes + sum(size if index in kept else replaced_bytes for index, size in frame_bytes.items())
+
+    trim = False
+    if policy.max_request_bytes is not None:
+        while total() > policy.max_request_bytes and len(kept) > 1:
+            kept.remove(min(kept))
+        trim = total() > policy.max_request_bytes
+
+    calls = {item.get("call_id"): item for item in items if _item_type(item) == "computer_call"}
+    text_outputs = [index for index, item in enumerate(items) if _item_type(item) == "function_call_output"]
+    # The newest text output is what the model is reacting to, it is never cut
+    trimmed = set(text_outputs[:-1]) if trim else set()
+    compacted: list[TResponseInputItem] = []
+    replaced = 0
+    for index, item in enumerate(items):
+        url = _screenshot_url(item)
+        if url is not None and index in kept:
+            compacted.append(_with_image(item, fix_mime_type(url)))  # type: ignore[arg-type]
+        elif url is not None:
+            replaced += 1
+            compacted.append(_with_image(item, PLACEHOLDER_IMAGE))  # type: ignore[arg-type]
+            description = policy.describe_frame(url.split(",", 1)[-1]) if policy.describe_frame else None
+            action = _describe_action(calls.get(item.get("call_id")))  # type: ignore[union-attr]
+            note = f"(Context note) The screenshot after {action} was removed to keep requests small."
+            if description:
+                note += f" It showed {description}."
+            compacted.append({"role": "user", "content": note})
+        elif index in trimmed:
+            output = str(item.get("output", ""))  # type: ignore[union-attr]
+            if len(output) > TRIMMED_OUTPUT_CHARS:
+                output = output[:TRIMMED_OUTPUT_CHARS] + f"... ({len(output) - TRIMMED_OUTPUT_CHARS} characters cut)"
+            compacted.append({**item, "output": output})  # type: ignore[misc,typeddict-item]
+        else:
+            compacted.append(item)
+    return compacted, replaced
+
+
+@dataclass
+class TurnRecord:
+    """Size and latency of one model request."""
+
+    request_bytes: int
+    original_bytes: int
+    seconds: float
+    screenshots_replaced: int
+
+
+@dataclass
+class TurnStats:
+    """Request size and model latency of every turn of a run."""
+
+    turns: list[TurnRecord] = field(default_factory=list)
+
+    def summary(self) -> str:
+        """One line of request sizes and latency for the end-of-run log."""
+        if not self.turns:
+            return "no model requests"
+        sizes = [turn.request_bytes for turn in self.turns]
+        saved = sum(turn.original_bytes - turn.request_bytes for turn in self.turns)
+        return (
+            f"{len(self.turns)} requests, {statistics.mean(sizes) / 1024:.1f} KiB on average and "
+            f"{max(sizes) / 1024:.1f} KiB at most, {saved / 1024 / 1024:.1f} MiB compacted away, "
+            f"{statistics.median(turn.seconds for turn in self.turns):.2f}s median latency"
+        )
+
+
+class CompactingModel(Model):
+    """Compacts the input of every request before it reaches the wrapped model, records each turn in `stats`."""
+
+    def __init__(self, model: Model, policy: CompactionPolicy, stats: TurnStats, model_name: str | None = None):
+        self.model = model
+        self.policy = policy
+        self.stats = stats
+        self.model_name = model_name
+
+    def _compact(self, input: str | list[TResponseInputItem]) -> tuple[str | list[TResponseInputItem], int, int]:
+        if isinstance(input, str):
+            return input, len(input), 0
+        original_bytes = sum(_item_bytes(item) for item in input)
+        compacted, replaced = compact_input(input, self.policy)
+        return compacted, original_bytes, replaced
+
+    def _record(
+        self, input: str | list[TResponseInputItem], original_bytes: int, replaced: int, started: float
+    ) -> None:
+        request_bytes = len(input) if isinstance(input, str) else sum(_item_bytes(item) for item in input)
+        seconds = time.perf_counter() - started
+        self.stats.turns.append(TurnRecord(request_bytes, original_bytes, seconds, replaced))
+        METRICS.observe("model_request_seconds", seconds, model=self.model_name)
+        METRICS.count("model_request_bytes_total", request_bytes, model=self.model_name)
+
+    async def get_response(
+        self,
+        system_instructions: str | None,
+        input: str | list[TResponseInputItem],
+        model_settings: ModelSettings,
+        tools: list[Tool],
+        output_schema: AgentOutputSchema | None,
+        handoffs: list[Handoff],
+        tracing: ModelTracing,
+        *,
+        previous_response_id: str | None,
+    ) -> ModelResponse:
+        """Gets the response of the wrapped model to the compacted input."""
+        compacted, original_bytes, replaced = self._compact(input)
+        started = time.perf_counter()
+        response = await self.model.get_response(
+            system_instructions,
+            compacted,
+            model_settings,
+            tools,
+            output_schema,
+            handoffs,
+            tracing,
+            previous_response_id=previous_response_id,
+        )
+        self._record(compacted, original_bytes, replaced, started)
+        return response
+
+    async def stream_response(
+        self,
+        system_instructions: str | None,
+        input: str | list[TResponseInputItem],
+        model_settings: ModelSettings,
+        tools: list[Tool],
+        output_schema: AgentOutputSchema | None,
+        handoffs: list[Handoff],
+        tracing: ModelTracing,
+        *,
+        previous_response_id: str | None,
+    ) -> AsyncIterator[TResponseStreamEvent]:
+        """Streams the response of the wrapped model to the compacted input."""
+        compacted, original_bytes, replaced = self._compact(input)
+        started = time.perf_counter()
+        async for event in self.model.stream_response(
+            system_instructions,
+            compacted,
+            model_settings,
+            tools,
+            output_schema,
+            handoffs,
+            tracing,
+            previous_response_id=previous_response_id,
+        ):
+            yield event
+        self._record(compacted, original_bytes, replaced, started)
+
+
+class CompactingProvider(ModelProvider):
+    """Wraps a provider so every model it serves gets compacted input. One instance per run keeps per-run stats."""
+
+    def __init__(self, provider: ModelProvider, policy: CompactionPolicy):
+        self.provider = provider
+        self.policy = policy
+        self.stats = TurnStats()
+
+    @property
+    def offline(self) -> bool:
+        """Whether the wrapped provider needs no network."""
+        return getattr(self.provider, "offline", False)
+
+    def get_model(self, model_name: str | None) -> Model:
+        """The wrapped provider's model, compacting its input."""
+        return CompactingModel(self.provider.get_model(model_name), self.policy, self.stats, model_name)
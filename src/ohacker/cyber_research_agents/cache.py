@@ -0,0 +1,185 @@
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from agents import Agent, Runner
+from loguru import logger
+from pydantic import BaseModel
+
+from src.ohacker.metrics import METRICS
+from src.ohacker.run_config import get_model_provider, run_config
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    agent TEXT NOT NULL,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL,
+    seconds REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_used_at ON responses (last_used_at);
+"""
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_input(text: str) -> str:
+    """Case and whitespace variants of one input share a cache entry."""
+    return _WHITESPACE.sub(" ", text).strip().casefold()
+
+
+def cache_key(agent: Agent, text: str) -> str:
+    """Content address of an agent run: everything that decides its output, hashed.
+
+    The model provider is part of it, so outputs of an offline provider never answer a live run.
+    """
+    instructions = agent.instructions if isinstance(agent.instructions, str) else repr(agent.instructions)
+    output_type = getattr(agent.output_type, "__name__", repr(agent.output_type))
+    material = json.dumps(
+        [type(get_model_provider()).__name__, agent.name, str(agent.model), instructions, output_type,
+         [tool.name for tool in agent.tools], normalize_input(text)],
+    )
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+class ResponseCache:
+    """Persistent SQLite cache of final agent outputs, so repeated plans and searches are served locally.
+
+    Entries expire after `ttl` seconds, and past `max_entries` the least recently used ones are evicted.
+    Structured outputs (pydantic models) are stored as JSON and validated back into the agent's output type.
+    With `enabled=False` every call goes straight to the model and nothing is read or written.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        ttl: float = 7 * 24 * 3600,
+        max_entries: int = 2000,
+        enabled: bool = True,
+    ):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of lookups served from the cache."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    async def run(self, agent: Agent, text: str, key_text: str | None = None) -> Any:  # noqa: ANN401 - as untyped as final_output
+        """`Runner.run(agent, text).final_output`, served from the cache when possible.
+
+        Args:
+            agent: The agent to run.
+            text: The input of the run.
+            key_text: Cache on this text instead of the full input, for inputs with parts that do not change the
+                answer, like the planner's reasoning attached to a search term.
+        """
+        key_text = text if key_text is None else key_text
+        started = time.perf_counter()
+        cached = await self.lookup(agent, key_text)
+        if cached is not None:
+            METRICS.observe("runner_seconds", time.perf_counter() - started, agent=agent.name, cache="hit")
+            return cached
+
+        started = time.perf_counter()
+        output = (await Runner.run(agent, text, run_config=run_config())).final_output
+        seconds = time.perf_counter() - started
+        METRICS.observe("runner_seconds", seconds, agent=agent.name, cache="miss" if self.enabled else "off")
+        await self.store(agent, key_text, output, seconds)
+        return output
+
+    async def lookup(self, agent: Agent, text: str) -> Any | None:  # noqa: ANN401 - as untyped as final_output
+        """The cached output of running `agent` on `text`, None on a miss (always when the cache is disabled)."""
+        if not self.enabled:
+            return None
+        cached = await asyncio.to_thread(self._get, cache_key(agent, text))
+        if cached is None:
+            self.misses += 1
+            return None
+        value, seconds = cached
+        self.hits += 1
+        self.seconds_saved += seconds
+        logger.debug("Cache hit for {} ({:.1f}s saved)", agent.name, seconds)
+        return self._load(agent, value)
+
+    async def store(self, agent: Agent, text: str, output: object, seconds: float) -> None:
+        """Caches an output produced outside of `run`, e.g. by a streamed run. `seconds` is what it took."""
+        if self.enabled:
+            await asyncio.to_thread(self._put, cache_key(agent, text), agent.name, self._dump(output), seconds)
+
+    def summary(self) -> str:
+        """Hits, misses and model time saved, for the end-of-run log."""
+        return f"{self.hits} hits, {self.misses} misses ({self.hit_rate:.0%} hit rate), {self.seconds_saved:.1f}s saved"
+
+    def close(self) -> None:
+        """Closes the database, the next call opens it again."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    @staticmethod
+    def _dump(output: object) -> str:
+        return output.model_dump_json() if isinstance(output, BaseModel) else json.dumps(output)
+
+    @staticmethod
+    def _load(agent: Agent, value: str) -> Any:  # noqa: ANN401 - as untyped as final_output
+        output_type = agent.output_type
+        if isinstance(output_type, type) and issubclass(output_type, BaseModel):
+            return output_type.model_validate_json(value)
+        return json.loads(value)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.executescript(_SCHEMA)
+        return self._connection
+
+    def _get(self, key: str) -> tuple[str, float] | None:
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute(
+                "SELECT value, created_at, seconds FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at, seconds = row
+            if now - created_at > self.ttl:
+                connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                connection.commit()
+                return None
+            connection.execute("UPDATE responses SET last_used_at = ? WHERE key = ?", (now, key))
+            connection.commit()
+            return value, seconds
+
+    def _put(self, key: str, agent_name: str, value: str, seconds: float) -> None:
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, agent_name, value, now, now, seconds),
+            )
+            connection.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            connection.commit()
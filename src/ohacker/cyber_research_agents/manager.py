@@ -1,65 +1,182 @@
 from __future__ import annotations
 
+import os
 from pathlib import Path
 
 import asyncio
 from agents import Runner, custom_span, gen_trace_id, trace
+from loguru import logger
+from openai import APIConnectionError, RateLimitError
 
+from src.ohacker.cyber_research_agents.cache import ResponseCache
 from src.ohacker.cyber_research_agents.planner_agent import WebSearchItem, WebSearchPlan, planner_agent
+from src.ohacker.cyber_research_agents.report_stream import (
+    JsonStringFieldStream,
+    MarkdownSectionSplitter,
+    StreamTimings,
+)
+from src.ohacker.cyber_research_agents.search_fanout import cluster_searches
 from src.ohacker.cyber_research_agents.search_agent import search_agent
 from src.ohacker.cyber_research_agents.writer_agent import ReportData, writer_agent
+from src.ohacker.metrics import METRICS
+from src.ohacker.run_config import run_config
+
+# Plans, searches and reports are cached on disk, set OHACKER_RESEARCH_CACHE=0 to always call the models
+RESEARCH_CACHE_PATH = os.getenv("OHACKER_RESEARCH_CACHE_PATH", ".ohacker_cache/research.sqlite3")
+USE_RESEARCH_CACHE = os.getenv("OHACKER_RESEARCH_CACHE", "1") != "0"
+RESEARCH_CACHE_TTL = float(os.getenv("OHACKER_RESEARCH_CACHE_TTL", "604800"))  # One week
+
+# Search agent runs in flight at once, more mostly buys rate limit errors
+MAX_CONCURRENT_SEARCHES = int(os.getenv("OHACKER_MAX_CONCURRENT_SEARCHES", "4"))
+
+# Queries whose word sets overlap at least this much (Jaccard) are searched once
+SEARCH_SIMILARITY_THRESHOLD = 0.6
+
+SEARCH_RETRIES = 3
+SEARCH_BACKOFF = 2.0
+
+# Write the report section by section while the writer generates it, set OHACKER_STREAM_REPORT=0 to wait for all of it
+STREAM_REPORT = os.getenv("OHACKER_STREAM_REPORT", "1") != "0"
 
 
 class ResearchManager:
-    async def run(self, query: str) -> None:
+    """Plans searches, runs them and writes the report to `report_path`.
+
+    With `console` the report and its summary are also printed to stdout, streamed section by section. Managers
+    running next to each other should turn it off, their reports would interleave; the summary is then logged.
+    """
+
+    def __init__(
+        self,
+        cache: ResponseCache | None = None,
+        stream_report: bool = STREAM_REPORT,
+        report_path: str | Path = "report.md",
+        console: bool = True,
+    ):
+        self.stream_report = stream_report
+        self.console = console
+        self.report_path = Path(report_path)
+        self.report_timings: StreamTimings | None = None
+        self.cache = cache or ResponseCache(RESEARCH_CACHE_PATH, ttl=RESEARCH_CACHE_TTL, enabled=USE_RESEARCH_CACHE)
+        self.search_failures: list[tuple[str, BaseException]] = []
+        self._search_limit = asyncio.Semaphore(MAX_CONCURRENT_SEARCHES)
+
+    async def run(self, query: str) -> ReportData:
         trace_id = gen_trace_id()
         with trace("Research trace", trace_id=trace_id):
-            search_plan = await self._plan_searches(query)
-            search_results = await self._perform_searches(search_plan)
-            report = await self._write_report(query, search_results)
+            with METRICS.time("research_stage_seconds", stage="plan"):
+                search_plan = await self._plan_searches(query)
+            with METRICS.time("research_stage_seconds", stage="search"):
+                search_results = await self._perform_searches(search_plan)
+            with METRICS.time("research_stage_seconds", stage="report"):
+                report = await self._write_report(query, search_results)
+        if self.cache.enabled:
+            logger.info("Research cache: {}", self.cache.summary())
 
-        print(f"\n\n=====FINAL REPORT SUMMARY=====\n\n")
+        if self.report_timings is not None:
+            logger.info("Report streamed: {}", self.report_timings.summary())
 
-        print(f"Report summary\n\n{report.short_summary}")
-        print("\n\n=====REPORT=====\n\n")
-        print(f"Report: {report.markdown_report}")
-        Path("report.md").write_text(report.markdown_report)
+        if self.console:
+            print(f"\n\n=====FINAL REPORT SUMMARY=====\n\n")
+
+            print(f"Report summary\n\n{report.short_summary}")
+            if self.report_timings is None:
+                print("\n\n=====REPORT=====\n\n")
+                print(f"Report: {report.markdown_report}")
+        else:
+            logger.info("Report written to {}, summary:\n{}", self.report_path, report.short_summary)
+        self.report_path.write_text(report.markdown_report)
+        return report
 
     async def _plan_searches(self, query: str) -> WebSearchPlan:
-        result = await Runner.run(
-            planner_agent,
-            f"Query: {query}",
-        )
-        return result.final_output_as(WebSearchPlan)
+        return await self.cache.run(planner_agent, f"Query: {query}")
 
     async def _perform_searches(self, search_plan: WebSearchPlan) -> list[str]:
         with custom_span("Search the web"):
-            num_completed = 0
-            tasks = [asyncio.create_task(self._search(item)) for item in search_plan.searches]
+            clusters = cluster_searches(search_plan.searches, SEARCH_SIMILARITY_THRESHOLD)
+            if len(clusters) < len(search_plan.searches):
+                logger.info("Searching {} distinct of {} planned queries", len(clusters), len(search_plan.searches))
+            searches = [
+                WebSearchItem(query=members[0].query, reason="; ".join(dict.fromkeys(m.reason for m in members)))
+                for members in clusters
+            ]
+            outcomes = await asyncio.gather(*(self._search(item) for item in searches), return_exceptions=True)
+
             results = []
-            for task in asyncio.as_completed(tasks):
-                result = await task
-                if result is not None:
-                    results.append(result)
-                num_completed += 1
+            for item, outcome in zip(searches, outcomes, strict=True):
+                if isinstance(outcome, BaseException):
+                    logger.warning("Search {!r} failed: {!r}", item.query, outcome)
+                    self.search_failures.append((item.query, outcome))
+                else:
+                    results.append(outcome)
             return results
 
-    async def _search(self, item: WebSearchItem) -> str | None:
+    async def _search(self, item: WebSearchItem) -> str:
         input = f"Search term: {item.query}\nReason for searching: {item.reason}"
-        try:
-            result = await Runner.run(
-                search_agent,
-                input,
-            )
-            return str(result.final_output)
-        except Exception:
-            return None
+        for attempt in range(SEARCH_RETRIES + 1):
+            try:
+                async with self._search_limit:
+                    return str(await self.cache.run(search_agent, input, key_text=f"Search term: {item.query}"))
+            except (RateLimitError, APIConnectionError) as e:
+                if attempt == SEARCH_RETRIES:
+                    raise
+                # Waiting happens outside the semaphore, so other searches can use the slot meanwhile
+                delay = _retry_after(e) or SEARCH_BACKOFF * 2**attempt
+                logger.debug("Search {!r} hit {}, retrying in {:.1f}s", item.query, type(e).__name__, delay)
+                await asyncio.sleep(delay)
+        raise AssertionError("unreachable")
 
     async def _write_report(self, query: str, search_results: list[str]) -> ReportData:
         input = f"Original query: {query}\nSummarized search results: {search_results}"
-        result = await Runner.run(
-            writer_agent,
-            input,
-        )
+        if not self.stream_report:
+            return await self.cache.run(writer_agent, input)
+        cached = await self.cache.lookup(writer_agent, input)
+        if cached is not None:
+            return cached
+        report = await self._stream_report(input)
+        await self.cache.store(writer_agent, input, report, self.report_timings.total or 0.0)
+        return report
+
+    async def _stream_report(self, input: str) -> ReportData:
+        """Runs the writer streamed and writes every finished report section to the report file and the console."""
+        timings = self.report_timings = StreamTimings.start()
+        field = JsonStringFieldStream("markdown_report")
+        splitter = MarkdownSectionSplitter()
+        self.report_path.write_text("")
+        if self.console:
+            print("\n\n=====REPORT=====\n\n")
+
+        async def write(section: str) -> None:
+            timings.mark("first_section")
+            if self.console:
+                print(section, end="", flush=True)
+            await asyncio.to_thread(_append_text, self.report_path, section)
 
+        result = Runner.run_streamed(writer_agent, input, run_config=run_config())
+        async for event in result.stream_events():
+            if event.type != "raw_response_event" or event.data.type != "response.output_text.delta":
+                continue
+            timings.mark("first_token")
+            for section in splitter.feed(field.feed(event.data.delta)):
+                await write(section)
+        if rest := splitter.flush():
+            await write(rest)
+        timings.mark("total")
+        METRICS.observe("runner_seconds", timings.total or 0.0, agent=writer_agent.name, cache="streamed")
+        if self.console:
+            print()
         return result.final_output_as(ReportData)
+
+
+def _append_text(path: Path, text: str) -> None:
+    with path.open("a") as f:
+        f.write(text)
+
+
+def _retry_after(error: Exception) -> float | None:
+    """The wait the API asked for in the Retry-After header of a rate limit response, if any."""
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers["retry-after"]) if response is not None else None
+    except (KeyError, ValueError):
+        return None
@@ -0,0 +1,115 @@
+import re
+import time
+from dataclasses import dataclass
+
+# UTF-16 surrogate ranges, a \u escape of a high surrogate is followed by one of its low surrogate
+_HIGH_SURROGATE = 0xD800
+_LOW_SURROGATE = 0xDC00
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class JsonStringFieldStream:
+    """Decodes one string field of a JSON object while the object is still being generated.
+
+    Structured outputs arrive as JSON text deltas, `feed` returns the part of the field value that became
+    complete with each delta, so the value can be shown long before the JSON parses.
+    """
+
+    def __init__(self, field: str):
+        self._key = re.compile(rf'(?<!\\)"{re.escape(field)}"\s*:\s*"')
+        self._buffer = ""
+        self._position: int | None = None
+        self.done = False
+
+    def feed(self, delta: str) -> str:
+        """Adds a delta, returns the newly decoded part of the field value."""
+        self._buffer += delta
+        if self.done:
+            return ""
+        if self._position is None:
+            match = self._key.search(self._buffer)
+            if match is None:
+                return ""
+            self._position = match.end()
+
+        buffer, i, decoded = self._buffer, self._position, []
+        while i < len(buffer):
+            char = buffer[i]
+            if char == '"':
+                self.done = True
+                break
+            if char != "\\":
+                decoded.append(char)
+                i += 1
+                continue
+            # Escapes are only decoded once complete, an incomplete one waits for the next delta
+            if i + 1 >= len(buffer):
+                break
+            if buffer[i + 1] != "u":
+                decoded.append(_ESCAPES.get(buffer[i + 1], buffer[i + 1]))
+                i += 2
+                continue
+            if i + 6 > len(buffer):
+                break
+            code = int(buffer[i + 2 : i + 6], 16)
+            if _HIGH_SURROGATE <= code < _LOW_SURROGATE:
+                if i + 12 > len(buffer):
+                    break
+                code = 0x10000 + ((code - _HIGH_SURROGATE) << 10) + (int(buffer[i + 8 : i + 12], 16) - _LOW_SURROGATE)
+                i += 6
+            decoded.append(chr(code))
+            i += 6
+        self._position = i
+        return "".join(decoded)
+
+
+class MarkdownSectionSplitter:
+    """Buffers markdown text and hands it out in whole sections, each starting at a heading."""
+
+    def __init__(self):
+        self._buffer = ""
+
+    def feed(self, text: str) -> list[str]:
+        """Adds text, returns the sections it completed."""
+        self._buffer += text
+        sections = []
+        while (end := self._buffer.find("\n#", 1)) != -1:
+            sections.append(self._buffer[: end + 1])
+            self._buffer = self._buffer[end + 1 :]
+        return sections
+
+    def flush(self) -> str:
+        """The buffered rest, at the end of the stream."""
+        rest, self._buffer = self._buffer, ""
+        return rest
+
+
+@dataclass
+class StreamTimings:
+    """Latencies of a streamed report, in seconds from the start of the writer run."""
+
+    started: float
+    first_token: float | None = None
+    first_section: float | None = None
+    total: float | None = None
+
+    @classmethod
+    def start(cls) -> "StreamTimings":
+        """Timings starting now."""
+        return cls(time.perf_counter())
+
+    def mark(self, field: str) -> None:
+        """Sets the latency `field` to now, unless it is set already."""
+        if getattr(self, field) is None:
+            setattr(self, field, time.perf_counter() - self.started)
+
+    def summary(self) -> str:
+        """The latencies as one line for the log."""
+        def seconds(value: float | None) -> str:
+            return "-" if value is None else f"{value:.1f}s"
+
+        return (
+            f"first token after {seconds(self.first_token)}, first section after {seconds(self.first_section)}, "
+            f"done after {seconds(self.total)}"
+        )
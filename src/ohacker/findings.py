@@ -0,0 +1,43 @@
+import re
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+VERDICT_INSTRUCTIONS = """
+End your final summary with exactly one line: 'VERDICT: VULNERABLE' if you confirmed the vulnerability,
+otherwise 'VERDICT: NOT VULNERABLE'.
+"""
+
+_VERDICT = re.compile(r"VERDICT:\s*(NOT\s+)?VULNERABLE", re.IGNORECASE)
+
+
+def parse_verdict(message: str | None) -> bool | None:
+    """Reads the verdict line requested by `VERDICT_INSTRUCTIONS`, None when the agent did not give one."""
+    matches = _VERDICT.findall(message or "")
+    if not matches:
+        return None
+    return not matches[-1]
+
+
+@dataclass
+class AgentRunResult:
+    """Outcome of one pentest agent run."""
+
+    agent_name: str
+    message: str | None = None
+    turns: int = 0
+    """Model round-trips the agent needed."""
+
+    error: str | None = None
+    """Why the run stopped early, e.g. a model API error or the turn limit, None when it ran to the end."""
+
+    @property
+    def confirmed(self) -> bool:
+        """Whether the agent ended with 'VERDICT: VULNERABLE'."""
+        return parse_verdict(self.message) is True
+
+
+def turns_per_finding(results: Iterable[AgentRunResult]) -> float | None:
+    """Model turns spent per confirmed finding, over all given runs. None when nothing was confirmed."""
+    results = list(results)
+    findings = sum(result.confirmed for result in results)
+    return sum(result.turns for result in results) / findings if findings else None
@@ -0,0 +1,382 @@
+"""Scans many targets with every pentest agent, from a list or a file of targets.
+
+Every agent x target pair is a job. Jobs wait in one queue per host and a pool of workers takes the next job of a
+host with a free slot, so jobs are limited globally and per host without workers idling on a busy host. Failed jobs
+go back to their host's queue after an exponential backoff, and every finished job is appended to a JSONL results
+file.
+Re-running with the same results file resumes: jobs already recorded as done are skipped.
+
+    uv run python -m src.ohacker.fleet targets.txt --concurrency 4 --per-host 1
+
+A targets file has one target per line: the frontend URL and, optionally, the backend API URL. Only targets with an
+API URL get the HTTP-only fast scan first. Empty lines and lines starting with # are ignored.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+from collections import Counter, defaultdict, deque
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from urllib.parse import urlparse
+
+from loguru import logger
+
+from src.ohacker.browser_pool import BrowserPool
+from src.ohacker.fast_scan import ScanFinding, ScanStatus, prescan
+from src.ohacker.findings import AgentRunResult, parse_verdict
+from src.ohacker.launch_profiles import FAST_PROFILE, PROFILES, LaunchProfile
+from src.ohacker.main import AGENT_VULN_CLASSES, AGENTS, NAMES, run_agent
+from src.ohacker.metrics import METRICS
+from src.ohacker.scheduler import AgentOutput
+
+
+class IncompleteRunError(Exception):
+    """An agent run stopped on an error or ended without a verdict, the job is retried."""
+
+
+@dataclass(frozen=True)
+class Target:
+    """A frontend URL to scan and, optionally, the URL of its backend API for the fast scan."""
+
+    url: str
+    api_url: str | None = None
+
+    @property
+    def host(self) -> str:
+        """Host and port of the frontend, the unit of the per-host limit."""
+        return urlparse(self.url).netloc
+
+    @classmethod
+    def parse(cls, line: str) -> "Target":
+        """Reads "url [api_url]"."""
+        url, *rest = line.split()
+        return cls(url, rest[0] if rest else None)
+
+
+@dataclass(frozen=True)
+class Job:
+    """One agent run against one target."""
+
+    target: Target
+    agent_name: str
+
+    @property
+    def job_id(self) -> str:
+        """Stable id of the job in the results file, the same in every run."""
+        key = f"{self.target.url}|{self.agent_name}".encode()
+        return hashlib.sha1(key, usedforsecurity=False).hexdigest()[:16]
+
+
+@dataclass
+class _Attempt:
+    """A job waiting to run, with the number of its next attempt."""
+
+    job: Job
+    number: int = 1
+
+
+@dataclass
+class JobRecord:
+    """One line of the results file."""
+
+    job_id: str
+    target: str
+    agent: str
+    status: str
+    """"done" or "failed" (all retries used up)."""
+
+    attempts: int
+    seconds: float
+    """Duration of the last attempt, without the time queued or backing off."""
+
+    confirmed: bool = False
+    turns: int = 0
+    decided_by_fast_scan: bool = False
+    message: str | None = None
+    error: str | None = None
+    finished_at: float = field(default_factory=time.time)
+
+
+@dataclass
+class FleetConfig:
+    """Limits, retries and output files of a fleet scan."""
+
+    concurrency: int = 4
+    """Jobs running at the same time over all targets."""
+
+    per_host: int = 2
+    """Jobs running at the same time against one host."""
+
+    retries: int = 2
+    backoff: float = 5.0
+    """Delay before the first retry in seconds, doubled for every further retry."""
+
+    results_path: Path = Path("fleet_results.jsonl")
+    report_path: Path = Path("fleet_report.json")
+    browser_pool_size: int = 2
+    profile: LaunchProfile = FAST_PROFILE
+    use_prescan: bool = True
+
+
+def read_targets(lines: list[str]) -> list[Target]:
+    """Targets of a targets file, without empty lines and comments."""
+    return [Target.parse(line) for line in (line.strip() for line in lines) if line and not line.startswith("#")]
+
+
+def load_done_jobs(results_path: Path) -> dict[str, JobRecord]:
+    """Finished jobs of an earlier run, so it can be resumed."""
+    done: dict[str, JobRecord] = {}
+    if not results_path.exists():
+        return done
+    for line in results_path.read_text().splitlines():
+        try:
+            record = JobRecord(**json.loads(line))
+        except (ValueError, TypeError):
+            continue
+        if record.status == "done":
+            done[record.job_id] = record
+    return done
+
+
+class FleetScanner:
+    """Runs every agent against every target with a bounded worker pool, see the module docstring."""
+
+    def __init__(self, targets: list[Target], config: FleetConfig):
+        self.targets = targets
+        self.config = config
+        # Jobs waiting per host, in the order hosts get their next turn
+        self._pending: dict[str, deque[_Attempt]] = {}
+        self._running: Counter[str] = Counter()
+        self._unfinished = 0
+        self._changed = asyncio.Condition()
+        self._backoffs: set[asyncio.Task[None]] = set()
+        self._prescans: dict[Target, asyncio.Task[dict[str, ScanFinding]]] = {}
+        self._write_lock = asyncio.Lock()
+        self._records: list[JobRecord] = []
+        self._finished = 0
+        """Jobs finished in this run, without the ones resumed from an earlier run."""
+
+    async def run(self) -> dict:
+        """Runs every job not done yet, writes the report and returns it."""
+        started = time.monotonic()
+        done = load_done_jobs(self.config.results_path)
+        jobs = [Job(target, agent_name) for target in self.targets for agent_name in AGENTS]
+        for job in jobs:
+            if job.job_id in done:
+                self._records.append(done[job.job_id])
+            else:
+                self._pending.setdefault(job.target.host, deque()).append(_Attempt(job))
+                self._unfinished += 1
+        logger.info("Fleet scan: {} jobs, {} already done, {} queued", len(jobs), len(done), self._unfinished)
+
+        pool = BrowserPool(size=self.config.browser_pool_size, launch_options=self.config.profile.launch_options())
+        async with pool:
+            workers = [asyncio.create_task(self._worker(pool)) for _ in range(self.config.concurrency)]
+            try:
+                await asyncio.gather(*workers)
+            finally:
+                for task in [*workers, *self._backoffs]:
+                    task.cancel()
+
+        report = self.report(time.monotonic() - started)
+        await asyncio.to_thread(self.config.report_path.write_text, json.dumps(report, indent=2))
+        return report
+
+    async def _worker(self, pool: BrowserPool) -> None:
+        """Runs jobs of hosts with a free slot until every job is finished."""
+        while True:
+            async with self._changed:
+                while (attempt := self._take()) is None:
+                    if not self._unfinished:
+                        return
+                    await self._changed.wait()
+            host = attempt.job.target.host
+            try:
+                record = await self._run_attempt(attempt, pool)
+            finally:
+                async with self._changed:
+                    self._running[host] -= 1
+                    self._changed.notify_all()
+            if record is not None:
+                await self._write(record)
+                async with self._changed:
+                    self._unfinished -= 1
+                    self._changed.notify_all()
+
+    def _take(self) -> _Attempt | None:
+        """Next job of the first host below its limit, that host then goes to the back of the line."""
+        for host, attempts in self._pending.items():
+            if self._running[host] < self.config.per_host:
+                attempt = attempts.popleft()
+                del self._pending[host]
+                if attempts:
+                    self._pending[host] = attempts
+                self._running[host] += 1
+                return attempt
+        return None
+
+    async def _run_attempt(self, attempt: _Attempt, pool: BrowserPool) -> JobRecord | None:
+        """Runs one attempt of a job, None when it failed and is retried later."""
+        job = attempt.job
+        name = f"{NAMES[list(AGENTS).index(job.agent_name)]} @ {job.target.host}"
+        started = time.monotonic()
+        try:
+            result, decided = await self._run_job(job, pool, AgentOutput(name))
+            return JobRecord(
+                job.job_id,
+                job.target.url,
+                job.agent_name,
+                "done",
+                attempt.number,
+                time.monotonic() - started,
+                confirmed=result.confirmed,
+                turns=result.turns,
+                decided_by_fast_scan=decided,
+                message=result.message,
+            )
+        except Exception as e:
+            if attempt.number > self.config.retries:
+                logger.error("{} failed after {} attempts: {!r}", name, attempt.number, e)
+                return JobRecord(
+                    job.job_id, job.target.url, job.agent_name, "failed", attempt.number,
+                    time.monotonic() - started, error=repr(e),
+                )
+            # Exponential backoff with jitter, so retries of one flaky host do not arrive in lockstep
+            delay = self.config.backoff * 2 ** (attempt.number - 1) * random.uniform(0.8, 1.2)  # noqa: S311
+            logger.warning("{} failed ({!r}), retrying in {:.1f}s", name, e, delay)
+            attempt.number += 1
+            task = asyncio.create_task(self._retry_later(attempt, delay))
+            self._backoffs.add(task)
+            task.add_done_callback(self._backoffs.discard)
+            return None
+
+    async def _retry_later(self, attempt: _Attempt, delay: float) -> None:
+        """Queues a failed job again after its backoff, holding neither a worker nor a host slot meanwhile."""
+        await asyncio.sleep(delay)
+        async with self._changed:
+            self._pending.setdefault(attempt.job.target.host, deque()).append(attempt)
+            self._changed.notify_all()
+
+    async def _run_job(self, job: Job, pool: BrowserPool, output: AgentOutput) -> tuple[AgentRunResult, bool]:
+        if self.config.use_prescan and job.target.api_url:
+            findings = await self._prescan(job.target)
+            finding = findings.get(AGENT_VULN_CLASSES[job.agent_name])
+            if finding is not None and finding.status is not ScanStatus.INCONCLUSIVE:
+                return AgentRunResult(job.agent_name, finding.summary()), True
+        result = await run_agent(job.agent_name, job.target.url, output, pool, self.config.profile)
+        # run_agent survives model errors, rate limits and the turn limit, only a run with a verdict is done
+        if result.error is not None:
+            raise IncompleteRunError(result.error)
+        if parse_verdict(result.message) is None:
+            raise IncompleteRunError("The agent gave no verdict.")
+        return result, False
+
+    def _prescan(self, target: Target) -> asyncio.Task[dict[str, ScanFinding]]:
+        """One fast scan per target, shared by all agent jobs of that target. A failed scan is forgotten, so the
+        retry of a job scans again.
+        """
+        if target not in self._prescans:
+            task = asyncio.create_task(prescan(target.api_url or ""))
+            task.add_done_callback(lambda done: self._forget_failed_prescan(target, done))
+            self._prescans[target] = task
+        return self._prescans[target]
+
+    def _forget_failed_prescan(self, target: Target, task: asyncio.Task[dict[str, ScanFinding]]) -> None:
+        if (task.cancelled() or task.exception() is not None) and self._prescans.get(target) is task:
+            del self._prescans[target]
+
+    async def _write(self, record: JobRecord) -> None:
+        self._records.append(record)
+        self._finished += 1
+        async with self._write_lock:
+            await asyncio.to_thread(_append_line, self.config.results_path, json.dumps(asdict(record)))
+
+    def report(self, seconds: float) -> dict:
+        """Aggregate over all jobs, including the ones resumed from an earlier run. Only the throughput,
+        targets_per_hour, counts just the jobs finished in this run, as targets' worth of jobs.
+        """
+        per_target: dict[str, dict] = defaultdict(lambda: {"confirmed": [], "failed": [], "done": 0})
+        for record in self._records:
+            entry = per_target[record.target]
+            if record.status == "failed":
+                entry["failed"].append(record.agent)
+                continue
+            entry["done"] += 1
+            if record.confirmed:
+                entry["confirmed"].append(AGENT_VULN_CLASSES[record.agent])
+        scanned = sum(1 for entry in per_target.values() if entry["done"] + len(entry["failed"]) == len(AGENTS))
+        return {
+            "targets": len(self.targets),
+            "targets_scanned": scanned,
+            "jobs": len(self._records),
+            "jobs_failed": sum(record.status == "failed" for record in self._records),
+            "vulnerable_targets": sum(1 for entry in per_target.values() if entry["confirmed"]),
+            "seconds": round(seconds, 1),
+            "targets_per_hour": round(self._finished / len(AGENTS) / seconds * 3600, 1) if seconds else None,
+            "per_target": per_target,
+            # Where the time went across all jobs, see metrics.py
+            "latency": METRICS.snapshot()["timers"],
+        }
+
+
+def _append_line(path: Path, line: str) -> None:
+    with path.open("a") as f:
+        f.write(line + "\n")
+
+
+async def scan_fleet(targets: list[Target], config: FleetConfig | None = None) -> dict:
+    """Scans all targets and returns the aggregate report, which is also written to `config.report_path`."""
+    return await FleetScanner(targets, config or FleetConfig()).run()
+
+
+def cli() -> None:
+    """Command line entry point, see the module docstring."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("targets", nargs="*", help="Target URLs, optionally 'url,api_url'.")
+    parser.add_argument("-f", "--targets-file", type=Path, help="File with one target per line.")
+    parser.add_argument("--concurrency", type=int, default=FleetConfig.concurrency)
+    parser.add_argument("--per-host", type=int, default=FleetConfig.per_host)
+    parser.add_argument("--retries", type=int, default=FleetConfig.retries)
+    parser.add_argument("--backoff", type=float, default=FleetConfig.backoff)
+    parser.add_argument("--results", type=Path, default=FleetConfig.results_path)
+    parser.add_argument("--report", type=Path, default=FleetConfig.report_path)
+    parser.add_argument("--browsers", type=int, default=FleetConfig.browser_pool_size)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default=FAST_PROFILE.name)
+    parser.add_argument("--no-prescan", action="store_true", help="Send every job through computer use.")
+    args = parser.parse_args()
+
+    lines = [target.replace(",", " ") for target in args.targets]
+    if args.targets_file:
+        lines += args.targets_file.read_text().splitlines()
+    targets = read_targets(lines)
+    if not targets:
+        parser.error("No targets given.")
+
+    config = FleetConfig(
+        concurrency=args.concurrency,
+        per_host=args.per_host,
+        retries=args.retries,
+        backoff=args.backoff,
+        results_path=args.results,
+        report_path=args.report,
+        browser_pool_size=args.browsers,
+        profile=PROFILES[args.profile],
+        use_prescan=not args.no_prescan,
+    )
+    report = asyncio.run(scan_fleet(targets, config))
+    logger.info(
+        "Scanned {} of {} targets, {} vulnerable, {} targets/hour. Report: {}",
+        report["targets_scanned"],
+        report["targets"],
+        report["vulnerable_targets"],
+        report["targets_per_hour"],
+        config.report_path,
+    )
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,56 @@
+import hashlib
+
+
+def frame_digest(thumbnail_png: bytes) -> bytes:
+    """Exact digest of a thumbnail, any changed pixel changes it.
+
+    The PNG encoder is deterministic, so an unchanged page gives identical bytes.
+    """
+    return hashlib.blake2b(thumbnail_png, digest_size=16).digest()
+
+
+class FrameChangeDetector:
+    """Remembers a digest of the last sent frame's thumbnail, so an unchanged page can reuse the encoded frame.
+
+    Every screenshot takes a thumbnail and every full capture is stored with its thumbnail's digest, so the next
+    screenshot reuses the frame when the thumbnail is byte for byte the same, e.g. after `wait`, `move` or a click
+    that did nothing. Actions that change the page on purpose (click, type, navigation...) call `invalidate`, the
+    next frame is then captured in full even if its thumbnail did not change.
+    """
+
+    def __init__(self, thumbnail_width: int = 320):
+        # A text line of a 1280px wide page is still a few pixels high at 320px, so a new one changes the digest
+        self.thumbnail_width = thumbnail_width
+        self.hits = 0
+        self.misses = 0
+        self._last_digest: bytes | None = None
+        self._last_frame: str | None = None
+        self._dirty = True
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of screenshots that reused the cached frame."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def invalidate(self) -> None:
+        """Makes the next screenshot a full capture, whatever its thumbnail looks like."""
+        self._dirty = True
+
+    def lookup(self, digest: bytes) -> str | None:
+        """Returns the cached frame when the page did not change since it was captured."""
+        if not self._dirty and self._last_digest == digest:
+            self.hits += 1
+            return self._last_frame
+        self.misses += 1
+        return None
+
+    def store(self, digest: bytes, frame: str) -> None:
+        """Caches a full capture with the digest of its thumbnail."""
+        self._last_digest = digest
+        self._last_frame = frame
+        self._dirty = False
+
+    def summary(self) -> str:
+        """Hits and misses, for the end-of-run log."""
+        return f"{self.hits} reused, {self.misses} captured ({self.hit_rate:.0%} reused)"
@@ -0,0 +1,105 @@
+import re
+from dataclasses import dataclass, field
+from typing import Any
+
+from playwright.async_api import BrowserContext, Route
+
+# Chromium switches that cut work a scan never needs: extensions, background networking and updates,
+# throttling of background tabs and a few features which only talk to Google services.
+THROUGHPUT_CHROMIUM_ARGS = (
+    "--disable-extensions",
+    "--disable-component-extensions-with-background-pages",
+    "--disable-background-networking",
+    "--disable-background-timer-throttling",
+    "--disable-backgrounding-occluded-windows",
+    "--disable-renderer-backgrounding",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-dev-shm-usage",
+    "--metrics-recording-only",
+    "--no-first-run",
+    "--mute-audio",
+    "--disable-features=Translate,OptimizationHints,MediaRouter,InterestFeedContentSuggestions,"
+    "CalculateNativeWinOcclusion,AutofillServerCommunication",
+)
+
+# Third-party analytics and ad hosts, they never matter for a scan but keep the network busy.
+TRACKER_URL_PATTERNS = (
+    r"google-analytics\.com",
+    r"googletagmanager\.com",
+    r"doubleclick\.net",
+    r"googlesyndication\.com",
+    r"connect\.facebook\.net",
+    r"hotjar\.com",
+    r"segment\.(io|com)",
+    r"mixpanel\.com",
+    r"sentry\.io",
+    r"newrelic\.com|nr-data\.net",
+)
+
+
+@dataclass(frozen=True)
+class LaunchProfile:
+    """How `LocalPlaywrightComputer` launches Chromium and which requests its pages are allowed to make."""
+
+    name: str
+
+    headless: bool = False
+    """Headless runs need no display server and skip compositing to a window."""
+
+    args: tuple[str, ...] = ()
+    """Extra Chromium command line switches."""
+
+    viewport: tuple[int, int] = (1080, 1080)
+    """Page size in CSS pixels, this is also the screen size reported to the model."""
+
+    blocked_resource_types: frozenset[str] = field(default_factory=frozenset)
+    """Playwright resource types to abort, e.g. "font" or "media"."""
+
+    blocked_url_patterns: tuple[str, ...] = ()
+    """Regular expressions of request URLs to abort."""
+
+    def launch_options(self) -> dict[str, Any]:
+        """Keyword arguments for `chromium.launch`."""
+        width, height = self.viewport
+        return {"headless": self.headless, "args": [f"--window-size={width},{height}", *self.args]}
+
+    def context_options(self) -> dict[str, Any]:
+        """Keyword arguments for `browser.new_context`."""
+        width, height = self.viewport
+        return {"viewport": {"width": width, "height": height}}
+
+    async def apply(self, context: BrowserContext) -> None:
+        """Installs request blocking on the context. Without any blocking configured, requests are not routed."""
+        if not self.blocked_resource_types and not self.blocked_url_patterns:
+            return
+        blocked_url = re.compile("|".join(self.blocked_url_patterns)) if self.blocked_url_patterns else None
+
+        async def _handle(route: Route) -> None:
+            request = route.request
+            if request.resource_type in self.blocked_resource_types or (
+                blocked_url is not None and blocked_url.search(request.url)
+            ):
+                await route.abort()
+            else:
+                await route.continue_()
+
+        await context.route("**/*", _handle)
+
+
+# The original behaviour: a visible browser window, nothing blocked.
+HEADFUL_PROFILE = LaunchProfile(name="headful")
+
+HEADLESS_PROFILE = LaunchProfile(name="headless", headless=True)
+
+# Images stay allowed, the LFI agent has to see and click them.
+FAST_PROFILE = LaunchProfile(
+    name="fast",
+    headless=True,
+    args=THROUGHPUT_CHROMIUM_ARGS,
+    blocked_resource_types=frozenset({"font", "media"}),
+    blocked_url_patterns=TRACKER_URL_PATTERNS,
+)
+
+PROFILES = {profile.name: profile for profile in (HEADFUL_PROFILE, HEADLESS_PROFILE, FAST_PROFILE)}
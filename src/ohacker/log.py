@@ -0,0 +1,30 @@
+import os
+import sys
+
+import logfire
+from loguru import logger
+
+# DEBUG shows every browser action (click, type, scroll...), they are hidden by default.
+LOG_LEVEL = os.getenv("OHACKER_LOG_LEVEL", "INFO")
+
+CONSOLE_FORMAT = (
+    "<green>{time:HH:mm:ss.SSS}</green> <level>{level: <7}</level> "
+    "<cyan>[{extra[agent]}]</cyan> <level>{message}</level>"
+)
+
+
+def configure_logging(level: str = LOG_LEVEL, logfire_level: str = "INFO") -> None:
+    """Sets up console logging through a background queue and forwards records to logfire.
+
+    The console handler is enqueued: the calling coroutine only puts the record on a queue and a writer thread does
+    the formatting and the (slow, unbuffered) stderr writes, so concurrent agents do not stall on stdout.
+    Logs are tagged with the agent they belong to, set with `logger.contextualize(agent=...)` or `logger.bind`.
+    The logfire handler stays synchronous, so every record is attached to the span that is active when it is logged.
+    """
+    logger.configure(
+        handlers=[
+            {"sink": sys.stderr, "level": level, "format": CONSOLE_FORMAT, "enqueue": True},
+            {**logfire.loguru_handler(), "level": logfire_level},
+        ],
+        extra={"agent": "main"},
+    )
@@ -1,26 +1,37 @@
 import asyncio
+import functools
 import os
+import time
+from collections.abc import Callable
 from typing import Any
 
 import logfire
-from agents import Agent, Runner, function_tool
+from agents import Agent, Runner
 from agents import ComputerTool, ModelSettings, ItemHelpers
-from colorama import init, Fore, Style
+from loguru import logger
 from openai.types.responses.response_computer_tool_call import ResponseComputerToolCall
+from playwright.async_api import Response as PlaywrightResponse
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 
+from src.ohacker.browser_pool import BrowserPool
+from src.ohacker.browser_tools import TOOLS_HINT, build_browser_tools
 from src.ohacker.computer_use import LocalPlaywrightComputer
-from src.ohacker.cyber_research_agents.manager import ResearchManager
-from src.ohacker.security_patches_agent import run_patch_agent
-
-init(autoreset=True)
-
-BLUE = Fore.BLUE
-GREEN = Fore.GREEN
-GREY = Fore.LIGHTBLACK_EX
-RESET = Style.RESET_ALL
+from src.ohacker.context_compaction import CompactingProvider, CompactionPolicy
+from src.ohacker.fast_scan import ScanStatus, prescan
+from src.ohacker.findings import VERDICT_INSTRUCTIONS, AgentRunResult, turns_per_finding
+from src.ohacker.launch_profiles import HEADFUL_PROFILE, PROFILES, LaunchProfile
+from src.ohacker.log import configure_logging
+from src.ohacker.metrics import METRICS
+from src.ohacker.pipeline import FindingPipeline
+from src.ohacker.run_config import get_model_provider, run_config
+from src.ohacker.scheduler import AgentOutput, run_concurrently
+from src.ohacker.screenshot_dump import ScreenshotDumper, new_run_id
+from src.ohacker.session_recording import SessionRecorder
+from src.ohacker.screenshot_encoding import ScreenshotEncoding
 
 logfire.configure(token=os.getenv("LOGFIRE_TOKEN"))
 logfire.instrument_openai_agents()
+configure_logging()
 
 sqli_instructions = """
 You are a basic penetration tester agent focusing on SQL Injection.
@@ -50,13 +61,67 @@ AGENTS = {
 
 NAMES = ["LFI Agent", "SQL Injection Agent"]
 
+# Vulnerability class each agent tests, used to match agents with the fast-path scan results
+AGENT_VULN_CLASSES = {
+    "Simple website tester 1.": "lfi",
+    "Simple website tester 2.": "sqli",
+}
+
+TARGET_URL = "http://localhost:8080/"
+
+# Backend API behind the target, probed by the HTTP-only fast scan before any agent starts
+API_URL = os.getenv("OHACKER_API_URL", "http://127.0.0.1:8001/")
+
+# Set OHACKER_PRESCAN=0 to send every agent through computer use
+USE_PRESCAN = os.getenv("OHACKER_PRESCAN", "1") != "0"
+
+# All agents run at the same time by default, lower it to limit the number of open browsers.
+MAX_CONCURRENT_AGENTS = len(AGENTS)
+
+BROWSER_POOL_SIZE = 1
+
+# "headful" (default), "headless" or "fast", see launch_profiles.py
+LAUNCH_PROFILE = PROFILES[os.getenv("OHACKER_LAUNCH_PROFILE", HEADFUL_PROFILE.name)]
+
+# The DOM-level and compound tools of browser_tools.py, set OHACKER_DOM_TOOLS=0 for the baseline tool set
+USE_DOM_TOOLS = os.getenv("OHACKER_DOM_TOOLS", "1") != "0"
+
+# Research and patching of a confirmed finding start while the other agents still run, OHACKER_PIPELINE=0 waits
+# for all agents and handles every finding in one go
+USE_PIPELINE = os.getenv("OHACKER_PIPELINE", "1") != "0"
 
-async def create_agent(name: str, tools: list[Any]) -> Agent:
+# Set to a directory to keep every screenshot of every run for debugging, off by default
+SCREENSHOT_DIR = os.getenv("OHACKER_SCREENSHOT_DIR")
+
+# Model turns per agent run. Long runs stay fast because old screenshots are compacted, see context_compaction.py
+MAX_TURNS = int(os.getenv("OHACKER_MAX_TURNS", "20"))
+
+# Screenshots sent in full with every request, older ones are replaced by text notes. 0 sends every screenshot.
+KEEP_SCREENSHOTS = int(os.getenv("OHACKER_KEEP_SCREENSHOTS", "3"))
+
+# Size cap of a single model request, fewer screenshots are kept above it
+MAX_REQUEST_BYTES = int(os.getenv("OHACKER_MAX_REQUEST_KB", "3072")) * 1024
+
+# Per-scan timings (JSON and Prometheus text) are written there, see metrics.py. Empty disables writing them.
+METRICS_DIR = os.getenv("OHACKER_METRICS_DIR", ".ohacker_cache/metrics")
+
+# Every run is recorded there for model-free replay (hack-replay), see session_recording.py. Empty disables it.
+SESSION_DIR = os.getenv("OHACKER_SESSION_DIR", ".ohacker_cache/recordings")
+
+# Smaller frames mean smaller uploads and fewer image tokens per turn, e.g. jpeg at quality 70 scaled to 768px
+SCREENSHOT_ENCODING = ScreenshotEncoding(
+    format=os.getenv("OHACKER_SCREENSHOT_FORMAT", "png"),  # type: ignore[arg-type]
+    quality=int(os.environ["OHACKER_SCREENSHOT_QUALITY"]) if os.getenv("OHACKER_SCREENSHOT_QUALITY") else None,
+    target_width=int(os.environ["OHACKER_SCREENSHOT_WIDTH"]) if os.getenv("OHACKER_SCREENSHOT_WIDTH") else None,
+)
+
+
+async def create_agent(name: str, tools: list[Any], dom_tools: bool = USE_DOM_TOOLS) -> Agent:
     """Creates the agent, associating it with the provided tools."""
-    print("Creating Agent instance...")
+    logger.debug("Creating Agent instance...")
     agent = Agent(
         name=name,
-        instructions=AGENTS[name],
+        instructions=AGENTS[name] + (TOOLS_HINT if dom_tools else "") + VERDICT_INSTRUCTIONS,
         tools=tools,
         model="computer-use-preview",
         model_settings=ModelSettings(
@@ -69,129 +134,238 @@ async def create_agent(name: str, tools: list[Any]) -> Agent:
     return agent
 
 
-async def main():
-    target_url = "http://localhost:8080/"
-    print(f"--- URL: {target_url} ---")
-    final_output_messages = list()
-
-    try:
-        for agent_name in AGENTS.keys():
-            computer = LocalPlaywrightComputer(target_url=target_url)
-            async with computer:
-                computer_tool = ComputerTool(computer)
-
-                @function_tool
-                async def get_current_url() -> str:
-                    """Gets the current URL of the browser page."""
-                    try:
-                        current_url = computer.page.url
-                        print(f"{GREEN}Tool: Got current URL: {current_url}{RESET}")
-                        return current_url
-                    except Exception as e:
-                        print(f"{Fore.RED}Tool Error (get_current_url): {e}{RESET}")
-                        return f"Error getting URL: {str(e)}"
-
-                @function_tool
-                async def navigate_to_url(url: str) -> str:
-                    """Navigates the browser page to the specified URL."""
-                    print(f"{GREEN}Tool: Attempting to navigate to {url}...{RESET}")
-                    try:
-                        await computer.page.goto(url, wait_until="domcontentloaded", timeout=60000)
-                        final_url = computer.page.url
-                        print(f"{GREEN}Tool: Successfully navigated. Current URL: {final_url}{RESET}")
-                        return f"Successfully navigated to {url}. Current URL is now {final_url}."
-                    except Exception as e:
-                        print(f"{Fore.RED}Tool Error (navigate_to_url): {e}{RESET}")
-                        return f"Error navigating to {url}: {str(e)}"
-
-                all_tools = [computer_tool, get_current_url, navigate_to_url]
-
-                agent_instance = await create_agent(agent_name, all_tools)
-
-                initial_input = "Start testing according to your instructions."
-                print(f"\n--- Running {agent_instance.name} ---")
-
-                result = Runner.run_streamed(
-                    agent_instance,
-                    input=initial_input,
-                    max_turns=20,
-                )
-                print(GREY + "=== Run starting ===" + RESET)
-
-                final_output_message = None
-
+def _is_comments_request(method: str) -> Callable[[PlaywrightResponse], bool]:
+    return lambda response: "/comments/" in response.url and response.request.method == method
+
+
+async def run_agent(
+    agent_name: str,
+    target_url: str,
+    output: AgentOutput,
+    pool: BrowserPool | None = None,
+    profile: LaunchProfile = HEADFUL_PROFILE,
+    dom_tools: bool = USE_DOM_TOOLS,
+) -> AgentRunResult:
+    """Runs a single pentest agent in its own browser context and returns its final message and turn count."""
+    # Everything logged while the agent runs, including the browser actions, is tagged with the agent name
+    with logger.contextualize(agent=output.name), logfire.span("pentest agent {agent}", agent=output.name):
+        run_id = new_run_id(output.name)
+        screenshot_dumper = ScreenshotDumper(SCREENSHOT_DIR, run_id) if SCREENSHOT_DIR else None
+        recorder = None
+        if SESSION_DIR:
+            recorder = SessionRecorder(SESSION_DIR, run_id, agent_name, target_url, SCREENSHOT_ENCODING, profile)
+        computer = LocalPlaywrightComputer(
+            target_url=target_url,
+            pool=pool,
+            profile=profile,
+            screenshot_dumper=screenshot_dumper,
+            encoding=SCREENSHOT_ENCODING,
+        )
+        async with computer:
+            computer_tool = ComputerTool(computer)
+
+            all_tools = [computer_tool, *build_browser_tools(computer, dom_tools=dom_tools)]
+
+            agent_instance = await create_agent(agent_name, all_tools, dom_tools=dom_tools)
+
+            compaction = CompactingProvider(
+                get_model_provider(),
+                CompactionPolicy(KEEP_SCREENSHOTS, MAX_REQUEST_BYTES, describe_frame=computer.describe_frame),
+            )
+            initial_input = "Start testing according to your instructions."
+            output.emit(f"--- Running {agent_instance.name} ---")
+
+            result = Runner.run_streamed(
+                agent_instance,
+                input=initial_input,
+                max_turns=MAX_TURNS,
+                run_config=run_config(compaction),
+            )
+            output.emit("=== Run starting ===", "DEBUG")
+
+            final_output_message = None
+            turns = 0
+            error = None
+            # Started tool calls by call id, to time how long the tools take to run
+            tool_calls: dict[str, tuple[str, float]] = {}
+            last_event = time.perf_counter()
+
+            try:
+                async for event in result.stream_events():
+                    now = time.perf_counter()
+                    event_type = event.data.type if event.type == "raw_response_event" else event.type
+                    if event.type == "run_item_stream_event":
+                        event_type = event.item.type
+                    METRICS.observe("stream_event_wait_seconds", now - last_event, event=event_type)
+                    last_event = now
+                    if event.type == "raw_response_event":
+                        if event.data.type == "response.completed":
+                            turns += 1
+                        continue
+
+                    elif event.type == "agent_updated_stream_event":
+                        # output.emit(f"Agent updated: {event.new_agent.name}", "DEBUG")
+                        continue
+
+                    elif event.type == "run_item_stream_event":
+                        item = event.item
+                        if item.type == "reasoning_item":
+                            # Check if summary exists and has text
+                            if item.raw_item and hasattr(item.raw_item, "summary") and item.raw_item.summary:
+                                text = item.raw_item.summary[0].text
+                                output.emit(f"-- Reasoning: {text}")
+                            else:
+                                output.emit("-- Reasoning: (No summary provided)")
+
+                        elif item.type == "message_output_item":
+                            msg = ItemHelpers.text_message_output(item)
+                            output.emit(f"-- Message output:\n{msg}", "SUCCESS")
+                            # Store the last message output as potential final output
+                            final_output_message = msg
+                            if recorder is not None:
+                                await recorder.message(msg)
+
+                        elif item.type == "tool_call_item":
+                            if isinstance(item.raw_item, ResponseComputerToolCall):
+                                action_name = item.raw_item.action
+                                output.emit(f"-- Tool Call: {action_name}")
+                                tool_calls[item.raw_item.call_id] = (f"computer.{action_name.type}", now)
+                            else:
+                                tool_name = item.raw_item.name
+                                args = item.raw_item.arguments
+                                output.emit(f"-- Tool Call: {tool_name}(args={args})")
+                                tool_calls[item.raw_item.call_id] = (tool_name, now)
+                            if recorder is not None:
+                                await recorder.tool_call(item.raw_item)
+
+                        elif item.type == "tool_call_output_item":
+                            if (call := tool_calls.pop(item.raw_item["call_id"], None)) is not None:
+                                # Tool run and follow-up screenshot, as seen from the event stream
+                                METRICS.observe("tool_call_seconds", now - call[1], tool=call[0])
+                            tool_output = str(item.output)
+                            output.emit(
+                                f"-- Tool Output: {tool_output[:200]}{'...' if len(tool_output) > 200 else ''}",
+                                "DEBUG",
+                            )
+                            if recorder is not None:
+                                await recorder.tool_output(item.raw_item, computer.page.url)
+            except Exception as e:
+                output.emit(f"agent exception: {e}", "ERROR")
+                error = repr(e)
+
+            post_run_started = time.perf_counter()
+            if agent_name == "Simple website tester 1.":
+                await computer.wait_until_quiet()
+                await computer.page.goto(target_url, wait_until="domcontentloaded", timeout=60000)
+                if recorder is not None:
+                    await recorder.page_step("goto", url=target_url)
+
+            if agent_name == "Simple website tester 2.":
+                output.emit("-- Tool Call: ActionClick(button='left', type='click', x=725.123, y=713.5633)")
                 try:
-                    async for event in result.stream_events():
-                        if event.type == "raw_response_event":
-                            continue
-
-                        elif event.type == "agent_updated_stream_event":
-                            # print(GREY + f"Agent updated: {event.new_agent.name}" + RESET)
-                            continue
-
-                        elif event.type == "run_item_stream_event":
-                            item = event.item
-                            if item.type == "reasoning_item":
-                                # Check if summary exists and has text
-                                if item.raw_item and hasattr(item.raw_item, "summary") and item.raw_item.summary:
-                                    text = item.raw_item.summary[0].text
-                                    print(f"{BLUE}-- Reasoning: {text}{RESET}")
-                                else:
-                                    print(f"{BLUE}-- Reasoning: (No summary provided){RESET}")
-
-                            elif item.type == "message_output_item":
-                                msg = ItemHelpers.text_message_output(item)
-                                print(f"{GREEN}-- Message output:\n{msg}{RESET}")
-                                # Store the last message output as potential final output
-                                final_output_message = msg
-
-                            elif item.type == "tool_call_item":
-                                if isinstance(item.raw_item, ResponseComputerToolCall):
-                                    action_name = item.raw_item.action
-                                    print(f"{Fore.YELLOW}-- Tool Call: {action_name}{RESET}")
-                                else:
-                                    tool_name = item.raw_item.name
-                                    args = item.raw_item.arguments
-                                    print(f"{Fore.YELLOW}-- Tool Call: {tool_name}(args={args}){RESET}")
-
-                            elif item.type == "tool_output_item":
-                                output = item.raw_item.output
-                                print(
-                                    f"{Fore.CYAN}-- Tool Output: {output[:200]}{'...' if len(output) > 200 else ''}{RESET}"
-                                )
-                except Exception as e:
-                    print("agent exception: {e}")
-                    pass
-
-                if agent_name == "Simple website tester 1.":
-                    await asyncio.sleep(2)
-                    await computer.page.goto(target_url, wait_until="domcontentloaded", timeout=60000)
-
-                if agent_name == "Simple website tester 2.":
-                    print(
-                        f"{Fore.YELLOW}-- Tool Call: ActionClick(button='left', type='click', x=725.123, y=713.5633){RESET}"
-                    )
-                    await computer.page.get_by_role("button", name="Post", exact=True).first.click()
-                    await asyncio.sleep(5)
-                    await computer.page.reload(wait_until="domcontentloaded", timeout=15000)
-                    await asyncio.sleep(8)
-
-                print("*" * 66)
-                print(final_output_message)
-                final_output_messages.append(final_output_message)
-
-    except Exception as e:
-        print(Fore.RED + f"An error occurred in main: {e}" + RESET)
-        import traceback
-
-        traceback.print_exc()
+                    # Wait for the comment to reach the backend and for the comment list to be fetched again,
+                    # instead of sleeping for a fixed time.
+                    async with computer.page.expect_response(_is_comments_request("POST"), timeout=15000):
+                        await computer.page.get_by_role("button", name="Post", exact=True).first.click()
+                    async with computer.page.expect_response(_is_comments_request("GET"), timeout=15000):
+                        await computer.page.reload(wait_until="domcontentloaded", timeout=15000)
+                except PlaywrightTimeoutError as e:
+                    output.emit(f"Comments did not reload: {e}", "ERROR")
+                await computer.wait_until_quiet()
+                if recorder is not None:
+                    await recorder.page_step("click_button", name="Post")
+                    await recorder.page_step("reload")
+
+            METRICS.observe("post_run_seconds", time.perf_counter() - post_run_started, agent=output.name)
+            output.emit(f"Screenshots: {computer.screenshot_stats.summary()}")
+            output.emit(f"Model requests: {compaction.stats.summary()}")
+            if computer.frame_changes is not None:
+                output.emit(f"Unchanged frames: {computer.frame_changes.summary()}")
+            run_result = AgentRunResult(agent_name, final_output_message, turns, error)
+            output.emit(f"Finished in {turns} turns, finding confirmed: {run_result.confirmed}")
+            if recorder is not None:
+                await recorder.finish(run_result)
+            output.emit("*" * 66)
+            output.emit(str(final_output_message))
+            return run_result
+
+
+async def main(
+    target_url: str = TARGET_URL,
+    api_url: str = API_URL,
+    max_concurrency: int = MAX_CONCURRENT_AGENTS,
+    profile: LaunchProfile = LAUNCH_PROFILE,
+):
+    logger.info("--- URL: {} ---", target_url)
+    started = time.perf_counter()
+    pipeline = FindingPipeline()
+
+    # Every agent gets its own browser and its own prefixed output, so they can all run at the same time.
+    outputs = {
+        agent_name: AgentOutput(name) for agent_name, name in zip(AGENTS, NAMES, strict=True)
+    }
+
+    # Checks a plain HTTP client can decide in milliseconds never reach the computer-use agents
+    decided: dict[str, AgentRunResult | BaseException] = {}
+    if USE_PRESCAN:
+        with METRICS.time("prescan_seconds"):
+            findings = await prescan(api_url)
+        for agent_name, output in outputs.items():
+            finding = findings.get(AGENT_VULN_CLASSES[agent_name])
+            if finding is not None and finding.status is not ScanStatus.INCONCLUSIVE:
+                output.emit(f"Decided by the fast scan, skipping the agent:\n{finding.summary()}")
+                decided[agent_name] = AgentRunResult(agent_name, finding.summary())
+                if USE_PIPELINE:
+                    pipeline.submit(output.name, decided[agent_name])
+
+    async def run_and_submit(agent_name: str, pool: BrowserPool) -> AgentRunResult:
+        with METRICS.time("agent_run_seconds", agent=outputs[agent_name].name):
+            result = await run_agent(agent_name, target_url, outputs[agent_name], pool, profile)
+        if USE_PIPELINE:
+            pipeline.submit(outputs[agent_name].name, result)
+        return result
+
+    # Agents borrow isolated contexts from a few long-lived browsers instead of launching their own.
+    pending = [agent_name for agent_name in outputs if agent_name not in decided]
+    results = dict(decided)
+    if pending:
+        async with BrowserPool(size=BROWSER_POOL_SIZE, launch_options=profile.launch_options()) as pool:
+            await pool.warm_up()
+            results |= await run_concurrently(
+                {
+                    agent_name: functools.partial(run_and_submit, agent_name, pool)
+                    for agent_name in pending
+                },
+                max_concurrency=max_concurrency,
+            )
+
+    results = {agent_name: results[agent_name] for agent_name in outputs}  # back in AGENTS order
+    run_results = []
+    for agent_name, result in results.items():
+        if isinstance(result, BaseException):
+            outputs[agent_name].emit(f"An error occurred while running the agent: {result!r}", "ERROR")
+            logger.opt(exception=result).bind(agent=outputs[agent_name].name).debug("Agent traceback")
+            run_results.append(AgentRunResult(agent_name, error=repr(result)))
+        else:
+            run_results.append(result)
+    final_output_messages = [result.message for result in run_results]
+    logger.info(
+        "Turns per confirmed finding: {} ({} turns in total, DOM tools {})",
+        turns_per_finding(run_results),
+        sum(result.turns for result in run_results),
+        "on" if USE_DOM_TOOLS else "off",
+    )
 
     summary = ""
     for i, msg in enumerate(final_output_messages):
         summary += f"{i}. {NAMES[i]}:\n{msg}\n\n"
     query = f"The summary of the penetration testing agents results:\n{summary}"
 
-    report, code_patch = await asyncio.gather(ResearchManager().run(query), run_patch_agent(query))
+    with METRICS.time("pipeline_finish_seconds"):
+        report, code_patch = await pipeline.finish(query)
+    METRICS.observe("scan_seconds", time.perf_counter() - started)
+    if METRICS_DIR:
+        METRICS.write(METRICS_DIR, new_run_id("scan"))
 
 
 if __name__ == "__main__":
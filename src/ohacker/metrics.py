@@ -0,0 +1,197 @@
+"""In-process timers and counters for a latency breakdown of a whole scan.
+
+Browser startup, every computer action, screenshot encoding, model requests, tool calls, post-run waits, research
+and patching all report into one `MetricsRegistry`. At the end of a run `write` stores a JSON summary and the same
+numbers in the Prometheus text format, with p50/p95 per timer:
+
+    computer_action_seconds{action="click",quantile="0.5"} 0.0213
+"""
+
+import functools
+import json
+import random
+import threading
+import time
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, ParamSpec, TypeVar
+
+from loguru import logger
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+Labels = tuple[tuple[str, str], ...]
+
+# Observations kept per timer for the quantiles, a uniform sample of everything observed beyond that
+RESERVOIR_SIZE = 10_000
+
+
+@dataclass
+class Timer:
+    """Count, sum and max of every observation, quantiles from a reservoir sample."""
+
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    sample: list[float] = field(default_factory=list)
+
+    def observe(self, seconds: float) -> None:
+        """Adds one observation."""
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        if len(self.sample) < RESERVOIR_SIZE:
+            self.sample.append(seconds)
+        elif (index := random.randrange(self.count)) < RESERVOIR_SIZE:  # noqa: S311
+            self.sample[index] = seconds
+
+    def quantile(self, q: float) -> float:
+        """The q-quantile (0-1) of the sample, 0 without observations."""
+        if not self.sample:
+            return 0.0
+        ordered = sorted(self.sample)
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    def snapshot(self) -> dict[str, float]:
+        """Count, sum, p50, p95 and max, rounded to microseconds."""
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "p50": round(self.quantile(0.5), 6),
+            "p95": round(self.quantile(0.95), 6),
+            "max": round(self.max, 6),
+        }
+
+
+def _labels(labels: dict[str, object]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _series(name: str, labels: Labels) -> str:
+    """Prometheus series name, e.g. `computer_action_seconds{action="click"}`."""
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+class MetricsRegistry:
+    """Named timers and counters, each series identified by its name and labels.
+
+    Example:
+        ```python
+        with METRICS.time("computer_action_seconds", action="click"):
+            await page.mouse.click(x, y)
+        METRICS.count("stream_events_total", type="raw_response_event")
+        ```
+    """
+
+    def __init__(self):
+        self.timers: dict[str, dict[Labels, Timer]] = {}
+        self.counters: dict[str, dict[Labels, float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float, **labels: object) -> None:
+        """Adds a duration to the timer of the series."""
+        with self._lock:
+            self.timers.setdefault(name, {}).setdefault(_labels(labels), Timer()).observe(seconds)
+
+    def count(self, name: str, amount: float = 1, **labels: object) -> None:
+        """Adds `amount` to the counter of the series."""
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            key = _labels(labels)
+            series[key] = series.get(key, 0) + amount
+
+    @contextmanager
+    def time(self, name: str, **labels: object) -> Iterator[None]:
+        """Times the block, also when it raises. Works around `await` too."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def timed(self, name: str, **labels: object) -> Callable[[Callable[P, Awaitable[T]]], Callable[P, Awaitable[T]]]:
+        """Decorator timing every call of a coroutine function."""
+
+        def decorator(function: Callable[P, Awaitable[T]]) -> Callable[P, Awaitable[T]]:
+            @functools.wraps(function)
+            async def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
+                with self.time(name, **labels):
+                    return await function(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def reset(self) -> None:
+        """Forgets every series."""
+        with self._lock:
+            self.timers.clear()
+            self.counters.clear()
+
+    def snapshot(self) -> dict[str, Any]:
+        """Every timer and counter as JSON-serializable data, series sorted by name and labels."""
+        with self._lock:
+            return {
+                "timers": {
+                    name: [{"labels": dict(labels), **timer.snapshot()} for labels, timer in sorted(series.items())]
+                    for name, series in sorted(self.timers.items())
+                },
+                "counters": {
+                    name: [{"labels": dict(labels), "value": value} for labels, value in sorted(series.items())]
+                    for name, series in sorted(self.counters.items())
+                },
+            }
+
+    def to_prometheus(self) -> str:
+        """Every series in the Prometheus text format, timers as summaries with p50 and p95."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.timers.items()):
+                lines.append(f"# TYPE {name} summary")
+                for labels, timer in sorted(series.items()):
+                    for q in (0.5, 0.95):
+                        lines.append(f"{_series(name, (*labels, ('quantile', str(q))))} {timer.quantile(q):.6f}")
+                    lines.append(f"{_series(name + '_sum', labels)} {timer.total:.6f}")
+                    lines.append(f"{_series(name + '_count', labels)} {timer.count}")
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                lines.extend(f"{_series(name, labels)} {value:g}" for labels, value in sorted(series.items()))
+        return "\n".join(lines) + "\n"
+
+    def breakdown(self, top: int = 10) -> str:
+        """The timers with the most total time, one line each, for the end-of-run log."""
+        with self._lock:
+            rows = [
+                (timer.total, _series(name, labels), timer)
+                for name, series in self.timers.items()
+                for labels, timer in series.items()
+            ]
+        rows.sort(key=lambda row: row[0], reverse=True)
+        return "\n".join(
+            f"{total:9.2f}s  n={timer.count:<5} p50={timer.quantile(0.5) * 1000:8.1f}ms "
+            f"p95={timer.quantile(0.95) * 1000:8.1f}ms  {series}"
+            for total, series, timer in rows[:top]
+        )
+
+    def write(self, directory: str | Path, run_id: str) -> Path:
+        """Writes `<run_id>.json` and `<run_id>.prom` to the directory, returns the JSON path."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{run_id}.json"
+        path.write_text(json.dumps({"run_id": run_id, **self.snapshot()}, indent=2))
+        (directory / f"{run_id}.prom").write_text(self.to_prometheus())
+        logger.info("Metrics written to {}, most time went to:\n{}", path, self.breakdown())
+        return path
+
+
+# The registry of the process, every component reports here
+METRICS = MetricsRegistry()
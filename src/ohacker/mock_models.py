@@ -0,0 +1,451 @@
+"""Offline models for the Agents SDK: scripted answers and recorded responses instead of live OpenAI calls.
+
+`ScriptedProvider` answers every agent of the pipeline with canned outputs: search plans, summaries, reports and
+patches for the research and patch agents, and a fixed sequence of computer and browser tool calls for the
+pentest agents, which really run against the browser. `RecordingProvider` wraps a live provider and stores every
+response, `ReplayProvider` serves them again. Install one with `run_config.set_model_provider` or the
+OHACKER_MODEL_PROVIDER environment variable.
+"""
+
+import abc
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import uuid
+from collections.abc import AsyncIterator, Callable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from agents import (
+    AgentOutputSchema,
+    ComputerTool,
+    Handoff,
+    Model,
+    ModelProvider,
+    ModelResponse,
+    ModelSettings,
+    ModelTracing,
+    Tool,
+    Usage,
+)
+from agents.items import TResponseInputItem, TResponseOutputItem, TResponseStreamEvent
+from openai.types.responses import Response, ResponseCompletedEvent, ResponseOutputItem, ResponseTextDeltaEvent
+from pydantic import TypeAdapter
+
+_OUTPUT_ITEM: TypeAdapter[TResponseOutputItem] = TypeAdapter(ResponseOutputItem)
+
+# Characters per text delta of a streamed scripted message, roughly what the API sends
+STREAM_CHUNK_SIZE = 64
+
+
+def _new_id(prefix: str) -> str:
+    return f"{prefix}_{uuid.uuid4().hex}"
+
+
+def message(text: str) -> TResponseOutputItem:
+    """A completed assistant message, also how structured outputs arrive as JSON text."""
+    return _OUTPUT_ITEM.validate_python(
+        {
+            "type": "message",
+            "id": _new_id("msg"),
+            "role": "assistant",
+            "status": "completed",
+            "content": [{"type": "output_text", "text": text, "annotations": []}],
+        }
+    )
+
+
+def computer_call(action: dict[str, Any]) -> TResponseOutputItem:
+    """A computer-use-preview action, e.g. {"type": "click", "button": "left", "x": 10, "y": 20}."""
+    return _OUTPUT_ITEM.validate_python(
+        {
+            "type": "computer_call",
+            "id": _new_id("cu"),
+            "call_id": _new_id("call"),
+            "action": action,
+            "pending_safety_checks": [],
+            "status": "completed",
+        }
+    )
+
+
+def function_call(name: str, arguments: dict[str, Any]) -> TResponseOutputItem:
+    """A call of the function tool `name`, e.g. ("list_images", {})."""
+    return _OUTPUT_ITEM.validate_python(
+        {
+            "type": "function_call",
+            "id": _new_id("fc"),
+            "call_id": _new_id("call"),
+            "name": name,
+            "arguments": json.dumps(arguments),
+            "status": "completed",
+        }
+    )
+
+
+def _item_type(item: object) -> str | None:
+    return item.get("type") if isinstance(item, dict) else getattr(item, "type", None)
+
+
+@dataclass
+class ModelRequest:
+    """What a model is asked, as scripts and recordings see it."""
+
+    model_name: str | None
+    system_instructions: str | None
+    input: str | list[TResponseInputItem]
+    tools: list[Tool]
+    output_schema: AgentOutputSchema | None
+
+    @property
+    def turn(self) -> int:
+        """Tool results in the input, i.e. how far into its tool loop the agent is."""
+        if isinstance(self.input, str):
+            return 0
+        return sum(_item_type(item) in ("function_call_output", "computer_call_output") for item in self.input)
+
+    @property
+    def user_input(self) -> str:
+        """Text of the first user message, the input the run was started with."""
+        if isinstance(self.input, str):
+            return self.input
+        for item in self.input:
+            if isinstance(item, dict) and item.get("role") == "user":
+                content = item.get("content")
+                return content if isinstance(content, str) else json.dumps(content)
+        return ""
+
+    @property
+    def output_type_name(self) -> str | None:
+        """Class name of the structured output the agent expects, None for plain text."""
+        if self.output_schema is None or self.output_schema.is_plain_text():
+            return None
+        return getattr(self.output_schema.output_type, "__name__", None)
+
+    def has_tool(self, name: str) -> bool:
+        """Whether the agent was given the tool `name`."""
+        return any(getattr(tool, "name", None) == name for tool in self.tools)
+
+    @property
+    def uses_computer(self) -> bool:
+        """Whether the agent drives a browser, i.e. is one of the pentest agents."""
+        return any(isinstance(tool, ComputerTool) for tool in self.tools)
+
+    def key(self) -> str:
+        """Identifies the request in a recording: the agent (its instructions), the run input and the turn."""
+        digest = hashlib.sha256(f"{self.system_instructions}\0{self.user_input}".encode()).hexdigest()[:16]
+        return f"{digest}:{self.turn}"
+
+
+Script = Callable[[ModelRequest], list[TResponseOutputItem]]
+
+
+def _structured(value: dict[str, Any]) -> list[TResponseOutputItem]:
+    return [message(json.dumps(value))]
+
+
+SCRIPTED_REPORT = """# Vulnerability report (scripted)
+
+Offline run, the content below is a placeholder produced without any model.
+
+## Findings
+
+The penetration test agents reported their results, see the summary.
+
+## Remediation
+
+- Use parameterized queries for every SQL statement.
+- Resolve requested file paths and reject anything outside the upload folder.
+
+## References
+
+- OWASP Top 10
+"""
+
+
+def _canned_output(request: ModelRequest) -> list[TResponseOutputItem] | None:
+    """Outputs of the structured-output agents of the pipeline, by output type."""
+    name = request.output_type_name
+    if name == "WebSearchPlan":
+        queries = [
+            "prevent SQL injection parameterized queries",
+            "how to prevent SQL injection with parameterized queries",
+            "path traversal prevention FastAPI file serving",
+            "sqlite executescript security risks",
+        ]
+        return _structured({"searches": [{"reason": "Scripted search.", "query": query} for query in queries]})
+    if name == "ReportData":
+        return _structured({"short_summary": "Scripted offline report.", "markdown_report": SCRIPTED_REPORT})
+    if name == "SecurityPatch":
+        code = request.user_input.split("Code:\n", 1)[-1]
+        return _structured({"description": "Scripted patch, the code is unchanged.", "python_code": code})
+    if name == "RegionPatch":
+        return _structured({"description": "Scripted patch, no change.", "diff": ""})
+    return None
+
+
+def pentest_script(request: ModelRequest, verdict: str = "VULNERABLE") -> list[TResponseOutputItem]:
+    """A fixed computer-use session: look around, act on the page, then report."""
+    sql_injection = "SQL Injection" in (request.system_instructions or "")
+    steps: list[Callable[[], TResponseOutputItem]] = [
+        lambda: computer_call({"type": "screenshot"}),
+        lambda: computer_call({"type": "scroll", "x": 540, "y": 540, "scroll_x": 0, "scroll_y": 300}),
+        lambda: computer_call({"type": "click", "button": "left", "x": 540, "y": 420}),
+    ]
+    if sql_injection:
+        # A harmless probe, the scripted session must not damage a real local backend
+        steps += [
+            lambda: computer_call({"type": "type", "text": "ohacker probe '"}),
+            lambda: computer_call({"type": "keypress", "keys": ["ENTER"]}),
+        ]
+    elif request.has_tool("list_images"):
+        steps.append(lambda: function_call("list_images", {}))
+    if request.has_tool("get_current_url"):
+        steps.append(lambda: function_call("get_current_url", {}))
+    steps.append(lambda: computer_call({"type": "wait"}))
+
+    if request.turn < len(steps):
+        return [steps[request.turn]()]
+    return [message(f"Scripted offline session of {len(steps)} steps, nothing was tested.\nVERDICT: {verdict}")]
+
+
+def default_script(request: ModelRequest) -> list[TResponseOutputItem]:
+    """Answers every agent of the pipeline: canned structured outputs, `pentest_script` or a search summary."""
+    if (canned := _canned_output(request)) is not None:
+        return canned
+    if request.uses_computer:
+        return pentest_script(request)
+    # The search agent: its hosted web search tool cannot run offline, the summary comes straight away
+    term = re.sub(r"\s+", " ", request.user_input)[:200]
+    return [message(f"Scripted summary for: {term}. Use parameterized queries and validate file paths.")]
+
+
+async def _stream(output: list[TResponseOutputItem], model_name: str | None) -> AsyncIterator[TResponseStreamEvent]:
+    """Streams a complete output like the Responses API: text deltas of every message, then the completed event."""
+    for index, item in enumerate(output):
+        if item.type != "message":
+            continue
+        text = "".join(getattr(part, "text", "") for part in item.content)
+        for start in range(0, len(text), STREAM_CHUNK_SIZE):
+            yield ResponseTextDeltaEvent.model_construct(
+                type="response.output_text.delta",
+                item_id=item.id,
+                output_index=index,
+                content_index=0,
+                delta=text[start : start + STREAM_CHUNK_SIZE],
+            )
+    yield ResponseCompletedEvent.model_construct(
+        type="response.completed",
+        response=Response.model_construct(
+            id=_new_id("resp"), object="response", model=model_name or "offline", output=output, usage=None
+        ),
+    )
+
+
+class _OfflineModel(Model, abc.ABC):
+    """Answers from `_respond`, with an optional artificial latency per request."""
+
+    def __init__(self, model_name: str | None, latency: float = 0.0):
+        self.model_name = model_name
+        self.latency = latency
+
+    @abc.abstractmethod
+    def _respond(self, request: ModelRequest) -> list[TResponseOutputItem]:
+        """Output items answering the request."""
+
+    async def _output(self, request: ModelRequest) -> list[TResponseOutputItem]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._respond(request)
+
+    async def get_response(
+        self,
+        system_instructions: str | None,
+        input: str | list[TResponseInputItem],
+        model_settings: ModelSettings,
+        tools: list[Tool],
+        output_schema: AgentOutputSchema | None,
+        handoffs: list[Handoff],
+        tracing: ModelTracing,
+        *,
+        previous_response_id: str | None,
+    ) -> ModelResponse:
+        request = ModelRequest(self.model_name, system_instructions, input, tools, output_schema)
+        return ModelResponse(output=await self._output(request), usage=Usage(requests=1), response_id=None)
+
+    async def stream_response(
+        self,
+        system_instructions: str | None,
+        input: str | list[TResponseInputItem],
+        model_settings: ModelSettings,
+        tools: list[Tool],
+        output_schema: AgentOutputSchema | None,
+        handoffs: list[Handoff],
+        tracing: ModelTracing,
+        *,
+        previous_response_id: str | None,
+    ) -> AsyncIterator[TResponseStreamEvent]:
+        request = ModelRequest(self.model_name, system_instructions, input, tools, output_schema)
+        async for event in _stream(await self._output(request), self.model_name):
+            yield event
+
+
+class ScriptedModel(_OfflineModel):
+    """Answers with `script`, counts the requests."""
+
+    def __init__(self, model_name: str | None, script: Script = default_script, latency: float = 0.0):
+        super().__init__(model_name, latency)
+        self.script = script
+        self.requests = 0
+
+    def _respond(self, request: ModelRequest) -> list[TResponseOutputItem]:
+        self.requests += 1
+        return self.script(request)
+
+
+class ScriptedProvider(ModelProvider):
+    """Serves `ScriptedModel`s for every model name.
+
+    Args:
+        script: Turns a request into output items, `default_script` covers all agents of the pipeline.
+        latency: Seconds every request waits, to simulate model latency.
+    """
+
+    offline = True
+
+    def __init__(self, script: Script = default_script, latency: float = 0.0):
+        self.script = script
+        self.latency = latency
+        self.models: list[ScriptedModel] = []
+
+    @property
+    def requests(self) -> int:
+        """Requests answered by all models served so far."""
+        return sum(model.requests for model in self.models)
+
+    def get_model(self, model_name: str | None) -> Model:
+        """A new `ScriptedModel`, kept for the request count."""
+        model = ScriptedModel(model_name, self.script, self.latency)
+        self.models.append(model)
+        return model
+
+
+class RecordingModel(Model):
+    """Passes requests to a live model and appends every response to a JSONL recording."""
+
+    def __init__(self, model: Model, path: Path, lock: threading.Lock):
+        self.model = model
+        self.path = path
+        self._lock = lock
+
+    def _append(self, request: ModelRequest, output: list[TResponseOutputItem]) -> None:
+        line = json.dumps({"key": request.key(), "output": [item.model_dump(mode="json") for item in output]})
+        with self._lock, self.path.open("a") as f:
+            f.write(line + "\n")
+
+    async def get_response(
+        self,
+        system_instructions: str | None,
+        input: str | list[TResponseInputItem],
+        model_settings: ModelSettings,
+        tools: list[Tool],
+        output_schema: AgentOutputSchema | None,
+        handoffs: list[Handoff],
+        tracing: ModelTracing,
+        *,
+        previous_response_id: str | None,
+    ) -> ModelResponse:
+        """Gets the live response and records it."""
+        response = await self.model.get_response(
+            system_instructions,
+            input,
+            model_settings,
+            tools,
+            output_schema,
+            handoffs,
+            tracing,
+            previous_response_id=previous_response_id,
+        )
+        request = ModelRequest(None, system_instructions, input, tools, output_schema)
+        await asyncio.to_thread(self._append, request, response.output)
+        return response
+
+    async def stream_response(
+        self,
+        system_instructions: str | None,
+        input: str | list[TResponseInputItem],
+        model_settings: ModelSettings,
+        tools: list[Tool],
+        output_schema: AgentOutputSchema | None,
+        handoffs: list[Handoff],
+        tracing: ModelTracing,
+        *,
+        previous_response_id: str | None,
+    ) -> AsyncIterator[TResponseStreamEvent]:
+        """Streams the live response and records it once completed."""
+        request = ModelRequest(None, system_instructions, input, tools, output_schema)
+        async for event in self.model.stream_response(
+            system_instructions,
+            input,
+            model_settings,
+            tools,
+            output_schema,
+            handoffs,
+            tracing,
+            previous_response_id=previous_response_id,
+        ):
+            if isinstance(event, ResponseCompletedEvent):
+                await asyncio.to_thread(self._append, request, event.response.output)
+            yield event
+
+
+class RecordingProvider(ModelProvider):
+    """Serves the models of `provider`, recording their responses to one JSONL file at `path`."""
+
+    def __init__(self, provider: ModelProvider, path: str | Path):
+        self.provider = provider
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def get_model(self, model_name: str | None) -> Model:
+        """The live model, wrapped in a `RecordingModel`."""
+        return RecordingModel(self.provider.get_model(model_name), self.path, self._lock)
+
+
+class ReplayModel(_OfflineModel):
+    """Answers with the recorded output of the request, raises LookupError when there is none."""
+
+    def __init__(self, model_name: str | None, responses: dict[str, list[dict[str, Any]]], latency: float = 0.0):
+        super().__init__(model_name, latency)
+        self.responses = responses
+
+    def _respond(self, request: ModelRequest) -> list[TResponseOutputItem]:
+        try:
+            recorded = self.responses[request.key()]
+        except KeyError:
+            raise LookupError(
+                f"No recorded response for turn {request.turn} of this agent and input, record the run again."
+            ) from None
+        return [_OUTPUT_ITEM.validate_python(item) for item in recorded]
+
+
+class ReplayProvider(ModelProvider):
+    """Serves the responses of a `RecordingProvider` recording. Requests are matched by agent, input and turn."""
+
+    offline = True
+
+    def __init__(self, path: str | Path, latency: float = 0.0):
+        self.latency = latency
+        self.responses: dict[str, list[dict[str, Any]]] = {}
+        for line in Path(path).read_text().splitlines():
+            if line.strip():
+                record = json.loads(line)
+                self.responses[record["key"]] = record["output"]
+
+    def get_model(self, model_name: str | None) -> Model:
+        """A `ReplayModel` over the whole recording."""
+        return ReplayModel(model_name, self.responses, self.latency)
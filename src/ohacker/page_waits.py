@@ -0,0 +1,90 @@
+import asyncio
+import contextlib
+import time
+
+from playwright.async_api import Error as PlaywrightError
+from playwright.async_api import Page, Request
+
+# Resolves once the DOM has not changed for `quietMs` and no finite animation is running, checked on every
+# animation frame, or after `timeoutMs` at the latest.
+_DOM_QUIET_SCRIPT = """
+([quietMs, timeoutMs]) => new Promise((resolve) => {
+    const started = performance.now();
+    let lastMutation = started;
+    const observer = new MutationObserver(() => { lastMutation = performance.now(); });
+    observer.observe(document, { subtree: true, childList: true, attributes: true, characterData: true });
+    const running = () => (document.getAnimations ? document.getAnimations() : []).filter(
+        (a) => a.playState === "running" && a.effect && a.effect.getComputedTiming().iterations !== Infinity
+    ).length;
+    const check = () => {
+        const now = performance.now();
+        if ((now - lastMutation >= quietMs && running() === 0) || now - started >= timeoutMs) {
+            observer.disconnect();
+            resolve(now - started);
+        } else {
+            requestAnimationFrame(check);
+        }
+    };
+    requestAnimationFrame(check);
+})
+"""
+
+
+class NetworkActivity:
+    """Counts the requests of a page that are still in flight.
+
+    Playwright's "networkidle" load state only fires once per navigation, so it cannot tell whether a click
+    started new requests. This tracker follows every request of the page instead.
+    """
+
+    def __init__(self, page: Page):
+        self._in_flight: set[Request] = set()
+        self._last_activity = time.monotonic()
+        page.on("request", self._started)
+        page.on("requestfinished", self._finished)
+        page.on("requestfailed", self._finished)
+
+    @property
+    def in_flight(self) -> int:
+        """Requests started and not yet finished or failed."""
+        return len(self._in_flight)
+
+    def _started(self, request: Request) -> None:
+        self._in_flight.add(request)
+        self._last_activity = time.monotonic()
+
+    def _finished(self, request: Request) -> None:
+        self._in_flight.discard(request)
+        self._last_activity = time.monotonic()
+
+    async def wait_idle(self, idle: float = 0.3, timeout: float = 5.0, poll: float = 0.05) -> bool:
+        """Waits until no request was in flight for `idle` seconds. Returns False when the timeout was hit."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if not self._in_flight and time.monotonic() - self._last_activity >= idle:
+                return True
+            await asyncio.sleep(poll)
+        return False
+
+
+async def wait_for_page_quiet(
+    page: Page,
+    network: NetworkActivity | None = None,
+    timeout: float = 3.0,
+    quiet: float = 0.3,
+) -> float:
+    """Waits until the network is idle and the DOM and animations have settled, at most `timeout` seconds.
+
+    Returns the time waited in seconds. A page that is already quiet returns after about `quiet` seconds,
+    compared to the fixed sleeps used before.
+    """
+    started = time.monotonic()
+    if network is not None:
+        await network.wait_idle(idle=quiet, timeout=timeout)
+    remaining = timeout - (time.monotonic() - started)
+    if remaining > 0:
+        # Timed out or the page navigated away while waiting, both mean there is nothing more to wait for
+        with contextlib.suppress(TimeoutError, PlaywrightError):
+            # The page may stop rendering animation frames (e.g. a hidden headful window), hence the outer timeout
+            await asyncio.wait_for(page.evaluate(_DOM_QUIET_SCRIPT, [quiet * 1000, remaining * 1000]), remaining + 0.5)
+    return time.monotonic() - started
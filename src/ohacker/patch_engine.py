@@ -0,0 +1,369 @@
+"""Targeted patch generation: only the functions a finding is about go to the model, and only diffs come back.
+
+The functions are located with the AST (SQL built from strings and passed to execute, files opened for reading),
+every function is patched by its own concurrent model call, and the returned unified diffs are applied and
+verified locally before they are combined.
+"""
+
+import ast
+import asyncio
+import re
+from collections.abc import Collection
+from dataclasses import dataclass, field
+
+from agents import Agent, Runner
+from loguru import logger
+from pydantic import BaseModel
+
+from src.ohacker.metrics import METRICS
+from src.ohacker.run_config import run_config
+
+# Words in a findings summary that point to a vulnerability class
+VULN_KEYWORDS = {
+    "sqli": ("sql", "injection", "drop table"),
+    "lfi": ("lfi", "file inclusion", "path traversal", "directory traversal", "secrets.txt", "/etc/passwd"),
+}
+
+SQL_EXECUTE_METHODS = frozenset({"execute", "executescript", "executemany", "raw"})
+
+# Calls that read the file at one of their arguments, with the position of that argument. Besides the framework's
+# file responses these are the backend's file-serving helpers (backend/file_serving.py): the function handing them
+# a request path is the file inclusion sink, not the helper itself
+FILE_READ_CALLS = {"FileResponse": 0, "send_file": 0, "file_response": 1, "open_file": 0}
+_SQL_TEXT = re.compile(r"(?i)\b(select|insert|update|delete|drop|create|alter)\b")
+
+PROMPT = (
+    "You are a senior cybersecurity expert fixing vulnerable Python code. You are given a summary of the findings, "
+    "the module context (imports and settings) and one function of the file, with its position in the file.\n"
+    "Fix only the vulnerabilities of this function, keep its behavior and signature otherwise. "
+    "Return a unified diff of the function (---/+++ header, @@ hunks with the file's line numbers, 3 lines of "
+    "context) and a short markdown description of the fix. If the function needs no change, return an empty diff."
+)
+
+
+class PatchApplyError(ValueError):
+    """A diff does not apply to the code it was made for, or the patched code does not parse."""
+
+
+class RegionPatch(BaseModel):
+    """Output of `diff_patch_agent` for one function."""
+
+    description: str
+    """Description in markdown format of the issue found in the function and how it is fixed."""
+
+    diff: str
+    """Unified diff of the function, empty when nothing needs to change."""
+
+
+diff_patch_agent = Agent(
+    name="CybersecurityDiffPatchAgent",
+    instructions=PROMPT,
+    model="o4-mini",
+    output_type=RegionPatch,
+)
+
+
+@dataclass(frozen=True)
+class CodeRegion:
+    """One function of a file, lines are 1-based and inclusive, decorators included."""
+
+    path: str
+    name: str
+    start: int
+    end: int
+    source: str
+
+
+@dataclass
+class Hunk:
+    """One hunk of a unified diff, `old_start` is 1-based."""
+
+    old_start: int
+    old_lines: list[str] = field(default_factory=list)
+    new_lines: list[str] = field(default_factory=list)
+
+
+def classify_findings(description: str) -> set[str]:
+    """Vulnerability classes ("sqli", "lfi") a findings summary talks about."""
+    text = description.casefold()
+    return {vuln_class for vuln_class, keywords in VULN_KEYWORDS.items() if any(k in text for k in keywords)}
+
+
+def function_regions(path: str, source: str, tree: ast.Module | None = None) -> list[CodeRegion]:
+    """All functions and methods of a file."""
+    tree = tree or ast.parse(source)
+    lines = source.splitlines()
+    regions = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.FunctionDef | ast.AsyncFunctionDef):
+            start = min([node.lineno, *(decorator.lineno for decorator in node.decorator_list)])
+            end = node.end_lineno or node.lineno
+            regions.append(CodeRegion(path, node.name, start, end, "\n".join(lines[start - 1 : end])))
+    return sorted(regions, key=lambda region: region.start)
+
+
+def module_context(source: str, tree: ast.Module | None = None) -> str:
+    """Imports and top-level assignments, the context a function needs to be understood."""
+    tree = tree or ast.parse(source)
+    return "\n".join(
+        ast.get_source_segment(source, node) or ""
+        for node in tree.body
+        if isinstance(node, ast.Import | ast.ImportFrom | ast.Assign | ast.AnnAssign)
+    )
+
+
+def _is_placeholders(node: ast.AST, names: Collection[str] = ()) -> bool:
+    """Bind parameter markers only, e.g. `", ".join("?" * len(names))`: no data gets into the SQL.
+
+    Args:
+        node: Expression to check.
+        names: Variables that hold placeholders only, see `_placeholder_names`.
+    """
+    if isinstance(node, ast.FormattedValue):
+        return _is_placeholders(node.value, names)
+    if isinstance(node, ast.Name):
+        return node.id in names
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "join":
+        return (
+            isinstance(node.func.value, ast.Constant) and len(node.args) == 1 and _is_placeholders(node.args[0], names)
+        )
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Mult):
+        return _is_placeholders(node.left, names) or _is_placeholders(node.right, names)
+    if isinstance(node, ast.List | ast.Tuple):
+        return all(_is_placeholders(element, names) for element in node.elts)
+    return isinstance(node, ast.Constant) and node.value in {"?", "%s"}
+
+
+def _placeholder_names(function: ast.FunctionDef | ast.AsyncFunctionDef) -> set[str]:
+    """Variables every assignment of which is a placeholder list."""
+    assigned: dict[str, bool] = {}
+    for node in ast.walk(function):
+        if isinstance(node, ast.Assign | ast.AnnAssign | ast.AugAssign):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            only_placeholders = isinstance(node, ast.Assign | ast.AnnAssign) and _is_placeholders(node.value)
+            for name in set().union(*(_names(target) for target in targets)):
+                assigned[name] = assigned.get(name, True) and only_placeholders
+    return {name for name, only_placeholders in assigned.items() if only_placeholders}
+
+
+def _operands(node: ast.AST) -> list[ast.AST]:
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Mod | ast.Add):
+        return [*_operands(node.left), *_operands(node.right)]
+    return [node]
+
+
+def _builds_sql(node: ast.AST, placeholders: Collection[str] = ()) -> bool:
+    """A string built at runtime (f-string, %, + or .format) that contains SQL and more than placeholders."""
+    constants = []
+    if isinstance(node, ast.JoinedStr):
+        values = [value for value in node.values if isinstance(value, ast.FormattedValue)]
+        if values and not all(_is_placeholders(value, placeholders) for value in values):
+            constants = [value.value for value in node.values if isinstance(value, ast.Constant)]
+    elif isinstance(node, ast.BinOp) and isinstance(node.op, ast.Mod | ast.Add):
+        if not all(isinstance(n, ast.Constant) or _is_placeholders(n, placeholders) for n in _operands(node)):
+            constants = [n.value for n in ast.walk(node) if isinstance(n, ast.Constant)]
+    elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "format":
+        arguments = [*node.args, *(keyword.value for keyword in node.keywords)]
+        if isinstance(node.func.value, ast.Constant) and not all(_is_placeholders(a, placeholders) for a in arguments):
+            constants = [node.func.value.value]
+    return any(isinstance(text, str) and _SQL_TEXT.search(text) for text in constants)
+
+
+def opens_for_reading(node: ast.Call) -> bool:
+    """Whether the call opens or reads a file, `open` without a write mode included."""
+    if isinstance(node.func, ast.Name) and node.func.id == "open":
+        mode = node.args[1] if len(node.args) > 1 else next((k.value for k in node.keywords if k.arg == "mode"), None)
+        return mode is None or (isinstance(mode, ast.Constant) and "r" in str(mode.value))
+    return _call_name(node) in {*FILE_READ_CALLS, "read_text", "read_bytes"}
+
+
+def _call_name(node: ast.Call) -> str:
+    return node.func.attr if isinstance(node.func, ast.Attribute) else getattr(node.func, "id", "")
+
+
+def _names(node: ast.AST) -> set[str]:
+    return {n.id for n in ast.walk(node) if isinstance(n, ast.Name)}
+
+
+def _parameter_derived_names(function: ast.FunctionDef | ast.AsyncFunctionDef) -> set[str]:
+    """Parameters and the variables assigned from them, in source order. A cheap stand-in for taint tracking."""
+    arguments = function.args
+    derived = {a.arg for a in [*arguments.posonlyargs, *arguments.args, *arguments.kwonlyargs]}
+    for node in ast.walk(function):
+        if isinstance(node, ast.Assign | ast.AnnAssign | ast.AugAssign) and node.value and _names(node.value) & derived:
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            derived |= set().union(*(_names(target) for target in targets))
+    return derived
+
+
+def sink_classes(function: ast.FunctionDef | ast.AsyncFunctionDef) -> set[str]:
+    """Vulnerability classes the function has a sink for.
+
+    SQL built from strings and executed is a SQL injection sink, a file opened for reading at a path derived from
+    a parameter is a file inclusion sink. The helpers of FILE_READ_CALLS are not sinks themselves, their callers are.
+    """
+    classes = set()
+    calls = [node for node in ast.walk(function) if isinstance(node, ast.Call)]
+    executes = any(isinstance(c.func, ast.Attribute) and c.func.attr in SQL_EXECUTE_METHODS for c in calls)
+    placeholders = _placeholder_names(function) if executes else set()
+    if executes and any(_builds_sql(node, placeholders) for node in ast.walk(function)):
+        classes.add("sqli")
+    if function.name in FILE_READ_CALLS:
+        return classes
+    derived = _parameter_derived_names(function)
+    for call in calls:
+        if not opens_for_reading(call):
+            continue
+        position = FILE_READ_CALLS.get(_call_name(call), 0)
+        path_nodes = [*call.args[position : position + 1]]
+        path_nodes += [k.value for k in call.keywords if k.arg in {"file", "path"}]
+        if isinstance(call.func, ast.Attribute) and call.func.attr in {"read_text", "read_bytes"}:
+            path_nodes.append(call.func.value)
+        if any(_names(node) & derived for node in path_nodes):
+            classes.add("lfi")
+    return classes
+
+
+def relevant_regions(path: str, source: str, description: str) -> list[CodeRegion]:
+    """Functions of a file a findings summary is about: sinks of the reported classes and functions it names."""
+    tree = ast.parse(source)
+    wanted = classify_findings(description) or set(VULN_KEYWORDS)
+    relevant_names = {
+        node.name
+        for node in ast.walk(tree)
+        if isinstance(node, ast.FunctionDef | ast.AsyncFunctionDef)
+        and (sink_classes(node) & wanted or re.search(rf"\b{re.escape(node.name)}\b", description))
+    }
+    return [region for region in function_regions(path, source, tree) if region.name in relevant_names]
+
+
+def parse_unified_diff(diff: str) -> list[Hunk]:
+    """Hunks of a unified diff, file headers, markdown fences and lines outside of hunks are skipped."""
+    lines = [line for line in diff.strip().splitlines() if not line.startswith("```")]
+    hunks: list[Hunk] = []
+    current: Hunk | None = None
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if line.startswith("--- ") and i + 1 < len(lines) and lines[i + 1].startswith("+++ "):
+            current = None
+            i += 2
+            continue
+        if header := re.match(r"^@@ -(\d+)(?:,\d+)? \+\d+(?:,\d+)? @@", line):
+            current = Hunk(int(header.group(1)))
+            hunks.append(current)
+        elif current is not None:
+            if line.startswith("+"):
+                current.new_lines.append(line[1:])
+            elif line.startswith("-"):
+                current.old_lines.append(line[1:])
+            elif not line.startswith("\\"):
+                # Context line, models drop the leading space of empty context lines
+                context = line[1:] if line.startswith(" ") else line
+                current.old_lines.append(context)
+                current.new_lines.append(context)
+        i += 1
+    return hunks
+
+
+def _locate(lines: list[str], block: list[str], hint: int) -> int | None:
+    """Start of `block` in `lines`, the match closest to the line number the hunk claims wins."""
+    if not block:
+        return min(max(hint, 0), len(lines))
+    for normalize in (lambda s: s, str.rstrip, str.strip):
+        wanted = [normalize(line) for line in block]
+        starts = [
+            i for i in range(len(lines) - len(block) + 1)
+            if [normalize(line) for line in lines[i : i + len(block)]] == wanted
+        ]
+        if starts:
+            return min(starts, key=lambda start: abs(start - hint))
+    return None
+
+
+def apply_hunks(source: str, hunks: list[Hunk]) -> str:
+    """Applies the hunks by content, tolerating wrong line numbers, and checks that the result parses."""
+    lines = source.splitlines()
+    placements = []
+    for hunk in hunks:
+        start = _locate(lines, hunk.old_lines, hunk.old_start - 1)
+        if start is None:
+            old = "\n".join(hunk.old_lines)
+            raise PatchApplyError(f"Hunk at line {hunk.old_start} does not match the code:\n{old}")
+        placements.append((start, start + len(hunk.old_lines), hunk))
+    placements.sort(key=lambda placement: placement[0])
+    for (_, end, _), (next_start, _, hunk) in zip(placements, placements[1:], strict=False):
+        if next_start < end:
+            raise PatchApplyError(f"Hunk at line {hunk.old_start} overlaps with the previous hunk.")
+    for start, end, hunk in reversed(placements):
+        lines[start:end] = hunk.new_lines
+    patched = "\n".join(lines) + ("\n" if source.endswith("\n") else "")
+    try:
+        ast.parse(patched)
+    except SyntaxError as e:
+        raise PatchApplyError(f"The patched code does not parse: {e}") from e
+    return patched
+
+
+class PatchEngine:
+    """Patches the relevant functions of a file concurrently, see the module docstring.
+
+    A diff that does not apply or breaks the syntax is sent back to the model with the error, up to
+    `max_attempts` times per function. Functions whose diff still fails are left unpatched and reported.
+    """
+
+    def __init__(self, max_attempts: int = 2):
+        self.max_attempts = max_attempts
+
+    async def patch_region(self, region: CodeRegion, source: str, description: str) -> tuple[RegionPatch, list[Hunk]]:
+        """Patch of one function, with its hunks verified against `source`."""
+        prompt = (
+            f"Short summary of the findings:\n\n{description}\n\n"
+            f"Module context of {region.path}:\n{module_context(source)}\n\n"
+            f"Function `{region.name}` of {region.path}, lines {region.start}-{region.end}:\n{region.source}\n"
+        )
+        error = None
+        for attempt in range(1, self.max_attempts + 1):
+            text = prompt if error is None else f"{prompt}\nYour previous diff could not be applied: {error}\n"
+            with METRICS.time("runner_seconds", agent=diff_patch_agent.name, cache="off"):
+                result = await Runner.run(diff_patch_agent, text, run_config=run_config())
+            patch = result.final_output_as(RegionPatch)
+            hunks = parse_unified_diff(patch.diff)
+            try:
+                apply_hunks(source, hunks)
+                return patch, hunks
+            except PatchApplyError as e:
+                error = str(e)
+                logger.warning("Diff for {} (attempt {}) does not apply: {}", region.name, attempt, error)
+        raise PatchApplyError(f"No applicable diff for {region.name} after {self.max_attempts} attempts: {error}")
+
+    async def patch_source(
+        self, path: str, source: str, description: str, names: Collection[str] | None = None
+    ) -> tuple[str, list[tuple[CodeRegion, RegionPatch]]]:
+        """Patched source of one file and the patches that went into it, the source itself when nothing applied.
+
+        Args:
+            path: Path of the file, as shown to the model.
+            source: Code of the file.
+            description: Summary of the findings to fix.
+            names: Functions to patch, e.g. from the symbol index. By default they are found in `source`.
+        """
+        if names is None:
+            regions = relevant_regions(path, source, description)
+        else:
+            regions = [region for region in function_regions(path, source) if region.name in names]
+        logger.info("Patching {} of {}: {}", len(regions), path, ", ".join(region.name for region in regions))
+        outcomes = await asyncio.gather(
+            *(self.patch_region(region, source, description) for region in regions), return_exceptions=True
+        )
+        applied: list[tuple[CodeRegion, RegionPatch]] = []
+        hunks: list[Hunk] = []
+        for region, outcome in zip(regions, outcomes, strict=True):
+            if isinstance(outcome, BaseException):
+                logger.error("Function {} of {} left unpatched: {!r}", region.name, path, outcome)
+                continue
+            patch, region_hunks = outcome
+            if region_hunks:
+                applied.append((region, patch))
+                hunks.extend(region_hunks)
+        return apply_hunks(source, hunks), applied
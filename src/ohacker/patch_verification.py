@@ -0,0 +1,242 @@
+"""Checks a generated patch before anyone deploys it: does the app still work, and are the holes closed?
+
+The patched app is imported in a worker process, inside a temporary copy of the backend, and served in-process
+through httpx's ASGI transport. The fast scan's LFI and SQL injection payloads and the normal requests of the
+frontend are replayed against it concurrently. Worker processes keep the chdir and the imported app of one
+candidate away from the others, so several candidates can be verified in parallel.
+
+Needs the backend dependencies: `uv sync --extra verify`.
+"""
+
+import asyncio
+import base64
+import importlib.util
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from pathlib import Path
+
+import httpx
+from loguru import logger
+
+from src.ohacker.fast_scan import FastScanner, ScanStatus
+
+# Upload folder and database the backend uses, relative to its working directory
+UPLOAD_FOLDER = "uploads_fastapi"
+
+# A 1x1 PNG, the image the functional checks upload, list and fetch
+SAMPLE_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=="
+)
+
+VERIFY_TIMEOUT = 60.0
+
+# The backend's own dependencies, installed with the "verify" extra
+BACKEND_MODULES = ("fastapi", "aiosqlite", "multipart")
+
+
+def dependencies_available() -> bool:
+    """Whether the backend can be imported here, see `BACKEND_MODULES`."""
+    return all(importlib.util.find_spec(module) is not None for module in BACKEND_MODULES)
+
+
+@dataclass
+class CheckResult:
+    """Outcome of one functional or security check."""
+
+    name: str
+    passed: bool
+    detail: str = ""
+    seconds: float = 0.0
+
+
+@dataclass
+class VerificationResult:
+    """Verdict on one patch candidate: it passes when every functional and every security check passes."""
+
+    candidate: str
+    checks: list[CheckResult] = field(default_factory=list)
+    seconds: float = 0.0
+    error: str | None = None
+
+    @property
+    def passed(self) -> bool:
+        """Whether the candidate ran and every check passed."""
+        return self.error is None and bool(self.checks) and all(check.passed for check in self.checks)
+
+    def summary(self) -> str:
+        """The verdict and every check, one line each."""
+        lines = [f"{self.candidate}: {'PASS' if self.passed else 'FAIL'} in {self.seconds:.2f}s"]
+        if self.error:
+            lines.append(f"  error: {self.error}")
+        for check in self.checks:
+            status = "ok  " if check.passed else "FAIL"
+            lines.append(f"  {status} {check.name} ({check.seconds * 1000:.0f}ms) {check.detail}".rstrip())
+        return "\n".join(lines)
+
+
+async def _timed(name: str, check: Callable[[], Awaitable[tuple[bool, str]]]) -> CheckResult:
+    started = time.perf_counter()
+    try:
+        passed, detail = await check()
+    except Exception as e:
+        passed, detail = False, repr(e)
+    return CheckResult(name, passed, detail, time.perf_counter() - started)
+
+
+def _functional_checks(client: httpx.AsyncClient, image: str) -> dict[str, Callable[[], Awaitable[tuple[bool, str]]]]:
+    """The requests the frontend sends, as (passed, detail) checks."""
+
+    async def index() -> tuple[bool, str]:
+        response = await client.get("/")
+        return response.status_code == HTTPStatus.OK, f"status {response.status_code}"
+
+    async def list_images() -> tuple[bool, str]:
+        response = await client.get("/images")
+        return response.status_code == HTTPStatus.OK and image in response.json().get("images", []), response.text[:100]
+
+    async def get_image() -> tuple[bool, str]:
+        response = await client.get(f"/images/{image}")
+        passed = response.status_code == HTTPStatus.OK and response.content == SAMPLE_PNG
+        return passed, f"status {response.status_code}"
+
+    async def upload_image() -> tuple[bool, str]:
+        data = {"base64_image": "data:image/png;base64," + base64.b64encode(SAMPLE_PNG).decode(), "caption": "ok"}
+        response = await client.post("/images", data=data)
+        return response.status_code == HTTPStatus.CREATED, f"status {response.status_code}"
+
+    async def comments() -> tuple[bool, str]:
+        # Quotes are what a naive fix breaks, they have to round-trip
+        text = f"It's a nice \"picture\" {uuid.uuid4().hex[:8]}"
+        posted = await client.post(f"/comments/{image}", json={"comment_text": text})
+        if posted.status_code != HTTPStatus.CREATED:
+            return False, f"POST status {posted.status_code}: {posted.text[:100]}"
+        response = await client.get(f"/comments/{image}")
+        stored = [comment.get("comment_text") for comment in response.json().get("comments", [])]
+        return text in stored, f"{len(stored)} comments"
+
+    return {
+        "GET /": index,
+        "GET /images": list_images,
+        "GET /images/{image}": get_image,
+        "POST /images": upload_image,
+        "POST and GET /comments/{image}": comments,
+    }
+
+
+async def _verify_app(app: object) -> list[CheckResult]:
+    image = "ohacker-sample.png"
+    Path(UPLOAD_FOLDER, image).write_bytes(SAMPLE_PNG)
+    transport = httpx.ASGITransport(app=app)  # type: ignore[arg-type]
+
+    async def security_checks() -> list[CheckResult]:
+        started = time.perf_counter()
+        findings = await FastScanner("http://testserver/", transport=transport).scan()
+        return [
+            CheckResult(
+                f"{finding.vuln_class} closed",
+                finding.status is not ScanStatus.CONFIRMED,
+                f"{finding.status.value}, {finding.requests} requests" + "".join(f"; {e}" for e in finding.evidence),
+                time.perf_counter() - started,
+            )
+            for finding in findings.values()
+        ]
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        functional = [_timed(name, check) for name, check in _functional_checks(client, image).items()]
+        *functional_results, security_results = await asyncio.gather(*functional, security_checks())
+    return [*functional_results, *security_results]
+
+
+def verify_files(
+    source_root: str, files: dict[str, str], entry: str = "main.py", candidate: str = "patch"
+) -> VerificationResult:
+    """Verifies one candidate in the current process, it changes the working directory while it runs.
+
+    Args:
+        source_root: Directory of the app, its *.py files are copied into the sandbox.
+        files: Patched files by path relative to `source_root`, they replace the originals in the sandbox.
+        entry: Module with the FastAPI `app` and the `init_db` coroutine.
+        candidate: Name of the candidate in the result.
+    """
+    result = VerificationResult(candidate)
+    started = time.perf_counter()
+    previous_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="ohacker-verify-") as sandbox:
+        try:
+            for path in Path(source_root).glob("*.py"):
+                shutil.copy(path, sandbox)
+            for relative, code in files.items():
+                target = Path(sandbox, relative)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                target.write_text(code)
+            os.chdir(sandbox)
+            os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+            sys.path.insert(0, sandbox)
+            module_name = f"ohacker_verify_{uuid.uuid4().hex}"
+            spec = importlib.util.spec_from_file_location(module_name, Path(sandbox, entry))
+            module = importlib.util.module_from_spec(spec)  # type: ignore[arg-type]
+            spec.loader.exec_module(module)  # type: ignore[union-attr]
+
+            async def run() -> list[CheckResult]:
+                # The ASGI transport does not send lifespan events, so the startup and shutdown work is done here
+                if hasattr(module, "init_db"):
+                    await module.init_db()
+                try:
+                    return await asyncio.wait_for(_verify_app(module.app), VERIFY_TIMEOUT)
+                finally:
+                    for handler in getattr(module.app.router, "on_shutdown", []):
+                        await handler()
+
+            result.checks = asyncio.run(run())
+        except Exception as e:
+            result.error = repr(e)
+        finally:
+            os.chdir(previous_cwd)
+            if sandbox in sys.path:
+                sys.path.remove(sandbox)
+            # Modules the app imported from the sandbox, e.g. its database layer, must not leak into the next candidate
+            for name, loaded in list(sys.modules.items()):
+                if str(getattr(loaded, "__file__", None) or "").startswith(sandbox):
+                    del sys.modules[name]
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+async def verify_candidates(
+    candidates: dict[str, dict[str, str]],
+    source_root: str | Path,
+    entry: str = "main.py",
+    max_workers: int | None = None,
+) -> dict[str, VerificationResult]:
+    """Verifies several patch candidates in parallel worker processes.
+
+    Args:
+        candidates: Patched files (by relative path) of every candidate, by candidate name.
+        source_root: Directory of the unpatched app.
+        entry: Module with the FastAPI `app`.
+        max_workers: Worker processes, one per candidate up to the CPU count by default.
+    """
+    if not candidates:
+        return {}
+    workers = max_workers or min(len(candidates), os.cpu_count() or 1)
+    # Spawned workers start clean: no event loop, threads or imported app inherited from this process
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(
+            *(
+                loop.run_in_executor(executor, verify_files, str(source_root), files, entry, name)
+                for name, files in candidates.items()
+            )
+        )
+    for result in results:
+        (logger.info if result.passed else logger.warning)("Patch verification {}", result.summary())
+    return dict(zip(candidates, results, strict=True))
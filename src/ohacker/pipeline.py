@@ -0,0 +1,105 @@
+import asyncio
+from pathlib import Path
+
+from loguru import logger
+
+from src.ohacker.cyber_research_agents.cache import ResponseCache
+from src.ohacker.cyber_research_agents.manager import (
+    RESEARCH_CACHE_PATH,
+    RESEARCH_CACHE_TTL,
+    USE_RESEARCH_CACHE,
+    ResearchManager,
+)
+from src.ohacker.cyber_research_agents.writer_agent import ReportData
+from src.ohacker.findings import AgentRunResult
+from src.ohacker.security_patches_agent import (
+    BACKEND_CODE_PATH,
+    RepositoryPatch,
+    run_patch_agent,
+    verify_patch,
+    write_patch,
+)
+
+
+class FindingPipeline:
+    """Starts research and patching for every confirmed finding as soon as its agent reports it.
+
+    Research runs concurrently per finding, each into its own report file. Patches are chained: every finding is
+    fixed on top of the code patched for the previous ones, behind a lock, so the last patch contains all fixes.
+    `finish` waits for everything and merges the reports and patch descriptions.
+    """
+
+    def __init__(self, report_path: str | Path = "report.md"):
+        self.report_path = Path(report_path)
+        self.cache = ResponseCache(RESEARCH_CACHE_PATH, ttl=RESEARCH_CACHE_TTL, enabled=USE_RESEARCH_CACHE)
+        self._reports: dict[str, asyncio.Task[ReportData]] = {}
+        self._patches: dict[str, asyncio.Task[RepositoryPatch]] = {}
+        self._patch_lock = asyncio.Lock()
+        self._patched_files: dict[str, str] = {}
+
+    @staticmethod
+    def query(name: str, message: str | None) -> str:
+        """Research and patch input for one finding, in the format of the summary of all agent results."""
+        return f"The summary of the penetration testing agents results:\n0. {name}:\n{message}\n\n"
+
+    def submit(self, name: str, result: AgentRunResult) -> None:
+        """Hands over a finished agent run, only confirmed findings start any work."""
+        if not result.confirmed or name in self._reports:
+            return
+        logger.info("Finding of {} confirmed, starting research and patching", name)
+        query = self.query(name, result.message)
+        stem = name.lower().replace(" ", "_")
+        report_path = self.report_path.with_stem(f"{self.report_path.stem}_{stem}")
+        # Reports of several findings are written at the same time, so they go to their files and the log only
+        manager = ResearchManager(self.cache, report_path=report_path, console=False)
+        with logger.contextualize(agent=name):
+            self._reports[name] = asyncio.create_task(manager.run(query))
+            self._patches[name] = asyncio.create_task(self._patch(query))
+
+    async def _patch(self, description: str) -> RepositoryPatch:
+        async with self._patch_lock:
+            patch = await run_patch_agent(description, files=dict(self._patched_files), write_files=False)
+            self._patched_files |= patch.files
+            return patch
+
+    async def finish(self, query: str) -> tuple[ReportData | None, RepositoryPatch | None]:
+        """Waits for the started work and merges it.
+
+        Args:
+            query: Summary of all agent results. When nothing was confirmed it goes through research and patching
+                as one, like before pipelining.
+        """
+        if not self._reports:
+            manager = ResearchManager(self.cache, report_path=self.report_path)
+            report, patch = await asyncio.gather(manager.run(query), run_patch_agent(query))
+            return report, patch
+
+        names = list(self._reports)
+        reports = await asyncio.gather(*(self._reports[name] for name in names), return_exceptions=True)
+        patches = await asyncio.gather(*(self._patches[name] for name in names), return_exceptions=True)
+        for name, outcome in [*zip(names, reports, strict=True), *zip(names, patches, strict=True)]:
+            if isinstance(outcome, BaseException):
+                logger.opt(exception=outcome).error("Research or patching for {} failed", name)
+
+        done_reports = [(name, r) for name, r in zip(names, reports, strict=True) if isinstance(r, ReportData)]
+        report = None
+        if done_reports:
+            report = ReportData(
+                short_summary="\n\n".join(r.short_summary for _, r in done_reports),
+                markdown_report="\n\n---\n\n".join(r.markdown_report for _, r in done_reports),
+            )
+            await asyncio.to_thread(self.report_path.write_text, report.markdown_report)
+
+        done_patches = [(name, p) for name, p in zip(names, patches, strict=True) if isinstance(p, RepositoryPatch)]
+        patch = None
+        if done_patches:
+            # Every patch in the chain was made on top of the earlier ones, the latest version of each file has them all
+            patch = RepositoryPatch(
+                root=BACKEND_CODE_PATH.parent,
+                description="\n\n".join(f"## {name}\n\n{p.description}" for name, p in done_patches),
+                files=dict(self._patched_files),
+            )
+            await verify_patch(patch)
+            await asyncio.to_thread(write_patch, patch)
+        logger.info("Merged {} reports and {} patches into {}", len(done_reports), len(done_patches), self.report_path)
+        return report, patch
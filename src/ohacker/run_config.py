@@ -0,0 +1,50 @@
+import os
+
+from agents import ModelProvider, OpenAIProvider, RunConfig
+
+# "openai" (default) calls the live models. "scripted" answers every agent offline with the scripts of
+# mock_models.py, "record" calls the live models and records their responses, "replay" serves a recording.
+MODEL_PROVIDER = os.getenv("OHACKER_MODEL_PROVIDER", "openai")
+
+# JSONL file the "record" provider writes and the "replay" provider reads
+RECORDING_PATH = os.getenv("OHACKER_MODEL_RECORDING", ".ohacker_cache/model_recording.jsonl")
+
+# The provider of every run under "current", created on first use or set with `set_model_provider`
+_provider: dict[str, ModelProvider] = {}
+
+
+def set_model_provider(provider: ModelProvider | None) -> None:
+    """Overrides the provider of every run, e.g. with a `ScriptedProvider` in benchmarks. None restores the default."""
+    if provider is None:
+        _provider.pop("current", None)
+    else:
+        _provider["current"] = provider
+
+
+def get_model_provider() -> ModelProvider:
+    """The provider set with `set_model_provider`, else the one OHACKER_MODEL_PROVIDER selects."""
+    if "current" not in _provider:
+        from src.ohacker.mock_models import RecordingProvider, ReplayProvider, ScriptedProvider
+
+        providers = {
+            "openai": OpenAIProvider,
+            "scripted": ScriptedProvider,
+            "record": lambda: RecordingProvider(OpenAIProvider(), RECORDING_PATH),
+            "replay": lambda: ReplayProvider(RECORDING_PATH),
+        }
+        if MODEL_PROVIDER not in providers:
+            raise ValueError(f"Unknown OHACKER_MODEL_PROVIDER {MODEL_PROVIDER!r}, expected one of {sorted(providers)}.")
+        _provider["current"] = providers[MODEL_PROVIDER]()
+    return _provider["current"]
+
+
+def run_config(provider: ModelProvider | None = None) -> RunConfig:
+    """The run config of every `Runner` call, so the model provider can be swapped in one place.
+
+    Traces are not exported for offline providers, offline runs must not need the network.
+
+    Args:
+        provider: Provider of this run, e.g. one wrapping `get_model_provider()`. The configured one by default.
+    """
+    provider = provider or get_model_provider()
+    return RunConfig(model_provider=provider, tracing_disabled=getattr(provider, "offline", False))
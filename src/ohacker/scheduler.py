@@ -0,0 +1,46 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Mapping
+from dataclasses import dataclass, field
+from typing import TypeVar
+
+from loguru import logger
+
+T = TypeVar("T")
+
+
+@dataclass
+class AgentOutput:
+    """Ordered event stream of a single agent.
+
+    Every agent running under the scheduler gets its own instance. Events are kept in order and logged with the
+    agent name as a context field, so they can be told apart when several agents log at the same time.
+    """
+
+    name: str
+    events: list[str] = field(default_factory=list)
+
+    def emit(self, message: str, level: str = "INFO") -> None:
+        """Records the message and logs it on behalf of the agent."""
+        self.events.append(message)
+        logger.bind(agent=self.name).log(level, message)
+
+
+async def run_concurrently(
+    jobs: Mapping[str, Callable[[], Awaitable[T]]],
+    max_concurrency: int,
+) -> dict[str, T | BaseException]:
+    """Runs the jobs concurrently, with at most `max_concurrency` of them in flight.
+
+    Results are returned in the order of `jobs`. A failing job does not cancel the others, its exception is
+    returned in place of the result instead.
+    """
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1.")
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _run(job: Callable[[], Awaitable[T]]) -> T:
+        async with semaphore:
+            return await job()
+
+    results = await asyncio.gather(*(_run(job) for job in jobs.values()), return_exceptions=True)
+    return dict(zip(jobs, results, strict=True))
@@ -0,0 +1,84 @@
+import asyncio
+import base64
+import re
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from loguru import logger
+
+
+def new_run_id(label: str = "") -> str:
+    """A sortable, unique directory name for one run, e.g. `20250426-101500-lfi-agent-1a2b3c`."""
+    slug = re.sub(r"[^a-z0-9]+", "-", label.lower()).strip("-")
+    parts = [datetime.now().strftime("%Y%m%d-%H%M%S"), slug, uuid.uuid4().hex[:6]]
+    return "-".join(part for part in parts if part)
+
+
+class ScreenshotDumper:
+    """Writes debug screenshots to `<root>/<run_id>/<step>.png` without blocking the event loop.
+
+    `submit` only puts the bytes on a bounded queue, a background task writes them in a worker thread. When the
+    disk cannot keep up and the queue is full, frames are dropped instead of slowing down the agent. Failures of
+    the dump are logged, they never reach the agent or its cleanup.
+    """
+
+    def __init__(self, root: str | Path, run_id: str | None = None, max_pending: int = 32):
+        self.directory = Path(root) / (run_id or new_run_id())
+        self.dropped = 0
+        self._queue: asyncio.Queue[tuple[Path, bytes | str] | None] = asyncio.Queue(max_pending)
+        self._step = 0
+        self._task: asyncio.Task[None] | None = None
+
+    def submit(self, data: bytes | str, extension: str = "png") -> None:
+        """Queues one frame as the next step of the run. Base64 strings are decoded in the writer thread."""
+        self._step += 1
+        if self._task is None:
+            self._task = asyncio.create_task(self._write_loop())
+        if self._task.done():  # The dump directory could not be created
+            self.dropped += 1
+            return
+        try:
+            self._queue.put_nowait((self.directory / f"{self._step:04d}.{extension}", data))
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def close(self, timeout: float = 30.0) -> None:
+        """Waits until all queued frames are written, for at most `timeout` seconds. Never raises."""
+        task, self._task = self._task, None
+        if task is None:
+            return
+        try:
+            await asyncio.wait_for(self._finish(task), timeout)
+        except TimeoutError:
+            task.cancel()
+            self.dropped += self._queue.qsize()
+            logger.warning("Screenshot dump did not finish within {}s, the remaining frames are dropped.", timeout)
+        except Exception as e:
+            logger.warning("Screenshot dump failed: {}", e)
+        if self.dropped:
+            logger.warning("Screenshot dump dropped {} frames.", self.dropped)
+
+    async def _finish(self, task: asyncio.Task[None]) -> None:
+        # A writer that stopped early takes no end marker, with a full queue the put would wait forever
+        if not task.done():
+            await self._queue.put(None)
+        await task
+
+    async def _write_loop(self) -> None:
+        try:
+            await asyncio.to_thread(self.directory.mkdir, parents=True, exist_ok=True)
+        except Exception as e:
+            logger.warning("Screenshot dump disabled, {} cannot be created: {}", self.directory, e)
+            self.dropped += self._queue.qsize()
+            return
+        while (item := await self._queue.get()) is not None:
+            path, data = item
+            try:
+                await asyncio.to_thread(_write_frame, path, data)
+            except Exception as e:
+                logger.warning("Error writing screenshot {}: {}", path, e)
+
+
+def _write_frame(path: Path, data: bytes | str) -> None:
+    path.write_bytes(base64.b64decode(data) if isinstance(data, str) else data)
@@ -0,0 +1,149 @@
+import base64
+import time
+from dataclasses import dataclass
+from typing import Any, Literal
+
+from playwright.async_api import CDPSession, Page
+
+from src.ohacker.metrics import METRICS
+
+ImageFormat = Literal["png", "jpeg", "webp"]
+
+
+@dataclass(frozen=True)
+class ScreenshotEncoding:
+    """How screenshots are encoded before they are sent to the model."""
+
+    format: ImageFormat = "png"
+
+    quality: int | None = None
+    """Compression quality 0-100, only used by jpeg and webp."""
+
+    target_width: int | None = None
+    """Downscale frames to this width, keeping the aspect ratio. Frames are never upscaled."""
+
+    optimize_for_speed: bool = False
+    """Ask Chromium for the fastest encoder settings instead of the smallest output."""
+
+    def scale_for(self, viewport: tuple[int, int]) -> float:
+        """Factor from page space to frame space for the viewport, at most 1."""
+        if self.target_width is None:
+            return 1.0
+        return min(1.0, self.target_width / viewport[0])
+
+
+# The original behaviour: lossless full resolution PNG.
+LOSSLESS_ENCODING = ScreenshotEncoding()
+
+
+@dataclass
+class ScreenshotStats:
+    """Size and encode time of the screenshots taken by one computer."""
+
+    count: int = 0
+    total_bytes: int = 0
+    total_encode_seconds: float = 0.0
+    last_bytes: int = 0
+    last_encode_seconds: float = 0.0
+
+    def record(self, size: int, seconds: float) -> None:
+        """Adds one screenshot of `size` bytes."""
+        self.count += 1
+        self.total_bytes += size
+        self.total_encode_seconds += seconds
+        self.last_bytes = size
+        self.last_encode_seconds = seconds
+
+    @property
+    def mean_bytes(self) -> float:
+        """Average size of a screenshot."""
+        return self.total_bytes / self.count if self.count else 0.0
+
+    @property
+    def mean_encode_ms(self) -> float:
+        """Average capture and encode time of a screenshot in milliseconds."""
+        return self.total_encode_seconds * 1000 / self.count if self.count else 0.0
+
+    def summary(self) -> str:
+        """Count, average size and encode time, for the end-of-run log."""
+        return (
+            f"{self.count} screenshots, {self.mean_bytes / 1024:.1f} KiB and "
+            f"{self.mean_encode_ms:.1f} ms per screenshot on average"
+        )
+
+
+class ScreenshotEncoder:
+    """Captures the viewport in the configured format and resolution and returns it base64 encoded.
+
+    Lossless full resolution frames go through `page.screenshot`. Everything else is captured with the Chromium
+    DevTools `Page.captureScreenshot` command, which compresses and downscales inside the browser and already
+    returns base64, so the bytes never have to be decoded or re-encoded in Python.
+
+    When frames are downscaled, the model sees the smaller `dimensions` and all coordinates it sends back have to
+    be mapped to page space with `to_page`.
+
+    Note: the agents SDK labels every frame as `image/png` in the data URL it sends to the model, the
+    `CompactingProvider` of context_compaction.py relabels jpeg and webp frames with their real type.
+    """
+
+    def __init__(self, encoding: ScreenshotEncoding, viewport: tuple[int, int]):
+        self.encoding = encoding
+        self.viewport = viewport
+        self.scale = encoding.scale_for(viewport)
+        self.stats = ScreenshotStats()
+        self._cdp_page: Page | None = None
+        self._cdp: CDPSession | None = None
+
+    @property
+    def dimensions(self) -> tuple[int, int]:
+        """Size of the encoded frames, this is the screen size the model works with."""
+        width, height = self.viewport
+        return round(width * self.scale), round(height * self.scale)
+
+    @property
+    def uses_devtools(self) -> bool:
+        """Whether frames are captured with `Page.captureScreenshot` instead of `page.screenshot`."""
+        return self.encoding.format != "png" or self.scale != 1.0
+
+    def to_page(self, x: float, y: float) -> tuple[int, int]:
+        """Maps a point from screenshot space to page space."""
+        return round(x / self.scale), round(y / self.scale)
+
+    async def encode(self, page: Page) -> str:
+        """A screenshot of the viewport, base64 encoded in the configured format."""
+        started = time.perf_counter()
+        if self.uses_devtools:
+            b64_string = await self._capture_devtools(
+                page, self.encoding.format, scale=self.scale, quality=self.encoding.quality
+            )
+        else:
+            png_bytes = await page.screenshot(full_page=False)
+            b64_string = base64.b64encode(png_bytes).decode("utf-8")
+        seconds = time.perf_counter() - started
+        self.stats.record(len(b64_string) * 3 // 4 - b64_string.count("=", -2), seconds)
+        METRICS.observe("screenshot_encode_seconds", seconds, format=self.encoding.format)
+        return b64_string
+
+    async def capture_thumbnail(self, page: Page, width: int) -> bytes:
+        """A small lossless PNG of the viewport, cheap enough to take before a frame for change detection."""
+        data = await self._capture_devtools(page, "png", scale=min(1.0, width / self.viewport[0]))
+        return base64.b64decode(data)
+
+    async def _capture_devtools(
+        self, page: Page, image_format: ImageFormat, scale: float = 1.0, quality: int | None = None
+    ) -> str:
+        if self._cdp is None or self._cdp_page is not page:
+            self._cdp = await page.context.new_cdp_session(page)
+            self._cdp_page = page
+        params: dict[str, Any] = {"format": image_format}
+        if image_format != "png" and quality is not None:
+            params["quality"] = quality
+        if self.encoding.optimize_for_speed:
+            params["optimizeForSpeed"] = True
+        if scale != 1.0:
+            # The clip is in document coordinates, so it has to follow the scroll position.
+            left, top = await page.evaluate("[window.visualViewport.pageLeft, window.visualViewport.pageTop]")
+            width, height = self.viewport
+            params["clip"] = {"x": left, "y": top, "width": width, "height": height, "scale": scale}
+        result = await self._cdp.send("Page.captureScreenshot", params)
+        return result["data"]
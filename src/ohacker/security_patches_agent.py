@@ -1,8 +1,18 @@
+import asyncio
+import os
+from dataclasses import dataclass
 from pathlib import Path
 
 from agents import Agent, Runner
+from loguru import logger
 from pydantic import BaseModel
 
+from src.ohacker.metrics import METRICS
+from src.ohacker.patch_engine import PatchApplyError, PatchEngine
+from src.ohacker.patch_verification import VerificationResult, dependencies_available, verify_candidates
+from src.ohacker.run_config import run_config
+from src.ohacker.symbol_index import PATCH_OUTPUT_NAME, PATCH_OUTPUT_SUFFIX, SymbolIndex
+
 PROMPT = (
     "You are a senior cybersecurity expert tasked with fixing Python code that has security vulnerabilities."
     "You are given with a short description of the vulnerability and the code that needs to be fixed.\n"
@@ -25,16 +35,152 @@ patch_agent = Agent(
 )
 
 
-async def run_patch_agent(description: str) -> SecurityPatch:
-    code_path = Path(__file__).parent.parent.parent / "backend" / "main.py"
-    code = code_path.read_text()
-    result = await Runner.run(
-        patch_agent,
-        input=f"Short summary of the findings: \n\n{description}\nCode:\n{code}\n"
-    )
-    r = result.final_output_as(SecurityPatch)
-    (code_path.parent / "patch_description.md").write_text(r.description)
-    (code_path.parent / "fixed.py").write_text(r.python_code)
+BACKEND_CODE_PATH = Path(__file__).parent.parent.parent / "backend" / "main.py"
+
+# "diff" sends only the vulnerable functions and applies the returned diffs, "full" rewrites the whole file
+PATCH_MODE = os.getenv("OHACKER_PATCH_MODE", "diff")
+
+# Replay the exploits and the normal requests against the patched app, see patch_verification.py
+VERIFY_PATCHES = os.getenv("OHACKER_VERIFY_PATCHES", "1") != "0"
+
+
+@dataclass
+class RepositoryPatch:
+    """Fixes for a repository: patched sources of the changed files, by path relative to `root`."""
+
+    root: Path
+    description: str
+    files: dict[str, str]
+    verification: VerificationResult | None = None
+
+    @property
+    def python_code(self) -> str | None:
+        """Patched code of the backend entry point, the file the original single-file patch was about."""
+        return self.files.get(BACKEND_CODE_PATH.name) if self.root == BACKEND_CODE_PATH.parent else None
+
+
+async def run_patch_agent(
+    description: str,
+    files: dict[str, str] | None = None,
+    write_files: bool = True,
+    mode: str = PATCH_MODE,
+    repo_root: Path = BACKEND_CODE_PATH.parent,
+) -> RepositoryPatch:
+    """Asks the patch agents to fix the described findings.
+
+    Args:
+        description: Summary of the findings to fix.
+        files: Code to patch instead of what is on disk, by relative path. Pass the files of the previous patch to
+            stack fixes on top of it.
+        write_files: Write the fixed files and the patch description, see `write_patch`.
+        mode: "diff" to patch only the vulnerable functions of the repository, see patch_engine.py, or "full" to
+            rewrite the backend entry point. Diff mode falls back to a full rewrite when it cannot patch anything.
+        repo_root: Repository to patch, the backend by default.
+    """
+    with METRICS.time("patch_seconds", mode=mode):
+        r = await _generate_patch(description, files or {}, mode, repo_root)
+    if write_files:
+        await verify_patch(r)
+        write_patch(r)
     print(r.description)
-    print(r.python_code)
     return r
+
+
+async def _generate_patch(description: str, files: dict[str, str], mode: str, repo_root: Path) -> RepositoryPatch:
+    r = None
+    if mode == "diff":
+        try:
+            r = await patch_repository(description, repo_root, files)
+        except (PatchApplyError, SyntaxError) as e:
+            logger.warning("Targeted patching failed, rewriting the whole file: {}", e)
+    if r is None or not r.files:
+        r = await _rewrite_entry_point(description, files.get(BACKEND_CODE_PATH.name))
+    return r
+
+
+async def verify_patch(patch: RepositoryPatch) -> VerificationResult | None:
+    """Verifies the patch and adds the verdict to its description, None when verification is off or impossible."""
+    if not VERIFY_PATCHES or not patch.files:
+        return None
+    if not dependencies_available():
+        logger.warning("Patch not verified, the backend dependencies are missing: uv sync --extra verify")
+        return None
+    with METRICS.time("patch_verification_seconds"):
+        results = await verify_candidates({"patch": patch.files}, patch.root)
+    patch.verification = results["patch"]
+    patch.description += f"\n\n## Verification\n\n```\n{patch.verification.summary()}\n```\n"
+    return patch.verification
+
+
+async def _rewrite_entry_point(description: str, code: str | None) -> RepositoryPatch:
+    code = BACKEND_CODE_PATH.read_text() if code is None else code
+    with METRICS.time("runner_seconds", agent=patch_agent.name, cache="off"):
+        result = await Runner.run(
+            patch_agent,
+            input=f"Short summary of the findings: \n\n{description}\nCode:\n{code}\n",
+            run_config=run_config(),
+        )
+    r = result.final_output_as(SecurityPatch)
+    print(r.python_code)
+    return RepositoryPatch(BACKEND_CODE_PATH.parent, r.description, {BACKEND_CODE_PATH.name: r.python_code})
+
+
+async def patch_repository(
+    description: str,
+    repo_root: Path,
+    files: dict[str, str] | None = None,
+    index: SymbolIndex | None = None,
+) -> RepositoryPatch:
+    """Locates the findings with the symbol index and patches all candidate files concurrently.
+
+    Args:
+        description: Summary of the findings to fix.
+        repo_root: Repository to patch.
+        files: Code to patch instead of what is on disk, by relative path.
+        index: Symbol index of `repo_root`, loaded from its cache and updated when not given.
+    """
+    files = files or {}
+    if index is None:
+        index = SymbolIndex(repo_root)
+        await asyncio.to_thread(index.update)
+    locations = index.locate(description)
+    logger.info("Findings located in {} files: {}", len(locations), ", ".join(locations))
+
+    engine = PatchEngine()
+
+    async def patch_file(relative: str, names: set[str]) -> tuple[str, list]:
+        source = files.get(relative)
+        if source is None:
+            source = await asyncio.to_thread((repo_root / relative).read_text)
+        return await engine.patch_source(relative, source, description, names)
+
+    outcomes = await asyncio.gather(
+        *(patch_file(relative, {symbol.name for symbol in symbols}) for relative, symbols in locations.items()),
+        return_exceptions=True,
+    )
+    patched_files: dict[str, str] = {}
+    descriptions = []
+    for relative, outcome in zip(locations, outcomes, strict=True):
+        if isinstance(outcome, BaseException):
+            logger.error("Patching {} failed: {!r}", relative, outcome)
+            continue
+        patched, applied = outcome
+        if applied:
+            patched_files[relative] = patched
+            descriptions += [f"### `{region.name}` ({relative})\n\n{patch.description}" for region, patch in applied]
+    return RepositoryPatch(repo_root, "\n\n".join(descriptions), patched_files)
+
+
+def fixed_path(root: Path, relative: str) -> Path:
+    """Where the fix of a file is written: fixed.py for the backend entry point, like before, and
+    <name>.fixed.py next to any other file.
+    """
+    if root == BACKEND_CODE_PATH.parent and relative == BACKEND_CODE_PATH.name:
+        return root / PATCH_OUTPUT_NAME
+    return (root / relative).with_suffix(PATCH_OUTPUT_SUFFIX)
+
+
+def write_patch(patch: RepositoryPatch) -> None:
+    (patch.root / "patch_description.md").write_text(patch.description)
+    for relative, code in patch.files.items():
+        fixed_path(patch.root, relative).write_text(code)
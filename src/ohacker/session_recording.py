@@ -0,0 +1,391 @@
+"""Record-and-replay of pentest agent sessions.
+
+A recording is one JSONL file per run: the computer actions and browser tool calls of the agent, their outputs,
+the page URL after every step and the final verdict. Screenshots are stored once as content-addressed blobs
+(`blobs/<sha256>.<ext>`) shared by all sessions under the same root, the JSONL only references them.
+
+Replaying re-executes the recorded steps directly against `LocalPlaywrightComputer`, without any model call, and
+reports every step whose URL or text output differs from the recording. The header keeps the screenshot encoding
+and the launch profile of the run: coordinates are in the space of the (possibly downscaled) frames, and the page
+only lays out the same with the same viewport and blocked resources. A known finding is re-checked in seconds:
+
+    uv run hack-replay .ohacker_cache/recordings/sessions/20250426-101500-lfi-agent-1a2b3c.jsonl
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import time
+from collections.abc import Mapping
+from dataclasses import asdict, dataclass, field, replace
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from agents import FunctionTool, RunContextWrapper
+from loguru import logger
+from pydantic import BaseModel
+
+from src.ohacker.browser_pool import BrowserPool
+from src.ohacker.browser_tools import build_browser_tools
+from src.ohacker.computer_use import LocalPlaywrightComputer
+from src.ohacker.findings import AgentRunResult
+from src.ohacker.launch_profiles import FAST_PROFILE, HEADFUL_PROFILE, PROFILES, LaunchProfile
+from src.ohacker.screenshot_encoding import LOSSLESS_ENCODING, ScreenshotEncoding
+
+SESSION_VERSION = 2
+
+# Version 1 sessions have no encoding and profile in the header, they replay lossless in the fast profile
+_READABLE_VERSIONS = (1, SESSION_VERSION)
+
+# Leading bytes of the image formats the screenshot encoder produces, the data URLs of the SDK always say png
+_IMAGE_MAGIC = ((b"\x89PNG", "png"), (b"\xff\xd8\xff", "jpg"), (b"RIFF", "webp"))
+
+# Tools whose output describes the page rather than the action, compared with the recording on replay
+_COMPARED_TOOLS = frozenset({"get_current_url", "list_images", "list_links", "read_page_text"})
+
+
+def _json(item: BaseModel | Mapping[str, Any]) -> dict[str, Any]:
+    """Plain JSON of SDK items, which are pydantic models or typed dicts."""
+    return item.model_dump(mode="json", exclude_none=True) if isinstance(item, BaseModel) else dict(item)
+
+
+class BlobStore:
+    """Content-addressed files: the same screenshot is written once, whichever session or step it belongs to."""
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+
+    def put(self, data: bytes, extension: str) -> str:
+        """Stores the data unless it is there already, returns its blob name."""
+        name = f"{hashlib.sha256(data).hexdigest()}.{extension}"
+        path = self.root / name
+        if not path.exists():
+            self.root.mkdir(parents=True, exist_ok=True)
+            temporary = path.with_suffix(f".{extension}.tmp")
+            temporary.write_bytes(data)
+            temporary.replace(path)
+        return name
+
+    def path(self, name: str) -> Path:
+        """File of a blob name returned by `put`."""
+        return self.root / name
+
+
+def _decode_data_url(url: str) -> tuple[bytes, str] | None:
+    """Bytes and file extension of a base64 `data:image/...` URL, the extension by the bytes themselves."""
+    header, _, payload = url.partition(",")
+    if not header.startswith("data:image/") or not header.endswith(";base64"):
+        return None
+    data = base64.b64decode(payload)
+    extension = next((extension for magic, extension in _IMAGE_MAGIC if data.startswith(magic)), None)
+    if extension is None:
+        extension = header.removeprefix("data:image/").removesuffix(";base64")
+    return data, "jpg" if extension == "jpeg" else extension
+
+
+def _profile_record(profile: LaunchProfile) -> dict[str, Any]:
+    """The parts of a launch profile that decide the layout of the page."""
+    return {
+        "name": profile.name,
+        "viewport": list(profile.viewport),
+        "blocked_resource_types": sorted(profile.blocked_resource_types),
+        "blocked_url_patterns": list(profile.blocked_url_patterns),
+    }
+
+
+def _recorded_profile(record: dict[str, Any]) -> LaunchProfile:
+    return replace(
+        PROFILES.get(record["name"], FAST_PROFILE),
+        viewport=tuple(record["viewport"]),
+        blocked_resource_types=frozenset(record["blocked_resource_types"]),
+        blocked_url_patterns=tuple(record["blocked_url_patterns"]),
+    )
+
+
+class SessionRecorder:
+    """Appends the steps of one agent run to `<root>/sessions/<run_id>.jsonl`.
+
+    Args:
+        root: Directory of the recordings, screenshots go to `<root>/blobs`.
+        run_id: Name of the session file.
+        agent_name: Agent of the run.
+        target_url: Page the run started on, where a replay starts too.
+        encoding: Screenshot encoding of the run's computer, the space of the recorded coordinates.
+        profile: Launch profile of the run's computer.
+    """
+
+    def __init__(
+        self,
+        root: str | Path,
+        run_id: str,
+        agent_name: str,
+        target_url: str,
+        encoding: ScreenshotEncoding = LOSSLESS_ENCODING,
+        profile: LaunchProfile = HEADFUL_PROFILE,
+    ):
+        self.root = Path(root)
+        self.path = self.root / "sessions" / f"{run_id}.jsonl"
+        self.blobs = BlobStore(self.root / "blobs")
+        self.steps = 0
+        self._started = time.perf_counter()
+        self._header = {
+            "type": "session",
+            "version": SESSION_VERSION,
+            "agent": agent_name,
+            "target_url": target_url,
+            "encoding": asdict(encoding),
+            "profile": _profile_record(profile),
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        self._header_written = False
+
+    async def _append(self, record: dict[str, Any]) -> None:
+        record["t"] = round(time.perf_counter() - self._started, 3)
+        lines = [record]
+        if not self._header_written:
+            self._header_written = True
+            lines.insert(0, self._header)
+        await asyncio.to_thread(self._write, "".join(json.dumps(line) + "\n" for line in lines))
+
+    def _write(self, text: str) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a") as f:
+            f.write(text)
+
+    async def tool_call(self, raw_item: BaseModel | Mapping[str, Any]) -> None:
+        """Records a computer action or a function tool call of the model."""
+        raw = _json(raw_item)
+        self.steps += 1
+        if raw.get("type") == "computer_call":
+            await self._append({"type": "computer_call", "call_id": raw["call_id"], "action": raw["action"]})
+        else:
+            await self._append(
+                {"type": "function_call", "call_id": raw["call_id"], "name": raw["name"], "arguments": raw["arguments"]}
+            )
+
+    async def tool_output(self, raw_item: BaseModel | Mapping[str, Any], url: str) -> None:
+        """Records a tool output and the page URL after the call. Screenshots are replaced by a blob reference."""
+        raw = _json(raw_item)
+        record: dict[str, Any] = {"type": "output", "call_id": raw.get("call_id"), "url": url}
+        output = raw.get("output")
+        if isinstance(output, dict) and (decoded := _decode_data_url(output.get("image_url", ""))) is not None:
+            record["screenshot"] = await asyncio.to_thread(self.blobs.put, *decoded)
+        else:
+            record["output"] = output if isinstance(output, str) else json.dumps(output)
+        await self._append(record)
+
+    async def page_step(self, op: str, **arguments: object) -> None:
+        """Records a step the harness took on the page itself, outside of the agent's tool calls."""
+        self.steps += 1
+        await self._append({"type": "page", "op": op, **arguments})
+
+    async def message(self, text: str) -> None:
+        """Records a text message of the agent."""
+        await self._append({"type": "message", "text": text})
+
+    async def finish(self, result: AgentRunResult) -> None:
+        """Records the outcome of the run."""
+        await self._append(
+            {
+                "type": "result",
+                "confirmed": result.confirmed,
+                "turns": result.turns,
+                "message": result.message,
+                "error": result.error,
+            }
+        )
+        logger.info("Session recorded: {} ({} steps)", self.path, self.steps)
+
+
+@dataclass
+class Session:
+    """A loaded session recording."""
+
+    agent: str
+    target_url: str
+    steps: list[dict[str, Any]]
+    """Tool calls and page steps, each with its recorded output under "recorded" when there is one."""
+
+    encoding: ScreenshotEncoding = LOSSLESS_ENCODING
+    profile: LaunchProfile = FAST_PROFILE
+    confirmed: bool | None = None
+    message: str | None = None
+
+
+def load_session(path: str | Path) -> Session:
+    """Reads a recording written by `SessionRecorder`, raises ValueError for other files and unknown versions."""
+    records = [json.loads(line) for line in Path(path).read_text().splitlines() if line.strip()]
+    if not records or records[0].get("type") != "session":
+        raise ValueError(f"{path} is not a session recording.")
+    header = records[0]
+    if header.get("version") not in _READABLE_VERSIONS:
+        raise ValueError(f"{path} has session version {header.get('version')}, expected {SESSION_VERSION}.")
+    session = Session(header["agent"], header["target_url"], [])
+    if "encoding" in header:
+        session.encoding = ScreenshotEncoding(**header["encoding"])
+    if "profile" in header:
+        session.profile = _recorded_profile(header["profile"])
+    calls: dict[str, dict[str, Any]] = {}
+    for record in records[1:]:
+        kind = record["type"]
+        if kind in ("computer_call", "function_call", "page"):
+            session.steps.append(record)
+            if "call_id" in record:
+                calls[record["call_id"]] = record
+        elif kind == "output" and record.get("call_id") in calls:
+            calls[record["call_id"]]["recorded"] = record
+        elif kind == "message":
+            session.message = record["text"]
+        elif kind == "result":
+            session.confirmed = record["confirmed"]
+    return session
+
+
+@dataclass
+class ReplayResult:
+    """Outcome of replaying one session."""
+
+    session: str
+    steps: int = 0
+    divergences: list[str] = field(default_factory=list)
+    """Steps whose URL or page-describing output differs from the recording."""
+
+    final_url: str | None = None
+    seconds: float = 0.0
+
+    @property
+    def reproduced(self) -> bool:
+        """Whether every step matched the recording."""
+        return not self.divergences
+
+    def summary(self) -> str:
+        """The result and every divergence, one line each."""
+        verdict = "reproduced" if self.reproduced else f"diverged at {len(self.divergences)} steps"
+        lines = [f"{self.session}: {self.steps} steps replayed in {self.seconds:.2f}s, {verdict}"]
+        lines += [f"  {divergence}" for divergence in self.divergences]
+        return "\n".join(lines)
+
+
+async def _computer_action(computer: LocalPlaywrightComputer, action: dict[str, Any]) -> None:
+    """Performs a recorded computer-use action, mirroring how the Agents SDK dispatches them."""
+    kind = action["type"]
+    if kind == "click":
+        await computer.click(action["x"], action["y"], action.get("button", "left"))
+    elif kind == "double_click":
+        await computer.double_click(action["x"], action["y"])
+    elif kind == "scroll":
+        await computer.scroll(action["x"], action["y"], action["scroll_x"], action["scroll_y"])
+    elif kind == "type":
+        await computer.type(action["text"])
+    elif kind == "wait":
+        await computer.wait()
+    elif kind == "move":
+        await computer.move(action["x"], action["y"])
+    elif kind == "keypress":
+        await computer.keypress(action["keys"])
+    elif kind == "drag":
+        await computer.drag([(point["x"], point["y"]) for point in action["path"]])
+    elif kind != "screenshot":
+        raise ValueError(f"Unknown computer action {kind!r}.")
+
+
+async def _page_step(computer: LocalPlaywrightComputer, step: dict[str, Any]) -> None:
+    if step["op"] == "goto":
+        await computer.page.goto(step["url"], wait_until="domcontentloaded", timeout=60000)
+    elif step["op"] == "click_button":
+        await computer.page.get_by_role("button", name=step["name"], exact=True).first.click()
+    elif step["op"] == "reload":
+        await computer.page.reload(wait_until="domcontentloaded", timeout=15000)
+    else:
+        raise ValueError(f"Unknown page step {step['op']!r}.")
+    computer.mark_page_changed()
+    await computer.wait_until_quiet()
+
+
+async def replay_session(
+    path: str | Path,
+    target_url: str | None = None,
+    pool: BrowserPool | None = None,
+    profile: LaunchProfile | None = None,
+) -> ReplayResult:
+    """Re-executes a recorded session in a fresh browser, without the model.
+
+    Args:
+        path: Session JSONL written by `SessionRecorder`.
+        target_url: Start page, the recorded one by default. URLs are compared with the recorded ones as they are,
+            so a replay against another deployment reports every step as diverged.
+        pool: Borrow the browser context from this pool instead of launching a browser.
+        profile: Launch profile of the browser, by default the recorded one, run headless.
+    """
+    session = load_session(path)
+    result = ReplayResult(str(path))
+    started = time.perf_counter()
+    computer = LocalPlaywrightComputer(
+        target_url=target_url or session.target_url,
+        pool=pool,
+        profile=profile or replace(session.profile, headless=True),
+        encoding=session.encoding,
+    )
+    async with computer:
+        tools: dict[str, FunctionTool] = {tool.name: tool for tool in build_browser_tools(computer, dom_tools=True)}
+        context = RunContextWrapper(context=None)
+        for step in session.steps:
+            result.steps += 1
+            output = None
+            if step["type"] == "computer_call":
+                await _computer_action(computer, step["action"])
+            elif step["type"] == "function_call":
+                tool = tools.get(step["name"])
+                if tool is None:
+                    result.divergences.append(f"step {result.steps}: unknown tool {step['name']}")
+                    continue
+                output = str(await tool.on_invoke_tool(context, step["arguments"]))
+            else:
+                await _page_step(computer, step)
+
+            recorded = step.get("recorded")
+            if recorded is None:
+                continue
+            if recorded["url"] != computer.page.url:
+                result.divergences.append(f"step {result.steps}: URL {computer.page.url}, recorded {recorded['url']}")
+            if step["type"] == "function_call" and step["name"] in _COMPARED_TOOLS and output != recorded["output"]:
+                result.divergences.append(f"step {result.steps}: {step['name']} output differs from the recording")
+        result.final_url = computer.page.url
+    result.seconds = time.perf_counter() - started
+    (logger.info if result.reproduced else logger.warning)("Replay {}", result.summary())
+    return result
+
+
+async def replay_sessions(
+    paths: list[Path], target_url: str | None, profile: LaunchProfile | None = None
+) -> list[ReplayResult]:
+    """Replays several sessions concurrently in one shared headless browser, each in its recorded profile by default.
+
+    Only the launch options of `profile` are shared, viewport and request blocking are set per session context.
+    """
+    launch_options = (profile or FAST_PROFILE).launch_options()
+    pool = BrowserPool(size=1, max_contexts_per_browser=max(len(paths), 1), launch_options=launch_options)
+    async with pool:
+        return list(await asyncio.gather(*(replay_session(path, target_url, pool, profile) for path in paths)))
+
+
+def cli() -> None:
+    """Entry point of `hack-replay`, exits non-zero when a session did not reproduce."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("sessions", nargs="+", type=Path, help="Session recordings to replay.")
+    parser.add_argument("--target-url", help="Start page, the recorded one by default.")
+    parser.add_argument("--profile", choices=sorted(PROFILES), help="Launch profile instead of the recorded one.")
+    args = parser.parse_args()
+
+    profile = PROFILES[args.profile] if args.profile else None
+    results = asyncio.run(replay_sessions(args.sessions, args.target_url, profile))
+    reproduced = sum(result.reproduced for result in results)
+    logger.info("{} of {} sessions reproduced", reproduced, len(results))
+    raise SystemExit(0 if reproduced == len(results) else 1)
+
+
+if __name__ == "__main__":
+    cli()
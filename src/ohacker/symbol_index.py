@@ -0,0 +1,236 @@
+import ast
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from loguru import logger
+
+from src.ohacker.patch_engine import (
+    SQL_EXECUTE_METHODS,
+    VULN_KEYWORDS,
+    classify_findings,
+    opens_for_reading,
+    sink_classes,
+)
+
+INDEX_VERSION = 3
+
+SKIPPED_DIRS = frozenset({".git", ".venv", "venv", "node_modules", "__pycache__", ".mypy_cache", ".ruff_cache", "dist"})
+
+# Fixes written by earlier runs next to the sources (`security_patches_agent.fixed_path`), never patched again
+PATCH_OUTPUT_NAME = "fixed.py"
+PATCH_OUTPUT_SUFFIX = ".fixed.py"
+
+# Re-parsing fewer changed files than this is faster in-process than starting worker processes
+PARALLEL_PARSE_THRESHOLD = 64
+
+_ROUTE_METHODS = frozenset({"get", "post", "put", "patch", "delete", "route", "api_route", "websocket"})
+
+
+@dataclass
+class Symbol:
+    """A function or method and what it does that findings can be about."""
+
+    name: str
+    qualname: str
+    start: int
+    end: int
+    routes: list[str] = field(default_factory=list)
+    """E.g. "POST /comments/{image_name}", from route decorators."""
+
+    sinks: list[str] = field(default_factory=list)
+    """Vulnerability classes it has a sink for, see `patch_engine.sink_classes`."""
+
+    sql_sites: list[int] = field(default_factory=list)
+    open_sites: list[int] = field(default_factory=list)
+
+
+@dataclass
+class FileEntry:
+    """Indexed symbols of a file, with the mtime and size they were parsed at."""
+
+    mtime_ns: int
+    size: int
+    symbols: list[Symbol] = field(default_factory=list)
+    error: str | None = None
+
+
+class _SymbolCollector(ast.NodeVisitor):
+    def __init__(self):
+        self.symbols: list[Symbol] = []
+        self._scope: list[str] = []
+
+    def visit_ClassDef(self, node: ast.ClassDef) -> None:
+        self._scope.append(node.name)
+        self.generic_visit(node)
+        self._scope.pop()
+
+    def visit_FunctionDef(self, node: ast.FunctionDef | ast.AsyncFunctionDef) -> None:
+        calls = [call for call in ast.walk(node) if isinstance(call, ast.Call)]
+        self.symbols.append(
+            Symbol(
+                name=node.name,
+                qualname=".".join([*self._scope, node.name]),
+                start=min([node.lineno, *(decorator.lineno for decorator in node.decorator_list)]),
+                end=node.end_lineno or node.lineno,
+                routes=[route for decorator in node.decorator_list if (route := _route(decorator))],
+                sinks=sorted(sink_classes(node)),
+                sql_sites=[
+                    call.lineno
+                    for call in calls
+                    if isinstance(call.func, ast.Attribute) and call.func.attr in SQL_EXECUTE_METHODS
+                ],
+                open_sites=[call.lineno for call in calls if opens_for_reading(call)],
+            )
+        )
+        self._scope.append(node.name)
+        self.generic_visit(node)
+        self._scope.pop()
+
+    visit_AsyncFunctionDef = visit_FunctionDef  # noqa: N815
+
+
+def _route(decorator: ast.expr) -> str | None:
+    if not (isinstance(decorator, ast.Call) and isinstance(decorator.func, ast.Attribute)):
+        return None
+    method = decorator.func.attr
+    if method not in _ROUTE_METHODS or not decorator.args or not isinstance(decorator.args[0], ast.Constant):
+        return None
+    return f"{method.upper()} {decorator.args[0].value}"
+
+
+def index_file(path: Path) -> FileEntry:
+    """Parses one file, a top-level function so worker processes can run it."""
+    stat = path.stat()
+    entry = FileEntry(stat.st_mtime_ns, stat.st_size)
+    try:
+        collector = _SymbolCollector()
+        collector.visit(ast.parse(path.read_bytes(), filename=str(path)))
+        entry.symbols = collector.symbols
+    except (SyntaxError, ValueError, UnicodeDecodeError) as e:
+        entry.error = str(e)
+    return entry
+
+
+class SymbolIndex:
+    """AST index of the Python files under a repository root: functions, routes, SQL and file-open call sites.
+
+    The index is kept as JSON and updated incrementally: only files whose mtime or size changed since the last
+    `update` are parsed again, so re-running on a large repository is cheap.
+    """
+
+    def __init__(self, root: str | Path, cache_path: str | Path | None = None):
+        self.root = Path(root).resolve()
+        if cache_path is None:
+            digest = hashlib.sha1(str(self.root).encode(), usedforsecurity=False).hexdigest()[:12]
+            cache_path = Path(".ohacker_cache") / f"symbols-{digest}.json"
+        self.cache_path = Path(cache_path)
+        self.files: dict[str, FileEntry] = self._load()
+
+    def _load(self) -> dict[str, FileEntry]:
+        try:
+            data = json.loads(self.cache_path.read_text())
+        except (OSError, ValueError):
+            return {}
+        if data.get("version") != INDEX_VERSION or data.get("root") != str(self.root):
+            return {}
+        return {
+            path: FileEntry(**{**entry, "symbols": [Symbol(**symbol) for symbol in entry["symbols"]]})
+            for path, entry in data["files"].items()
+        }
+
+    def _save(self) -> None:
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": INDEX_VERSION,
+            "root": str(self.root),
+            "files": {path: asdict(entry) for path, entry in self.files.items()},
+        }
+        self.cache_path.write_text(json.dumps(data))
+
+    def python_files(self) -> list[Path]:
+        """The source files under the root, without the skipped directories and the fixes of earlier runs."""
+        files = []
+        for directory, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [name for name in dirnames if name not in SKIPPED_DIRS]
+            files.extend(Path(directory) / name for name in filenames if _is_source(name))
+        return files
+
+    def update(self) -> int:
+        """Re-parses the files changed since the last update, returns how many were parsed."""
+        changed: list[tuple[str, Path]] = []
+        seen = set()
+        for path in self.python_files():
+            relative = path.relative_to(self.root).as_posix()
+            seen.add(relative)
+            entry = self.files.get(relative)
+            stat = path.stat()
+            if entry is None or entry.mtime_ns != stat.st_mtime_ns or entry.size != stat.st_size:
+                changed.append((relative, path))
+        removed = set(self.files) - seen
+        for relative in removed:
+            del self.files[relative]
+
+        if len(changed) >= PARALLEL_PARSE_THRESHOLD:
+            with ProcessPoolExecutor() as executor:
+                entries = list(executor.map(index_file, [path for _, path in changed], chunksize=16))
+        else:
+            entries = [index_file(path) for _, path in changed]
+        self.files.update(zip([relative for relative, _ in changed], entries, strict=True))
+
+        if changed or removed:
+            self._save()
+        logger.debug("Symbol index of {}: {} files, {} re-parsed", self.root, len(self.files), len(changed))
+        return len(changed)
+
+    def locate(self, description: str) -> dict[str, list[Symbol]]:
+        """Candidate code locations of the findings, by file.
+
+        These are sinks of the reported vulnerability classes, functions the description names, and functions with
+        any sink behind a route the description mentions.
+        """
+        wanted = classify_findings(description) or set(VULN_KEYWORDS)
+        locations: dict[str, list[Symbol]] = {}
+        for relative, entry in sorted(self.files.items()):
+            symbols = [symbol for symbol in entry.symbols if _matches(symbol, wanted, description)]
+            if symbols:
+                locations[relative] = symbols
+        return locations
+
+
+def _names_in_code(symbol: Symbol, description: str) -> bool:
+    """Whether the description names the function as code: `get_image`, get_image(), main.get_image or any name
+    with an underscore. Plain English words like "open" or "index" do not count.
+    """
+    names = {symbol.name, symbol.qualname}
+    pattern = "|".join(re.escape(name) for name in sorted(names, key=len, reverse=True))
+    for match in re.finditer(rf"(?<![\w.])(?:\w+\.)*(?:{pattern})\b(\(?)", description):
+        text = match.group(0)
+        if "_" in text or "." in text or match.group(1):
+            return True
+        if description[match.start() - 1 : match.start()] == "`" and description[match.end() : match.end() + 1] == "`":
+            return True
+    return False
+
+
+def _is_source(name: str) -> bool:
+    return name.endswith(".py") and name != PATCH_OUTPUT_NAME and not name.endswith(PATCH_OUTPUT_SUFFIX)
+
+
+def _matches(symbol: Symbol, wanted: set[str], description: str) -> bool:
+    if set(symbol.sinks) & wanted or _names_in_code(symbol, description):
+        return True
+    if not symbol.sinks:
+        return False
+    if re.search(rf"\b{re.escape(symbol.name)}\b", description):
+        return True  # A plain word like "open" or "reader", only trusted for functions with a sink
+    for route in symbol.routes:
+        # The static part of the route path, e.g. "/comments/" of "/comments/{image_name}"
+        prefix = route.split(" ", 1)[1].split("{", 1)[0]
+        if len(prefix) > 1 and prefix in description:
+            return True
+    return False
@@ -0,0 +1,47 @@
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+import main
+import pytest
+from database import Database, migrate
+from fastapi import HTTPException
+
+
+@pytest.fixture
+async def database(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> AsyncIterator[Database]:
+    path = str(tmp_path / "comments.db")
+    await migrate(path)
+    db = Database(path, readers=2)
+    await db.open()
+    async with db.writer() as conn:
+        await conn.executemany(
+            "INSERT INTO comments (image_name, comment_text) VALUES (?, ?)",
+            [("a.png", "first"), ("b.png", "other"), ("a.png", "second"), ("it's.png", "quoted"), ("a.png", "third")],
+        )
+        await conn.commit()
+    monkeypatch.setattr(main, "database", db)
+    yield db
+    await db.close()
+
+
+def _texts(response: dict) -> dict[str, list[str]]:
+    return {image["image_name"]: [c["comment_text"] for c in image["comments"]] for image in response["images"]}
+
+
+async def test_first_comments_per_image(database: Database):
+    response = await main.get_comments_batch(image=["a.png", "b.png", "missing.png"], limit=2)
+    assert _texts(response) == {"a.png": ["first", "second"], "b.png": ["other"], "missing.png": []}
+    next_after_id = {image["image_name"]: image["next_after_id"] for image in response["images"]}
+    assert next_after_id["a.png"] == response["images"][0]["comments"][-1]["id"]
+    assert next_after_id["b.png"] is None
+
+
+async def test_names_are_bound_and_deduplicated(database: Database):
+    response = await main.get_comments_batch(image=["it's.png", "it's.png", "' OR 1=1 --"], limit=10)
+    assert _texts(response) == {"it's.png": ["quoted"], "' OR 1=1 --": []}
+
+
+async def test_too_many_images(database: Database):
+    with pytest.raises(HTTPException) as error:
+        await main.get_comments_batch(image=[f"{i}.png" for i in range(main.MAX_BATCH_IMAGES + 1)], limit=1)
+    assert error.value.status_code == 400
@@ -0,0 +1,112 @@
+import os
+from email.utils import formatdate
+from pathlib import Path
+
+import pytest
+from file_serving import byte_range, entity_tag, file_response, not_modified
+from starlette.requests import Request
+
+SIZE = 1000
+ETAG = '"abc-3e8"'
+
+
+def _request(**headers: str) -> Request:
+    raw_headers = [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "headers": raw_headers})
+
+
+@pytest.mark.parametrize(
+    ("header", "expected"),
+    [
+        ("bytes=0-99", (0, 99)),
+        ("bytes=900-", (900, 999)),
+        ("bytes=990-5000", (990, 999)),
+        ("bytes=-100", (900, 999)),
+        ("bytes=-5000", (0, 999)),
+        ("bytes=0-1,5-6", None),  # Multiple ranges get the whole file
+        ("bytes=5-2", None),
+        ("bytes=a-b", None),
+        ("items=0-1", None),
+    ],
+)
+def test_byte_range(header: str, expected: tuple[int, int] | None):
+    assert byte_range(_request(range=header), ETAG, SIZE) == expected
+
+
+def test_byte_range_without_header():
+    assert byte_range(_request(), ETAG, SIZE) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=-0", "bytes=1000-", "bytes=5000-6000"])
+def test_unsatisfiable_range(header: str):
+    with pytest.raises(ValueError):
+        byte_range(_request(range=header), ETAG, SIZE)
+
+
+def test_if_range():
+    assert byte_range(_request(range="bytes=0-9", if_range=ETAG), ETAG, SIZE) == (0, 9)
+    assert byte_range(_request(range="bytes=0-9", if_range='"older"'), ETAG, SIZE) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=0-", "bytes=-1"])
+def test_range_of_empty_file(header: str):
+    with pytest.raises(ValueError):
+        byte_range(_request(range=header), ETAG, 0)
+
+
+@pytest.fixture
+def file_stat(tmp_path: Path) -> os.stat_result:
+    path = tmp_path / "image.png"
+    path.write_bytes(b"x" * SIZE)
+    return os.stat(path)
+
+
+@pytest.mark.parametrize(
+    ("if_none_match", "expected"),
+    [(ETAG, True), (f"W/{ETAG}", True), (f'"other", {ETAG}', True), ("*", True), ('"other"', False)],
+)
+def test_if_none_match(file_stat: os.stat_result, if_none_match: str, expected: bool):
+    assert not_modified(_request(if_none_match=if_none_match), ETAG, file_stat) is expected
+
+
+def test_if_modified_since(file_stat: os.stat_result):
+    assert not_modified(_request(if_modified_since=formatdate(file_stat.st_mtime, usegmt=True)), ETAG, file_stat)
+    older = formatdate(file_stat.st_mtime - 3600, usegmt=True)
+    assert not not_modified(_request(if_modified_since=older), ETAG, file_stat)
+    assert not not_modified(_request(if_modified_since="yesterday"), ETAG, file_stat)
+
+
+def test_if_none_match_wins_over_if_modified_since(file_stat: os.stat_result):
+    now = formatdate(file_stat.st_mtime, usegmt=True)
+    assert not not_modified(_request(if_none_match='"other"', if_modified_since=now), ETAG, file_stat)
+
+
+async def test_empty_file(tmp_path: Path):
+    path = tmp_path / "empty.png"
+    path.write_bytes(b"")
+
+    response = await file_response(_request(), str(path), "image/png")
+    assert response.status_code == 200
+    assert response.body == b""
+    assert response.headers["content-length"] == "0"
+
+    response = await file_response(_request(range="bytes=0-"), str(path), "image/png")
+    assert response.status_code == 416
+    assert response.headers["content-range"] == "bytes */0"
+
+
+async def test_suffix_range_response(tmp_path: Path):
+    path = tmp_path / "image.png"
+    path.write_bytes(bytes(range(100)))
+    etag = entity_tag(os.stat(path))
+
+    response = await file_response(_request(range="bytes=-10"), str(path), "image/png")
+    assert response.status_code == 206
+    assert response.body == bytes(range(90, 100))
+    assert response.headers["content-range"] == "bytes 90-99/100"
+
+    response = await file_response(_request(range="bytes=-0"), str(path), "image/png")
+    assert response.status_code == 416
+
+    response = await file_response(_request(if_none_match=f"W/{etag}"), str(path), "image/png")
+    assert response.status_code == 304
@@ -0,0 +1,74 @@
+import pytest
+
+from src.ohacker.patch_engine import Hunk, PatchApplyError, apply_hunks, parse_unified_diff
+
+SOURCE = """def read(name):
+    path = name
+    return open(path).read()
+
+
+def write(name, data):
+    with open(name, "w") as f:
+        f.write(data)
+"""
+
+
+def test_parse_unified_diff():
+    diff = """```diff
+--- a/main.py
++++ b/main.py
+@@ -2,2 +2,3 @@
+     path = name
++    check(path)
+
+-    return open(path).read()
+\\ No newline at end of file
+```"""
+    assert parse_unified_diff(diff) == [
+        Hunk(2, ["    path = name", "", "    return open(path).read()"], ["    path = name", "    check(path)", ""])
+    ]
+
+
+def test_parse_several_hunks():
+    diff = "@@ -1 +1 @@\n-a\n+b\n@@ -10,1 +10,1 @@\n-c\n+d\n"
+    assert parse_unified_diff(diff) == [Hunk(1, ["a"], ["b"]), Hunk(10, ["c"], ["d"])]
+
+
+def test_apply_hunks():
+    hunk = Hunk(3, ["    return open(path).read()"], ["    return open(safe(path)).read()"])
+    assert apply_hunks(SOURCE, [hunk]) == SOURCE.replace("open(path)", "open(safe(path))")
+
+
+def test_apply_hunks_with_wrong_line_numbers():
+    # The hunk claims line 40, the code is found by content
+    hunk = Hunk(40, ['    with open(name, "w") as f:'], ['    with open(safe(name), "w") as f:'])
+    assert 'open(safe(name), "w")' in apply_hunks(SOURCE, [hunk])
+
+
+def test_apply_hunks_keeps_order_of_placements():
+    hunks = [
+        Hunk(7, ["        f.write(data)"], ["        f.write(data.strip())"]),
+        Hunk(2, ["    path = name"], ["    path = name.strip()"]),
+    ]
+    patched = apply_hunks(SOURCE, hunks)
+    assert "path = name.strip()" in patched
+    assert "f.write(data.strip())" in patched
+
+
+def test_mismatching_hunk():
+    with pytest.raises(PatchApplyError, match="does not match"):
+        apply_hunks(SOURCE, [Hunk(3, ["    return read_file(path)"], ["    return ''"])])
+
+
+def test_overlapping_hunks():
+    hunks = [
+        Hunk(2, ["    path = name", "    return open(path).read()"], ["    pass"]),
+        Hunk(3, ["    return open(path).read()"], [""]),
+    ]
+    with pytest.raises(PatchApplyError, match="overlaps"):
+        apply_hunks(SOURCE, hunks)
+
+
+def test_patch_that_breaks_the_syntax():
+    with pytest.raises(PatchApplyError, match="does not parse"):
+        apply_hunks(SOURCE, [Hunk(2, ["    path = name"], ["    path = (name"])])